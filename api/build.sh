@@ -61,8 +61,11 @@ echo ------------------------------------
 echo
 
 cd events
+# the collector stores content items with the same helpers as the core API
+cp -f ../msam/chalicelib/content_items.py ../msam/chalicelib/codec.py .
 # sam build first to include dependencies in requirements. txt
 sam build --template MSAMEventCollector.yml --manifest requirements.txt --region us-west-2 --profile $BUILD_PROFILE
+rm -f content_items.py codec.py
 aws cloudformation package --template-file .aws-sam/build/template.yaml --s3-bucket $BUCKET_BASENAME-us-west-2 --s3-prefix msam --use-json --output-template-file msam-events-release.json --profile $BUILD_PROFILE
 # replace code uris with a dynamic one
 python update_event_template.py
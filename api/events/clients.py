@@ -0,0 +1,66 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+This file contains helper functions for sharing boto3 clients and resources
+across invocations of the event Lambdas. It mirrors chalicelib/clients.py of the core API.
+"""
+
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# connections kept open per client, enough for the thread pools sharing one client
+MAX_POOL_CONNECTIONS = int(os.environ.get("BOTO3_MAX_POOL_CONNECTIONS", "25"))
+
+# (service, region, config) -> client
+CLIENTS = {}
+
+# creating clients from the shared session is not thread-safe
+CLIENTS_LOCK = threading.Lock()
+
+# resources are not thread-safe, each thread keeps its own
+RESOURCES = threading.local()
+
+
+def pool_config(config):
+    """
+    Return the config with the connection pool size applied.
+    """
+    pool = Config(max_pool_connections=MAX_POOL_CONNECTIONS)
+    if config is None:
+        return pool
+    return config.merge(pool)
+
+
+def client(service_name, region_name=None, config=None):
+    """
+    Return a shared client for the service, region and config, creating it on first use.
+    Clients are thread-safe and can be used by any number of workers.
+    """
+    key = (service_name, region_name, config)
+    service_client = CLIENTS.get(key)
+    if service_client is None:
+        with CLIENTS_LOCK:
+            service_client = CLIENTS.get(key)
+            if service_client is None:
+                service_client = boto3.client(service_name, region_name=region_name, config=pool_config(config))
+                CLIENTS[key] = service_client
+    return service_client
+
+
+def resource(service_name, region_name=None, config=None):
+    """
+    Return a resource for the service, region and config that is reused by the calling thread.
+    """
+    if not hasattr(RESOURCES, "cache"):
+        RESOURCES.cache = {}
+    key = (service_name, region_name, config)
+    service_resource = RESOURCES.cache.get(key)
+    if service_resource is None:
+        with CLIENTS_LOCK:
+            service_resource = boto3.resource(service_name, region_name=region_name, config=pool_config(config))
+        RESOURCES.cache[key] = service_resource
+    return service_resource
+
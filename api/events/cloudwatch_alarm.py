@@ -9,18 +9,19 @@ import os
 import json
 import time
 
-import boto3
 from boto3.dynamodb.conditions import Key, Attr
 from botocore.exceptions import ClientError
 from botocore.config import Config
 
+import clients
+
 # user-agent config
 STAMP = os.environ["BUILD_STAMP"]
 MSAM_BOTO3_CONFIG = Config(user_agent="aws-media-services-applications-mapper/{stamp}/cloudwatch_alarm.py".format(stamp=STAMP))
 
 ALARMS_TABLE_NAME = os.environ["ALARMS_TABLE_NAME"]
 TABLE_REGION = os.environ["EVENTS_TABLE_REGION"]
-DYNAMO_RESOURCE = boto3.resource('dynamodb', region_name=TABLE_REGION, config=MSAM_BOTO3_CONFIG)
+DYNAMO_RESOURCE = clients.resource('dynamodb', region_name=TABLE_REGION, config=MSAM_BOTO3_CONFIG)
 ALARMS_TABLE = DYNAMO_RESOURCE.Table(ALARMS_TABLE_NAME)
 
 def lambda_handler(event, _):
@@ -33,7 +34,7 @@ def lambda_handler(event, _):
         # process the data we got from the alarm state change event
         region = event['region']
         alarm_name = event['detail']['alarmName']
-        CLOUDWATCH_RESOURCE = boto3.resource('cloudwatch', region_name=region)
+        CLOUDWATCH_RESOURCE = clients.resource('cloudwatch', region_name=region, config=MSAM_BOTO3_CONFIG)
         alarm = CLOUDWATCH_RESOURCE.Alarm(alarm_name)
 
         region_alarm_name = "{}:{}".format(region, alarm_name)        
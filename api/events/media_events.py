@@ -9,24 +9,38 @@ each region where Media Services are created.
 import datetime
 import os
 import json
+import time
+import zlib
 from random import randint
 from urllib.parse import unquote
 
-import boto3
 from boto3.dynamodb.conditions import Key, Attr
 from botocore.exceptions import ClientError
 from botocore.config import Config
 from jsonpath_ng import parse
 
+import clients
+import node_refresh
+
 # user-agent config
 STAMP = os.environ["BUILD_STAMP"]
 MSAM_BOTO3_CONFIG = Config(user_agent="aws-media-services-applications-mapper/{stamp}/media_events.py".format(stamp=STAMP))
 
 DYNAMO_REGION_NAME=os.environ["EVENTS_TABLE_REGION"]
-DYNAMO_RESOURCE = boto3.resource('dynamodb', region_name=DYNAMO_REGION_NAME, config=MSAM_BOTO3_CONFIG)
+DYNAMO_RESOURCE = clients.resource('dynamodb', region_name=DYNAMO_REGION_NAME, config=MSAM_BOTO3_CONFIG)
 EVENTS_TABLE = DYNAMO_RESOURCE.Table(os.environ["EVENTS_TABLE_NAME"])
 CLOUDWATCH_EVENTS_TABLE = DYNAMO_RESOURCE.Table(os.environ["CLOUDWATCH_EVENTS_TABLE_NAME"])
 CONTENT_TABLE_NAME = os.environ["CONTENT_TABLE_NAME"]
+SETTINGS_TABLE_NAME = os.environ.get("SETTINGS_TABLE_NAME", "")
+
+# setting read by the node sweep to refresh regions with recent media events first
+REGION_ACTIVITY_KEY = "region-activity"
+
+# a region's activity is recorded at most once per this many seconds by each container
+REGION_ACTIVITY_INTERVAL = 60
+
+# region -> time the activity of the region was last recorded by this container
+REGION_ACTIVITY_RECORDED = {}
 
 
 def lambda_handler(event, _):
@@ -104,7 +118,7 @@ def lambda_handler(event, _):
                 orig_id_expr = parse('$..origin_endpoint_id')
                 orig_id = [match.value for match in orig_id_expr.find(event)]
                 if orig_id:
-                    emp_client = boto3.client('mediapackage')
+                    emp_client = clients.client('mediapackage', config=MSAM_BOTO3_CONFIG)
                     response = emp_client.describe_origin_endpoint(
                         Id=orig_id[0])
                     event["resource_arn"] = response["Arn"]
@@ -122,6 +136,10 @@ def lambda_handler(event, _):
             #print(event)
             print("Storing media service event.")
             CLOUDWATCH_EVENTS_TABLE.put_item(Item=event)
+            record_region_activity(event["region"])
+            # object events do not change the configuration of their container
+            if "MediaStore Object State Change" not in event["type"]:
+                node_refresh.refresh_node(event["resource_arn"], event["detail"])
         else:
             print("Skipping this event. " + event["type"])
     except ClientError as error:
@@ -137,15 +155,15 @@ def get_pipeline_state(event):
     resource_arn = event["resource_arn"]
     try:
         if event["source"] == "aws.medialive" and event["detail"]["alarm_state"] == "SET":
-            resource = boto3.resource('dynamodb', region_name=DYNAMO_REGION_NAME)
-            CONTENT_TABLE = resource.Table(CONTENT_TABLE_NAME)
+            CONTENT_TABLE = DYNAMO_RESOURCE.Table(CONTENT_TABLE_NAME)
             response = CONTENT_TABLE.query(KeyConditionExpression=Key('arn').eq(resource_arn))
-            if "Items" in response:
+            # deleted items are replaced by tombstones without data
+            if "Items" in response and response["Items"] and "data" in response["Items"][0]:
                 item = response["Items"][0]
                 if "service" in item and item["service"] == "medialive-multiplex":
                     running_pipeline = bool(False)
                 else:
-                    data = json.loads(item["data"])
+                    data = json.loads(content_data(item))
                     if "ChannelClass" in data and data["ChannelClass"] == "STANDARD":
                         running_pipeline = bool(False)
     except ClientError as error:
@@ -154,3 +172,39 @@ def get_pipeline_state(event):
         log_msg = 'Pipeline {} state to for {} is {}'
         print(log_msg.format(event["detail"]["pipeline"], resource_arn, running_pipeline))
     return running_pipeline
+
+
+def record_region_activity(region):
+    """
+    Record the time of the latest media event in a region for the node sweep.
+    """
+    now = int(time.time())
+    if not SETTINGS_TABLE_NAME or now - REGION_ACTIVITY_RECORDED.get(region, 0) < REGION_ACTIVITY_INTERVAL:
+        return
+    settings_table = DYNAMO_RESOURCE.Table(SETTINGS_TABLE_NAME)
+    try:
+        settings_table.update_item(
+            Key={"id": REGION_ACTIVITY_KEY},
+            UpdateExpression="SET #value.#region = :now",
+            ConditionExpression="attribute_exists(#value)",
+            ExpressionAttributeNames={"#value": "value", "#region": region},
+            ExpressionAttributeValues={":now": now})
+    except ClientError as error:
+        if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        # first event recorded, the map does not exist yet
+        try:
+            settings_table.put_item(Item={"id": REGION_ACTIVITY_KEY, "value": {region: now}}, ConditionExpression="attribute_not_exists(id)")
+        except ClientError as put_error:
+            if put_error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+    REGION_ACTIVITY_RECORDED[region] = now
+
+
+def content_data(item):
+    """
+    Return the data attribute of a content item as a JSON string, decompressing it if needed.
+    """
+    if item.get("codec") == "zlib":
+        return zlib.decompress(item["data"].value).decode('utf-8')
+    return item["data"]
@@ -0,0 +1,256 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+This file contains helper functions for refreshing the content table item
+of a single resource named by a media event, so changes show up before the
+next region sweep of the node cache.
+"""
+
+import json
+import os
+import re
+import time
+
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError
+from botocore.exceptions import ClientError
+from jsonpath_ng import parse
+
+import clients
+import codec
+import content_items
+
+# user-agent config
+STAMP = os.environ["BUILD_STAMP"]
+MSAM_BOTO3_CONFIG = Config(user_agent="aws-media-services-applications-mapper/{stamp}/node_refresh.py".format(stamp=STAMP))
+
+DYNAMO_REGION_NAME = os.environ["EVENTS_TABLE_REGION"]
+CONTENT_TABLE_NAME = os.environ["CONTENT_TABLE_NAME"]
+
+# seconds a refreshed item stays in the table, the node sweep extends it
+CACHE_ITEM_TTL = int(os.environ.get("CACHE_ITEM_TTL", "7200"))
+
+# events for the same ARN within this many seconds refresh it once per container
+REFRESH_DEBOUNCE_SECONDS = int(os.environ.get("REFRESH_DEBOUNCE_SECONDS", "10"))
+
+# events that delete a resource, the resource is tombstoned without describing it
+DELETE_EVENT_NAMES = [
+    "DeleteChannel", "DeleteInput", "DeleteMultiplex", "DeleteOriginEndpoint",
+    "DeleteContainer", "DeleteFlow", "DeletePlaybackConfiguration"
+]
+
+# error codes of describe calls for a resource that no longer exists
+NOT_FOUND_CODES = ["NotFoundException", "ContainerNotFoundException", "ResourceNotFoundException"]
+
+# arn -> time the resource was last refreshed by this container
+REFRESHED = {}
+
+
+def refresh_node(arn, detail=None):
+    """
+    Describe the resource of an ARN and store its content item, or replace the item
+    with a tombstone if the resource was deleted. Resources of unsupported types are ignored.
+    detail is the detail of the media event, a CloudTrail record for API calls.
+    """
+    resource_type = resource_type_of(arn)
+    if resource_type not in RESOURCE_DESCRIBERS:
+        return
+    if detail is None:
+        detail = {}
+    # a failed API call changed nothing
+    if detail.get("errorCode"):
+        return
+    deleted = detail.get("eventName") in DELETE_EVENT_NAMES
+    now = int(time.time())
+    # other events within the window are already covered by the last refresh
+    if not deleted and now - REFRESHED.get(arn, 0) < REFRESH_DEBOUNCE_SECONDS:
+        print("{} refreshed {}s ago".format(arn, now - REFRESHED[arn]))
+        return
+    service, describe = RESOURCE_DESCRIBERS[resource_type]
+    region = arn.split(":")[3]
+    try:
+        content_table = clients.resource('dynamodb', region_name=DYNAMO_REGION_NAME, config=MSAM_BOTO3_CONFIG).Table(CONTENT_TABLE_NAME)
+        if deleted:
+            config = None
+        else:
+            resource_id = resource_id_for(content_table, resource_type, arn, detail)
+            if resource_id is None:
+                print("no resource id for {}, left to the node sweep".format(arn))
+                return
+            config = describe(region, resource_id)
+        if config is None:
+            print("storing tombstone for {}".format(arn))
+            content_table.put_item(Item=content_items.tombstone_item(arn, service))
+        else:
+            print("refreshing {} {}".format(service, arn))
+            item = content_items.node_item(arn, service, region, config, CACHE_ITEM_TTL)
+            item[content_items.CHANGE_BUCKET_ATTRIBUTE] = content_items.change_bucket(item["updated"])
+            content_table.put_item(Item=codec.encode_item(item))
+        # only a stored refresh holds back the next events, a failed one is retried by them
+        REFRESHED[arn] = now
+    except (ClientError, BotoCoreError) as error:
+        print(error)
+
+
+def resource_type_of(arn):
+    """
+    Return the (service, resource type) of an ARN, for example ("medialive", "channel").
+    """
+    parts = arn.split(":", 5)
+    if len(parts) < 6 or not parts[5]:
+        return None
+    return (parts[2], re.split("[:/]", parts[5])[0])
+
+
+def resource_id_of(arn):
+    """
+    Return the part of an ARN following the resource type.
+    """
+    return re.split("[:/]", arn.split(":", 5)[5])[1]
+
+
+def resource_id_for(content_table, resource_type, arn, detail):
+    """
+    Return the identifier the describe call of a resource takes.
+    MediaPackage ARNs hold an internal identifier rather than the id, which is taken from
+    the CloudTrail record or the stored item. Returns None if it cannot be found.
+    """
+    if resource_type[0] == "mediaconnect":
+        return arn
+    if resource_type[0] != "mediapackage":
+        return resource_id_of(arn)
+    for section in ["responseElements", "requestParameters"]:
+        if isinstance(detail.get(section), dict) and detail[section].get("id"):
+            return detail[section]["id"]
+    item = content_table.get_item(Key={"arn": arn}).get("Item")
+    if item is None or content_items.is_tombstone(item):
+        return None
+    return json.loads(codec.decode_data(item)).get("Id")
+
+
+def describe_or_none(function, **kwargs):
+    """
+    Call a describe function, returning None if the resource does not exist.
+    """
+    try:
+        response = function(**kwargs)
+    except ClientError as error:
+        if error.response["Error"]["Code"] in NOT_FOUND_CODES:
+            return None
+        raise
+    if 'ResponseMetadata' in response:
+        del response['ResponseMetadata']
+    return response
+
+
+def list_shaped(service, shape_name, response):
+    """
+    Return the members of a describe response that the List call of the node sweep returns,
+    so the stored data and its digest match what the sweep stores.
+    """
+    members = service.meta.service_model.shape_for(shape_name).members
+    return {key: value for key, value in response.items() if key in members}
+
+
+def medialive_channel(region, resource_id):
+    """
+    Return the configuration of a MediaLive channel as listed by the node sweep.
+    """
+    service = clients.client("medialive", region_name=region, config=MSAM_BOTO3_CONFIG)
+    channel = describe_or_none(service.describe_channel, ChannelId=resource_id)
+    if channel is None or channel.get("State") == "DELETED":
+        return None
+    return list_shaped(service, "ChannelSummary", channel)
+
+
+def medialive_input(region, resource_id):
+    """
+    Return the configuration of a MediaLive input as listed by the node sweep.
+    """
+    service = clients.client("medialive", region_name=region, config=MSAM_BOTO3_CONFIG)
+    ml_input = describe_or_none(service.describe_input, InputId=resource_id)
+    if ml_input is None or ml_input.get("State") == "DELETED":
+        return None
+    return list_shaped(service, "Input", ml_input)
+
+
+def medialive_multiplex(region, resource_id):
+    """
+    Return the configuration of a MediaLive multiplex.
+    """
+    service = clients.client("medialive", region_name=region, config=MSAM_BOTO3_CONFIG)
+    multiplex = describe_or_none(service.describe_multiplex, MultiplexId=resource_id)
+    if multiplex is None or multiplex.get("State") == "DELETED":
+        return None
+    return multiplex
+
+
+def mediapackage_channel(region, resource_id):
+    """
+    Return the configuration of a MediaPackage channel as listed by the node sweep.
+    """
+    service = clients.client("mediapackage", region_name=region, config=MSAM_BOTO3_CONFIG)
+    channel = describe_or_none(service.describe_channel, Id=resource_id)
+    if channel is None:
+        return None
+    channel = list_shaped(service, "Channel", channel)
+    parse('$..Password').update(channel, "XXXXXXXXXXXX")
+    return channel
+
+
+def mediapackage_origin_endpoint(region, resource_id):
+    """
+    Return the configuration of a MediaPackage origin endpoint as listed by the node sweep.
+    """
+    service = clients.client("mediapackage", region_name=region, config=MSAM_BOTO3_CONFIG)
+    endpoint = describe_or_none(service.describe_origin_endpoint, Id=resource_id)
+    if endpoint is None:
+        return None
+    return list_shaped(service, "OriginEndpoint", endpoint)
+
+
+def mediastore_container(region, resource_id):
+    """
+    Return the configuration of a MediaStore container.
+    """
+    service = clients.client("mediastore", region_name=region, config=MSAM_BOTO3_CONFIG)
+    response = describe_or_none(service.describe_container, ContainerName=resource_id)
+    if response is None:
+        return None
+    container = response["Container"]
+    container['CreationTime'] = str(container['CreationTime'])
+    return container
+
+
+def mediaconnect_flow(region, resource_id):
+    """
+    Return the configuration of a MediaConnect flow with its tags, as the node sweep stores it.
+    """
+    service = clients.client("mediaconnect", region_name=region, config=MSAM_BOTO3_CONFIG)
+    response = describe_or_none(service.describe_flow, FlowArn=resource_id)
+    if response is None:
+        return None
+    flow = response["Flow"]
+    flow["Tags"] = service.list_tags_for_resource(ResourceArn=resource_id)["Tags"]
+    return flow
+
+
+def mediatailor_configuration(region, resource_id):
+    """
+    Return a MediaTailor playback configuration.
+    """
+    service = clients.client("mediatailor", region_name=region, config=MSAM_BOTO3_CONFIG)
+    return describe_or_none(service.get_playback_configuration, Name=resource_id)
+
+
+# (service, resource type) of an ARN -> (content item service, describe function)
+RESOURCE_DESCRIBERS = {
+    ("medialive", "channel"): ("medialive-channel", medialive_channel),
+    ("medialive", "input"): ("medialive-input", medialive_input),
+    ("medialive", "multiplex"): ("medialive-multiplex", medialive_multiplex),
+    ("mediapackage", "channels"): ("mediapackage-channel", mediapackage_channel),
+    ("mediapackage", "origin_endpoints"): ("mediapackage-origin-endpoint", mediapackage_origin_endpoint),
+    ("mediastore", "container"): ("mediastore-container", mediastore_container),
+    ("mediaconnect", "flow"): ("mediaconnect-flow", mediaconnect_flow),
+    ("mediatailor", "playbackConfiguration"): ("mediatailor-configuration", mediatailor_configuration)
+}
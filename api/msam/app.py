@@ -5,12 +5,11 @@ This file contains the REST API and CloudWatch entry-points for the MSAM backend
 """
 
 import os
-import time
 
-import boto3
-from chalice import Chalice, Rate
+from chalice import BadRequestError, Chalice, Rate, Response
 
 from chalicelib import cache
+from chalicelib import clients
 import chalicelib.channels as channel_tiles
 import chalicelib.cloudwatch as cloudwatch_data
 import chalicelib.layout as node_layout
@@ -34,9 +33,6 @@ TAG_UPDATE_RATE_MINUTES = 5
 # update managed instance status and metrics at this interval
 SSM_RUN_COMMAND_RATE_MINUTES = 1
 
-# time to pause before processing next region
-NODE_UPDATE_REGION_PAUSE_SECONDS = 10
-
 # table names generated by CloudFormation
 ALARMS_TABLE_NAME = os.environ["ALARMS_TABLE_NAME"]
 CHANNELS_TABLE_NAME = os.environ["CHANNELS_TABLE_NAME"]
@@ -49,8 +45,8 @@ SETTINGS_TABLE_NAME = os.environ["SETTINGS_TABLE_NAME"]
 CACHE_ITEM_TTL = int(os.environ["CACHE_ITEM_TTL"])
 
 # DynamoDB
-DYNAMO_CLIENT = boto3.client("dynamodb")
-DYNAMO_RESOURCE = boto3.resource("dynamodb")
+DYNAMO_CLIENT = clients.client("dynamodb")
+DYNAMO_RESOURCE = clients.resource("dynamodb")
 
 SSM_EVENT_PATTERN = {
   "source": [
@@ -132,20 +128,105 @@ def application_settings(item_key):
     return msam_settings.application_settings(app.current_request, item_key)
 
 
+def paging_parameters():
+    """
+    Return the optional limit and cursor query parameters of the current request.
+    """
+    params = app.current_request.query_params or {}
+    limit = params.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise BadRequestError("limit must be an integer")
+    return limit, params.get("cursor")
+
+
+def fields_parameter():
+    """
+    Return the optional fields query parameter of the current request.
+    """
+    params = app.current_request.query_params or {}
+    fields = params.get("fields")
+    if fields not in (None, cache.SUMMARY_FIELDS):
+        raise BadRequestError("fields must be {}".format(cache.SUMMARY_FIELDS))
+    return fields
+
+
+def not_modified(etag):
+    """
+    Return True if the client already holds the representation with this ETag.
+    """
+    headers = app.current_request.headers or {}
+    return etag is not None and headers.get("if-none-match") == etag
+
+
+def conditional_response(result, etag=None):
+    """
+    Return the result with its ETag, or an empty 304 Not Modified if the client already has it.
+    """
+    if etag is None:
+        etag = cache.result_etag(result)
+    # no-cache lets the browser keep the body but revalidate on every poll
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if not_modified(etag):
+        return Response(body="", status_code=304, headers=headers)
+    return Response(body=result, headers=headers)
+
+
 @app.route('/cached/{service}/{region}', cors=True, api_key_required=True, methods=['GET'])
 def cached_by_service_region(service, region):
     """
     API entry point to retrieve items from the cache under the service and region name.
+    Optional limit and cursor query parameters return the items one page at a time.
+    The fields=summary query parameter returns compact records without the data.
+    A matching If-None-Match header returns 304 Not Modified.
     """
-    return cache.cached_by_service_region(service, region)
+    limit, cursor = paging_parameters()
+    fields = fields_parameter()
+    if limit is None and cursor is None:
+        # answer from the warm read cache without copying the items
+        etag = cache.service_etag(service, region, fields)
+        if not_modified(etag):
+            return conditional_response(None, etag)
+    return conditional_response(cache.cached_by_service_region(service, region, limit=limit, cursor=cursor, fields=fields))
 
 
 @app.route('/cached/{service}', cors=True, api_key_required=True, methods=['GET'])
-def cached_by_service_region(service, region):
+def cached_by_service(service):
     """
     API entry point to retrieve items from the cache under the service.
+    Optional limit and cursor query parameters return the items one page at a time.
+    The fields=summary query parameter returns compact records without the data.
+    A matching If-None-Match header returns 304 Not Modified.
+    """
+    limit, cursor = paging_parameters()
+    fields = fields_parameter()
+    if limit is None and cursor is None:
+        etag = cache.service_etag(service, fields=fields)
+        if not_modified(etag):
+            return conditional_response(None, etag)
+    return conditional_response(cache.cached_by_service(service, limit=limit, cursor=cursor, fields=fields))
+
+
+@app.route('/cached/stats', cors=True, api_key_required=True, methods=['GET'])
+def read_cache_stats():
     """
-    return cache.cached_by_service(service)
+    API entry point to retrieve the read cache statistics of the serving container.
+    """
+    return cache.read_cache_stats()
+
+
+@app.route('/cached/changes', cors=True, api_key_required=True, methods=['GET'])
+def cached_changes():
+    """
+    API entry point to retrieve the items changed or deleted since a watermark.
+    The since query parameter is the watermark returned by the previous call, in epoch seconds.
+    Optional limit and cursor query parameters return the changes one page at a time.
+    """
+    params = app.current_request.query_params or {}
+    limit, cursor = paging_parameters()
+    return cache.cached_changes(params.get("since", 0), limit=limit, cursor=cursor)
 
 
 @app.route('/cached/arn/{arn}', cors=True, api_key_required=True, methods=['GET'])
@@ -156,6 +237,14 @@ def cached_by_arn(arn):
     return cache.cached_by_arn(arn)
 
 
+@app.route('/cached/arns', cors=True, api_key_required=True, methods=['POST'], content_types=['application/json'])
+def cached_by_arns():
+    """
+    API entry point to retrieve many items from the cache by a list of ARNs.
+    """
+    return cache.cached_by_arns(app.current_request.json_body)
+
+
 @app.route('/cached', cors=True, api_key_required=True, methods=['PUT', 'POST'], content_types=['application/json', 'application/x-www-form-urlencoded'])
 def put_cached_data():
     """
@@ -233,7 +322,7 @@ def alarms_for_subscriber(resource_arn):
     """
     API entry point to return all alarms subscribed to by a node.
     """
-    return cloudwatch_data.alarms_for_subscriber(resource_arn)
+    return conditional_response(cloudwatch_data.alarms_for_subscriber(resource_arn))
 
 
 @app.route('/cloudwatch/alarms/subscribed', cors=True, api_key_required=True, methods=['GET'])
@@ -249,7 +338,7 @@ def get_cloudwatch_events_state(state):
     """
     API entry point to retrieve all alert events in a given state (set, clear).
     """
-    return cloudwatch_data.get_cloudwatch_events_state(state)
+    return conditional_response(cloudwatch_data.get_cloudwatch_events_state(state))
 
 
 @app.route('/cloudwatch/events/state/{state}/{source}', cors=True, api_key_required=True, methods=['GET'])
@@ -265,7 +354,7 @@ def get_cloudwatch_events_state_groups(state):
     """
     API entry point to retrieve all pipeline events in a given state (set, clear) and grouped by pipeline state (down, degraded, running)
     """
-    return cloudwatch_data.get_cloudwatch_events_state_groups(state)
+    return conditional_response(cloudwatch_data.get_cloudwatch_events_state_groups(state))
 
 
 @app.route('/cloudwatch/events/all/{resource_arn}', cors=True, api_key_required=True, methods=['GET'])
@@ -304,21 +393,9 @@ def ping():
 def update_nodes(event):
     """
     Entry point for the CloudWatch scheduled task to discover and cache services.
+    Work is packed into the time left and continues with the next invocation.
     """
-    # get this lambda's timeout value
-    lambda_client = boto3.client("lambda")
-    this_lambda = lambda_client.get_function(FunctionName=event.context.invoked_function_arn)
-    # calculate millis
-    total_ms = int(this_lambda['Configuration']['Timeout']) * 1000
-    # we need 25% of our total run time remaining to keep going
-    min_remain_ms = int(total_ms * 0.25)
-    # loop until the remaining time is less than the minimum
-    while min_remain_ms < event.context.get_remaining_time_in_millis():
-        periodic_handlers.update_nodes()
-        time.sleep(NODE_UPDATE_REGION_PAUSE_SECONDS)
-        # print the stats
-        print("remaining time {}ms".format(event.context.get_remaining_time_in_millis()))
-        print("required remaining time {}ms".format(min_remain_ms))
+    return periodic_handlers.update_nodes(event.context.get_remaining_time_in_millis)
 
 
 @app.schedule(Rate(CONNECTION_UPDATE_RATE_MINUTES, unit=Rate.MINUTES))
@@ -23,6 +23,9 @@ ENV_VARS = {
     "CONTENT_TABLE_NAME": {
         "Ref": "ContentTableName"
     },
+    "CONTENT_DATA_CODEC": {
+        "Ref": "ContentDataCodec"
+    },
     "EVENTS_TABLE_NAME": {
         "Ref": "EventsTableName"
     },
@@ -95,6 +98,12 @@ PARAMETERS = {
         "MinLength": 1,
         "ConstraintDescription": "Please enter a value for this field."
     },
+    "ContentDataCodec": {
+        "Default": "json",
+        "Description": "This is the encoding of large cached item data: json stores plain text, zlib stores compressed binary.",
+        "Type": "String",
+        "AllowedValues": ["json", "zlib"]
+    },
     "BucketBasename": {
         "Description": "This is the basename of the bucket that holds the MSAM code base.",
         "Default": "rodeolabz",
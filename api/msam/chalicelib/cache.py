@@ -4,14 +4,26 @@
 This file contains helper functions for updating and querying the cache.
 """
 
+import base64
+import hashlib
+import json
 import os
+import random
+import threading
+import time
+from collections import OrderedDict
 from urllib.parse import unquote
 
-import boto3
 from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeDeserializer
 from botocore.exceptions import ClientError
 from botocore.config import Config
 
+from chalicelib import catalog
+from chalicelib import clients
+from chalicelib import codec
+from chalicelib import content_items
+
 # table names generated by CloudFormation
 CONTENT_TABLE_NAME = os.environ["CONTENT_TABLE_NAME"]
 
@@ -19,16 +31,72 @@ CONTENT_TABLE_NAME = os.environ["CONTENT_TABLE_NAME"]
 STAMP = os.environ["BUILD_STAMP"]
 MSAM_BOTO3_CONFIG = Config(user_agent="aws-media-services-applications-mapper/{stamp}/cache.py".format(stamp=STAMP))
 
+# seconds query results are kept in memory by warm containers; writes are only invalidated
+# in the container that made them, so other containers serve results up to this old
+READ_CACHE_DEFAULT_TTL_SECONDS = 15
+
+# services that change rarely can be kept longer
+READ_CACHE_SERVICE_TTL_SECONDS = {
+    "s3": 60,
+    "cloudfront-distribution": 60,
+    "speke-keyserver": 60
+}
+
+# approximate memory ceiling for cached query results, least recently used go first
+READ_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# largest page returned when a caller asks for paged results
+CACHE_PAGE_MAX_ITEMS = 1000
+
+# maximum number of keys in a single BatchGetItem call
+BATCH_GET_MAX_KEYS = 100
+
+# number of times unprocessed keys are requested again before giving up
+BATCH_GET_MAX_RETRIES = 8
+
+# base delay for exponential backoff between retries of unprocessed keys
+BATCH_GET_BACKOFF_SECONDS = 0.05
+
+# attributes of the compact records returned by summary queries
+SUMMARY_ATTRIBUTES = ["arn", "service", "region", "name", "from", "to", "updated"]
+SUMMARY_FIELDS = "summary"
 
-def cached_by_service(service):
+# largest number of ARNs resolved by one bulk request
+CACHED_ARNS_MAX = 1000
+
+# index of content items by the hour they were last written, used by the change feed
+CHANGES_INDEX_NAME = "ChangeBucketIndex"
+
+# writes land a little after their updated stamp, the next watermark overlaps by this much
+CHANGES_SETTLE_SECONDS = 30
+
+DESERIALIZER = TypeDeserializer()
+
+# key -> (expiration, size, service, items, etag or None until first asked for)
+READ_CACHE = OrderedDict()
+READ_CACHE_LOCK = threading.Lock()
+READ_CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "bytes": 0}
+
+
+def cached_by_service(service, limit=None, cursor=None, fields=None):
     """
     Retrieve items from the cache for the given service name.
+    Passing a limit or cursor returns one page of items and the cursor for the next page.
+    Passing fields="summary" returns compact records without the data attribute.
     """
+    if limit is not None or cursor is not None:
+        return cached_page(Key('service').eq(service), limit, cursor, fields)
+    cache_key = ("service", service)
+    if fields == SUMMARY_FIELDS:
+        return cached_summary(cache_key, service, Key('service').eq(service))
+    items = read_cache_get(cache_key)
+    if items is not None:
+        return items
     try:
         ddb_table_name = CONTENT_TABLE_NAME
         # ddb_index_name = "service-index"
         ddb_index_name = "ServiceRegionIndex"
-        ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         ddb_table = ddb_resource.Table(ddb_table_name)
         response = ddb_table.query(IndexName=ddb_index_name, KeyConditionExpression=Key('service').eq(service))
         items = response["Items"]
@@ -36,63 +104,354 @@ def cached_by_service(service):
         while "LastEvaluatedKey" in response:
             # query again with start key
             response = ddb_table.query(IndexName=ddb_index_name, KeyConditionExpression=Key('service').eq(service), ExclusiveStartKey=response['LastEvaluatedKey'])
-            items = items + response["Items"]
+            items.extend(response["Items"])
         # return when done paging
-        return items
+        items = [codec.decode_item(item) for item in items]
+        read_cache_put(cache_key, service, items)
+        return list(items)
     except ClientError as error:
         print(error)
         return {"message": str(error)}
 
 
-def cached_by_service_region(service, region):
+def cached_by_service_region(service, region, limit=None, cursor=None, fields=None):
     """
     API entry point to retrieve items from the cache under the service and region name.
+    Passing a limit or cursor returns one page of items and the cursor for the next page.
+    Passing fields="summary" returns compact records without the data attribute.
     """
+    service = unquote(service)
+    region = unquote(region)
+    if limit is not None or cursor is not None:
+        return cached_page(Key('service').eq(service) & Key('region').eq(region), limit, cursor, fields)
+    cache_key = ("service-region", service, region)
+    if fields == SUMMARY_FIELDS:
+        return cached_summary(cache_key, service, Key('service').eq(service) & Key('region').eq(region))
+    items = read_cache_get(cache_key)
+    if items is not None:
+        return items
     try:
-        service = unquote(service)
-        region = unquote(region)
         ddb_table_name = CONTENT_TABLE_NAME
         ddb_index_name = "ServiceRegionIndex"
-        ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         ddb_table = ddb_resource.Table(ddb_table_name)
         response = ddb_table.query(IndexName=ddb_index_name, KeyConditionExpression=Key('service').eq(service) & Key('region').eq(region))
         items = response["Items"]
         while "LastEvaluatedKey" in response:
             response = ddb_table.query(IndexName=ddb_index_name, KeyConditionExpression=Key('service').eq(service) & Key('region').eq(region), ExclusiveStartKey=response['LastEvaluatedKey'])
-            items = items + response["Items"]
+            items.extend(response["Items"])
+        items = [codec.decode_item(item) for item in items]
+        read_cache_put(cache_key, service, items)
+        return list(items)
+    except ClientError as error:
+        print(error)
+        return {"message": str(error)}
+
+
+def cached_summary(cache_key, service, key_condition):
+    """
+    Retrieve the summary records for a service index query, reusing a full result held in memory.
+    """
+    summary_key = (SUMMARY_FIELDS,) + cache_key
+    items = read_cache_get(summary_key)
+    if items is not None:
         return items
+    # a full result in memory already has everything a summary needs
+    items = read_cache_get(cache_key)
+    if items is not None:
+        items = [summarize_item(item) for item in items]
+        read_cache_put(summary_key, service, items)
+        return list(items)
+    try:
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_table = ddb_resource.Table(CONTENT_TABLE_NAME)
+        query_args = dict(IndexName="ServiceRegionIndex", KeyConditionExpression=key_condition, **projection_arguments(SUMMARY_ATTRIBUTES))
+        response = ddb_table.query(**query_args)
+        items = response["Items"]
+        while "LastEvaluatedKey" in response:
+            response = ddb_table.query(ExclusiveStartKey=response['LastEvaluatedKey'], **query_args)
+            items.extend(response["Items"])
+        read_cache_put(summary_key, service, items)
+        return list(items)
     except ClientError as error:
         print(error)
         return {"message": str(error)}
 
 
+def summarize_item(item):
+    """
+    Return the summary record of a cache item.
+    """
+    return {name: item[name] for name in SUMMARY_ATTRIBUTES if name in item}
+
+
+def projection_arguments(attributes):
+    """
+    Return the ProjectionExpression and ExpressionAttributeNames for reading only the given attributes.
+    """
+    # attribute names like data and name are reserved words in expressions
+    return {
+        "ProjectionExpression": ", ".join("#attr{}".format(position) for position in range(len(attributes))),
+        "ExpressionAttributeNames": {"#attr{}".format(position): name for position, name in enumerate(attributes)}
+    }
+
+
 def cached_by_arn(arn):
     """
     API entry point to retrieve an item from the cache under the ARN.
     """
+    arn = unquote(arn)
+    cache_key = ("arn", arn)
+    items = read_cache_get(cache_key)
+    if items is not None:
+        return items
     try:
-        arn = unquote(arn)
         ddb_table_name = CONTENT_TABLE_NAME
-        ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         ddb_table = ddb_resource.Table(ddb_table_name)
         response = ddb_table.query(KeyConditionExpression=Key('arn').eq(arn))
         items = response["Items"]
         while "LastEvaluatedKey" in response:
             response = ddb_table.query(KeyConditionExpression=Key('arn').eq(arn), ExclusiveStartKey=response['LastEvaluatedKey'])
-            items = items + response["Items"]
-        return items
+            items.extend(response["Items"])
+        items = [codec.decode_item(item) for item in items if not content_items.is_tombstone(item)]
+        read_cache_put(cache_key, items[0]["service"] if items else None, items)
+        return list(items)
     except ClientError as error:
         print(error)
         return {"message": str(error)}
 
 
+def cached_by_arns(arns):
+    """
+    API entry point to retrieve many items from the cache by ARN in one call.
+    Returns the items keyed by ARN, the list of ARNs that were not found and the list of ARNs
+    DynamoDB left unprocessed, which the caller can ask for again.
+    """
+    try:
+        if not isinstance(arns, list) or not all(isinstance(arn, str) for arn in arns):
+            raise ValueError("expected a list of ARNs")
+        if len(arns) > CACHED_ARNS_MAX:
+            raise ValueError("at most {} ARNs per request".format(CACHED_ARNS_MAX))
+        found = {}
+        missing = []
+        unprocessed = set()
+        for arn in dict.fromkeys(arns):
+            items = read_cache_get(("arn", arn))
+            if items is None:
+                missing.append(arn)
+            elif items:
+                found[arn] = items[0]
+        if missing:
+            ddb_client = clients.client('dynamodb', config=MSAM_BOTO3_CONFIG)
+            for item in batch_get_items(ddb_client, missing, unprocessed=unprocessed):
+                if not content_items.is_tombstone(item):
+                    found[item["arn"]] = codec.decode_item(item)
+            # an unprocessed ARN was never looked up, so it is not remembered as missing
+            for arn in missing:
+                if arn not in unprocessed:
+                    read_cache_put(("arn", arn), found[arn]["service"] if arn in found else None, [found[arn]] if arn in found else [])
+        return {
+            "items": found,
+            "not_found": [arn for arn in dict.fromkeys(arns) if arn not in found and arn not in unprocessed],
+            "unprocessed": sorted(unprocessed)
+        }
+    except (ClientError, ValueError) as error:
+        print(error)
+        return {"message": str(error)}
+
+
+def cached_changes(since, limit=None, cursor=None):
+    """
+    API entry point to retrieve the items written or deleted after the since watermark (epoch seconds).
+    Returns the upserted items, the deleted ARNs, the ARNs of changed items DynamoDB left unprocessed
+    and the watermark for the next call.
+    A reset flag means the watermark is older than the tombstones, or more items changed than
+    one response holds, and the caller must reload everything.
+    Passing a limit or cursor returns the changes one page at a time with the cursor of the next page,
+    every page carries the watermark of the first.
+    """
+    try:
+        if cursor:
+            position = decode_changes_cursor(cursor)
+        else:
+            now = int(time.time())
+            position = {"since": int(since), "now": now, "bucket": content_items.change_bucket(int(since)), "start": None}
+        result = {"upserted": [], "deleted": [], "unprocessed": [], "watermark": position["now"] - CHANGES_SETTLE_SECONDS, "reset": False}
+        if position["since"] < position["now"] - content_items.TOMBSTONE_TTL_SECONDS:
+            result["reset"] = True
+            return result
+        paged = limit is not None or cursor is not None
+        if limit is None:
+            limit = CACHE_PAGE_MAX_ITEMS
+        changed, next_position = changes_page(position, max(1, min(limit, CACHE_PAGE_MAX_ITEMS)))
+        if paged:
+            result["cursor"] = encode_changes_cursor(next_position)
+        elif next_position is not None:
+            # too many changes for one response, reloading is cheaper than replaying them
+            result["reset"] = True
+            return result
+        upserted = []
+        for item in changed:
+            if content_items.is_tombstone(item):
+                result["deleted"].append({"arn": item["arn"], "service": item.get("deleted_service"), "updated": int(item["updated"])})
+            else:
+                upserted.append(item["arn"])
+        # the index only projects keys and tombstone attributes, fetch the full items
+        if upserted:
+            ddb_client = clients.client('dynamodb', config=MSAM_BOTO3_CONFIG)
+            unprocessed = set()
+            for item in batch_get_items(ddb_client, upserted, unprocessed=unprocessed):
+                if not content_items.is_tombstone(item):
+                    result["upserted"].append(codec.decode_item(item))
+            # changed items that could not be fetched, the caller asks for them with POST /cached/arns
+            result["unprocessed"] = sorted(unprocessed)
+        return result
+    except (ClientError, TypeError, ValueError) as error:
+        print(error)
+        return {"message": str(error)}
+
+
+def changes_page(position, limit):
+    """
+    Query the change feed index from a position, one hour bucket after another, for up to limit entries.
+    Returns the index entries and the position of the next page, None when the feed is exhausted.
+    """
+    ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+    ddb_table = ddb_resource.Table(CONTENT_TABLE_NAME)
+    changed = []
+    bucket = position["bucket"]
+    start_key = position["start"]
+    last_bucket = content_items.change_bucket(position["now"])
+    while bucket <= last_bucket:
+        query_args = {
+            "IndexName": CHANGES_INDEX_NAME,
+            "KeyConditionExpression": Key(content_items.CHANGE_BUCKET_ATTRIBUTE).eq(bucket) & Key('updated').gt(position["since"]),
+            "Limit": limit - len(changed)
+        }
+        if start_key:
+            query_args["ExclusiveStartKey"] = start_key
+        response = ddb_table.query(**query_args)
+        changed.extend(response["Items"])
+        start_key = response.get("LastEvaluatedKey")
+        if not start_key:
+            bucket = bucket + 1
+        if len(changed) >= limit:
+            break
+    if bucket > last_bucket:
+        return changed, None
+    return changed, dict(position, bucket=bucket, start=start_key)
+
+
+def encode_changes_cursor(position):
+    """
+    Turn a change feed position into an opaque, URL-safe cursor. None means no more pages.
+    """
+    if position is None:
+        return None
+    start_key = position["start"]
+    if start_key:
+        # the index keys hold numbers, which JSON cannot take as Decimal
+        start_key = {key: value if isinstance(value, str) else int(value) for key, value in start_key.items()}
+    return encode_cursor(dict(position, start=start_key))
+
+
+def decode_changes_cursor(cursor):
+    """
+    Turn a cursor from encode_changes_cursor back into a change feed position.
+    """
+    position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    if not isinstance(position, dict) or not all(isinstance(position.get(key), int) for key in ["since", "now", "bucket"]):
+        raise ValueError("invalid cursor")
+    start_key = position.get("start")
+    if start_key is not None and (not isinstance(start_key, dict) or not all(isinstance(value, (str, int)) for value in start_key.values())):
+        raise ValueError("invalid cursor")
+    return position
+
+
+def batch_get_items(ddb_client, arns, attributes=None, unprocessed=None):
+    """
+    Retrieve content items by ARN in groups of 100 with BatchGetItem.
+    Only the listed attributes are returned if given.
+    Unprocessed keys are requested again with exponential backoff. The ARNs still unprocessed
+    after the last retry are added to the unprocessed set if given, they may well exist.
+    """
+    items = []
+    arns = list(dict.fromkeys(arns))
+    for index in range(0, len(arns), BATCH_GET_MAX_KEYS):
+        request = {"Keys": [{"arn": {"S": arn}} for arn in arns[index:index + BATCH_GET_MAX_KEYS]]}
+        if attributes:
+            request.update(projection_arguments(attributes))
+        retries = 0
+        while request:
+            response = ddb_client.batch_get_item(RequestItems={CONTENT_TABLE_NAME: request})
+            items.extend(deserialize_item(item) for item in response.get("Responses", {}).get(CONTENT_TABLE_NAME, []))
+            request = response.get("UnprocessedKeys", {}).get(CONTENT_TABLE_NAME)
+            if request:
+                if retries >= BATCH_GET_MAX_RETRIES:
+                    print("giving up on {} unprocessed keys".format(len(request["Keys"])))
+                    if unprocessed is not None:
+                        unprocessed.update(key["arn"]["S"] for key in request["Keys"])
+                    break
+                time.sleep(random.uniform(0, BATCH_GET_BACKOFF_SECONDS * (2 ** retries)))
+                retries += 1
+    return items
+
+
+def deserialize_item(item):
+    """
+    Convert an item in the DynamoDB attribute value format into a cache item.
+    """
+    return {key: DESERIALIZER.deserialize(value) for key, value in item.items()}
+
+
+def cached_page(key_condition, limit, cursor, fields=None):
+    """
+    Retrieve a single page of items from the service index starting at an opaque cursor.
+    """
+    try:
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_table = ddb_resource.Table(CONTENT_TABLE_NAME)
+        if limit is None:
+            limit = CACHE_PAGE_MAX_ITEMS
+        query_args = {"IndexName": "ServiceRegionIndex", "KeyConditionExpression": key_condition, "Limit": max(1, min(limit, CACHE_PAGE_MAX_ITEMS))}
+        if cursor:
+            query_args["ExclusiveStartKey"] = decode_cursor(cursor)
+        if fields == SUMMARY_FIELDS:
+            query_args.update(projection_arguments(SUMMARY_ATTRIBUTES))
+        response = ddb_table.query(**query_args)
+        return {"items": [codec.decode_item(item) for item in response["Items"]], "cursor": encode_cursor(response.get("LastEvaluatedKey"))}
+    except (ClientError, ValueError) as error:
+        print(error)
+        return {"message": str(error)}
+
+
+def encode_cursor(last_evaluated_key):
+    """
+    Turn a DynamoDB LastEvaluatedKey into an opaque, URL-safe cursor. None means no more pages.
+    """
+    if not last_evaluated_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key, sort_keys=True).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Turn a cursor from encode_cursor back into an ExclusiveStartKey.
+    """
+    start_key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    if not isinstance(start_key, dict) or not all(isinstance(value, str) for value in start_key.values()):
+        raise ValueError("invalid cursor")
+    return start_key
+
+
 def put_cached_data(request):
     """
     API entry point to add items to the cache.
     """
     try:
         ddb_table_name = CONTENT_TABLE_NAME
-        ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         ddb_table = ddb_resource.Table(ddb_table_name)
         cache_entries = request.json_body
         print(cache_entries)
@@ -101,7 +460,10 @@ def put_cached_data(request):
             # workaround for dynamodb numeric types
             entry["expires"] = int(entry["expires"])
             entry["updated"] = int(entry["updated"])
+            entry[content_items.CHANGE_BUCKET_ATTRIBUTE] = content_items.change_bucket(entry["updated"])
             ddb_table.put_item(Item=entry)
+        invalidate_services({entry["service"] for entry in cache_entries})
+        invalidate_arns([entry["arn"] for entry in cache_entries])
         return {"message": "saved"}
     except ClientError as error:
         print(error)
@@ -115,23 +477,141 @@ def delete_cached_data(arn):
     try:
         arn = unquote(arn)
         ddb_table_name = CONTENT_TABLE_NAME
-        ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         ddb_table = ddb_resource.Table(ddb_table_name)
-        # cache_entries = request.json_body
-        # print(cache_entries)
-        # write the channel nodes to the database
-        # for entry in cache_entries:
-        ddb_table.delete_item(Key={"arn": arn})
+        # replace the item with a tombstone so the change feed can report the deletion
+        response = ddb_table.get_item(Key={"arn": arn}, ProjectionExpression="#service", ExpressionAttributeNames={"#service": "service"})
+        if "Item" in response and "service" in response["Item"]:
+            ddb_table.put_item(Item=content_items.tombstone_item(arn, response["Item"]["service"]))
+            invalidate_services([response["Item"]["service"]])
+        invalidate_arns([arn])
         return {"message": "deleted"}
     except ClientError as error:
         print(error)
         return {"message": str(error)}
 
 
+def read_cache_get(key):
+    """
+    Return a copy of the query result stored under key, or None if missing or expired.
+    """
+    with READ_CACHE_LOCK:
+        entry = READ_CACHE.get(key)
+        if entry is not None and entry[0] > time.time():
+            READ_CACHE.move_to_end(key)
+            READ_CACHE_STATS["hits"] += 1
+            return list(entry[3])
+        if entry is not None:
+            read_cache_remove(key)
+        READ_CACHE_STATS["misses"] += 1
+    return None
+
+
+def read_cache_put(key, service, items):
+    """
+    Store a query result under key, evicting least recently used results above the memory ceiling.
+    """
+    ttl = READ_CACHE_SERVICE_TTL_SECONDS.get(service, READ_CACHE_DEFAULT_TTL_SECONDS)
+    # the serialized data dominates the size of an item
+    size = sum(len(item.get("data", "")) + 256 for item in items)
+    with READ_CACHE_LOCK:
+        if key in READ_CACHE:
+            read_cache_remove(key)
+        if size > READ_CACHE_MAX_BYTES:
+            return
+        READ_CACHE[key] = (time.time() + ttl, size, service, items, None)
+        READ_CACHE_STATS["bytes"] += size
+        while READ_CACHE_STATS["bytes"] > READ_CACHE_MAX_BYTES:
+            read_cache_remove(next(iter(READ_CACHE)))
+            READ_CACHE_STATS["evictions"] += 1
+
+
+def read_cache_etag(key):
+    """
+    Return the ETag of the query result stored under key, or None if missing or expired.
+    The ETag is hashed on first use and kept with the result, so later conditional requests
+    on a warm container skip serializing the items.
+    """
+    with READ_CACHE_LOCK:
+        entry = READ_CACHE.get(key)
+        if entry is None or entry[0] <= time.time():
+            return None
+        if entry[4] is not None:
+            return entry[4]
+    # hashed outside the lock, the stored items are not modified once cached
+    etag = result_etag(entry[3])
+    with READ_CACHE_LOCK:
+        # keep the ETag unless the result was replaced or dropped meanwhile
+        if READ_CACHE.get(key) is entry:
+            READ_CACHE[key] = entry[:4] + (etag,)
+    return etag
+
+
+def service_etag(service, region=None, fields=None):
+    """
+    Return the ETag of the in-memory query result for a service, or service and region, if there is one.
+    """
+    if region is None:
+        cache_key = ("service", service)
+    else:
+        cache_key = ("service-region", unquote(service), unquote(region))
+    if fields == SUMMARY_FIELDS:
+        cache_key = (SUMMARY_FIELDS,) + cache_key
+    return read_cache_etag(cache_key)
+
+
+def result_etag(result):
+    """
+    Return a strong ETag for an API result, stable across containers for identical results.
+    """
+    canonical = json.dumps(result, default=str, sort_keys=True, separators=(',', ':'))
+    return '"{}"'.format(hashlib.sha1(canonical.encode('utf-8')).hexdigest())
+
+
+def read_cache_remove(key):
+    """
+    Remove a query result from memory. The caller holds the lock.
+    """
+    entry = READ_CACHE.pop(key)
+    READ_CACHE_STATS["bytes"] -= entry[1]
+
+
+def invalidate_services(services):
+    """
+    Drop every in-memory query result that contains items of the given services.
+    """
+    services = set(services)
+    with READ_CACHE_LOCK:
+        for key in [key for key, entry in READ_CACHE.items() if entry[2] in services]:
+            read_cache_remove(key)
+            READ_CACHE_STATS["invalidations"] += 1
+
+
+def invalidate_arns(arns):
+    """
+    Drop the in-memory query results for the given ARNs.
+    """
+    with READ_CACHE_LOCK:
+        for arn in arns:
+            if ("arn", arn) in READ_CACHE:
+                read_cache_remove(("arn", arn))
+                READ_CACHE_STATS["invalidations"] += 1
+
+
+def read_cache_stats():
+    """
+    API entry point to return the hit and miss statistics of this container's read cache.
+    """
+    with READ_CACHE_LOCK:
+        stats = dict(READ_CACHE_STATS)
+        stats["entries"] = len(READ_CACHE)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0
+    return stats
+
+
 def regions():
     """
     API entry point to retrieve all regions based on EC2.
     """
-    service = boto3.client("ec2", config=MSAM_BOTO3_CONFIG)
-    response = service.describe_regions()
-    return response["Regions"]
+    return catalog.regions()
@@ -0,0 +1,137 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+This file contains helper functions for the catalog of enabled regions and
+the regions where each discovered service is available. The catalog is
+stored as a setting and kept in memory by warm containers.
+"""
+
+import os
+import threading
+import time
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError
+from botocore.exceptions import ClientError
+
+from chalicelib import clients
+from chalicelib import settings as msam_settings
+
+# user-agent config
+STAMP = os.environ["BUILD_STAMP"]
+MSAM_BOTO3_CONFIG = Config(user_agent="aws-media-services-applications-mapper/{stamp}/catalog.py".format(stamp=STAMP))
+
+# setting holding the catalog, {"updated": seconds, "regions": [...], "services": {service: [region names]}}
+CATALOG_KEY = "region-catalog"
+
+# seconds the catalog is used before the regions and services are looked up again
+CATALOG_REFRESH_SECONDS = int(os.environ.get("CATALOG_REFRESH_SECONDS", "86400"))
+
+# seconds after a failed lookup before the regions and services are looked up again
+CATALOG_RETRY_SECONDS = int(os.environ.get("CATALOG_RETRY_SECONDS", "300"))
+
+# services looked up when the catalog is built, other services are added when first asked for
+CATALOG_SERVICES = ["medialive", "mediapackage", "mediastore", "mediaconnect", "mediatailor", "ec2", "ssm"]
+
+# the catalog of this container
+CATALOG = {}
+CATALOG_LOCK = threading.Lock()
+
+# time and error of the last failed lookup of this container
+CATALOG_FAILURE = {}
+
+
+def catalog():
+    """
+    Return the catalog, from memory while it is fresh, otherwise from the setting,
+    and build and store a new one when the setting is missing or stale.
+    The lookups run without holding CATALOG_LOCK, only the result is published under it.
+    After a failed lookup the last catalog is used for CATALOG_RETRY_SECONDS.
+    """
+    with CATALOG_LOCK:
+        if fresh(CATALOG):
+            return CATALOG
+        if time.time() - CATALOG_FAILURE.get("failed", 0) < CATALOG_RETRY_SECONDS:
+            if CATALOG:
+                return CATALOG
+            raise CATALOG_FAILURE["error"]
+    stored = msam_settings.get_setting(CATALOG_KEY)
+    if isinstance(stored, dict) and fresh(stored):
+        return publish(stored)
+    try:
+        built = build_catalog()
+        msam_settings.put_setting(CATALOG_KEY, built)
+    except (ClientError, BotoCoreError) as error:
+        print(error)
+        with CATALOG_LOCK:
+            CATALOG_FAILURE.update(failed=time.time(), error=error)
+            # a stale catalog is better than none while the lookup fails
+            if not CATALOG and isinstance(stored, dict):
+                CATALOG.update(stored)
+            if not CATALOG:
+                raise
+            return CATALOG
+    return publish(built)
+
+
+def publish(entry):
+    """
+    Replace the catalog of this container, callers looking up the catalog at the same time
+    publish the same regions and services.
+    """
+    with CATALOG_LOCK:
+        CATALOG.clear()
+        CATALOG.update(entry)
+        CATALOG_FAILURE.clear()
+        return CATALOG
+
+
+def fresh(entry):
+    """
+    Return whether a catalog was built within the refresh interval.
+    """
+    return "updated" in entry and time.time() - int(entry["updated"]) < CATALOG_REFRESH_SECONDS
+
+
+def build_catalog():
+    """
+    Look up the enabled regions and the enabled regions where each service is available.
+    """
+    service = clients.client("ec2", config=MSAM_BOTO3_CONFIG)
+    response = service.describe_regions()
+    region_names = [region["RegionName"] for region in response["Regions"]]
+    print("built region catalog of {} regions".format(len(region_names)))
+    return {
+        "updated": int(time.time()),
+        "regions": response["Regions"],
+        "services": {service_name: service_regions(service_name, region_names) for service_name in CATALOG_SERVICES}
+    }
+
+
+def service_regions(service_name, region_names):
+    """
+    Return the given region names where the SDK knows an endpoint for the service.
+    """
+    with clients.CLIENTS_LOCK:
+        available = boto3.Session().get_available_regions(service_name)
+    return [region_name for region_name in region_names if region_name in available]
+
+
+def regions():
+    """
+    Return the enabled regions as listed by EC2.
+    """
+    return catalog()["regions"]
+
+
+def available(service_name, region_name):
+    """
+    Return whether the service is available in an enabled region.
+    """
+    services = catalog()["services"]
+    if service_name not in services:
+        region_names = [region["RegionName"] for region in regions()]
+        with CATALOG_LOCK:
+            services[service_name] = service_regions(service_name, region_names)
+    return region_name in services[service_name]
@@ -7,11 +7,11 @@ This file contains helper functions related to channels.
 import os
 from urllib.parse import unquote
 
-import boto3
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 from botocore.config import Config
 
+import chalicelib.clients as clients
 import chalicelib.settings as msam_settings
 
 # table names generated by CloudFormation
@@ -22,7 +22,7 @@ STAMP = os.environ["BUILD_STAMP"]
 MSAM_BOTO3_CONFIG = Config(user_agent="aws-media-services-applications-mapper/{stamp}/channels.py".format(stamp=STAMP))
 
 # DynamoDB
-DYNAMO_RESOURCE = boto3.resource("dynamodb", config=MSAM_BOTO3_CONFIG)
+DYNAMO_RESOURCE = clients.resource("dynamodb", config=MSAM_BOTO3_CONFIG)
 
 def delete_channel_nodes(request, name):
     """
@@ -0,0 +1,143 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+This file contains helper functions for sharing boto3 clients and resources.
+"""
+
+import os
+import threading
+
+import boto3
+import botocore.session
+from botocore.config import Config
+from botocore.credentials import CredentialProvider
+from botocore.credentials import CredentialResolver
+from botocore.credentials import DeferredRefreshableCredentials
+
+from chalicelib import governor
+from chalicelib import metrics
+
+# connections kept open per client, enough for the thread pools sharing one client
+MAX_POOL_CONNECTIONS = int(os.environ.get("BOTO3_MAX_POOL_CONNECTIONS", "25"))
+
+# (service, region, config, role ARN, governed) -> client
+CLIENTS = {}
+
+# role ARN -> session with the role's credentials, refreshed by botocore before they expire
+SESSIONS = {}
+
+# session name recorded in the CloudTrail logs of accounts discovered through a role
+ROLE_SESSION_NAME = "msam-discovery"
+
+# creating clients from the shared session is not thread-safe
+CLIENTS_LOCK = threading.Lock()
+
+# resources are not thread-safe, each thread keeps its own
+RESOURCES = threading.local()
+
+
+def pool_config(config):
+    """
+    Return the config with the connection pool size applied.
+    """
+    pool = Config(max_pool_connections=MAX_POOL_CONNECTIONS)
+    if config is None:
+        return pool
+    return config.merge(pool)
+
+
+def client(service_name, region_name=None, config=None, role_arn=None, governed=False):
+    """
+    Return a shared client for the service, region and config, creating it on first use.
+    With a role ARN the client acts in the role's account with credentials of the assumed role.
+    Governed clients are paced by the governor and are meant for discovery, so API requests
+    are never held back behind a sweep.
+    Clients are thread-safe and can be used by any number of workers.
+    """
+    key = (service_name, region_name, config, role_arn, governed)
+    service_client = CLIENTS.get(key)
+    if service_client is None:
+        with CLIENTS_LOCK:
+            service_client = CLIENTS.get(key)
+            if service_client is None:
+                factory = boto3.client if role_arn is None else role_session(role_arn).client
+                service_client = factory(service_name, region_name=region_name, config=pool_config(config))
+                metrics.instrument(service_client)
+                if governed:
+                    governor.govern(service_client, role_account(role_arn))
+                CLIENTS[key] = service_client
+    return service_client
+
+
+def role_session(role_arn):
+    """
+    Return the session of an assumed role, creating it on first use.
+    The caller holds CLIENTS_LOCK. The role is assumed by the first request of a client,
+    outside the lock, and the credentials are reused until shortly before they expire,
+    then botocore assumes the role again.
+    """
+    session = SESSIONS.get(role_arn)
+    if session is None:
+        core_session = botocore.session.Session()
+        core_session.register_component("credential_provider", CredentialResolver([AssumedRoleProvider(role_arn)]))
+        session = boto3.Session(botocore_session=core_session)
+        SESSIONS[role_arn] = session
+    return session
+
+
+class AssumedRoleProvider(CredentialProvider):
+    """
+    Credential provider of a session that acts in another account through an assumed role.
+    """
+    METHOD = "custom-msam-assume-role"
+    CANONICAL_NAME = "custom-msam-assume-role"
+
+    def __init__(self, role_arn):
+        super().__init__()
+        self.role_arn = role_arn
+        # created here while the caller holds CLIENTS_LOCK, assume_role runs on any thread
+        self.sts = boto3.client("sts", config=pool_config(None))
+
+    def load(self):
+        """
+        Return credentials that assume the role on first use and again shortly before they expire.
+        Clients are created while holding CLIENTS_LOCK, so no STS request is made here.
+        """
+        return DeferredRefreshableCredentials(refresh_using=self.assume_role, method=self.METHOD)
+
+    def assume_role(self):
+        """
+        Assume the role with the deployment's own credentials.
+        """
+        credentials = self.sts.assume_role(RoleArn=self.role_arn, RoleSessionName=ROLE_SESSION_NAME)["Credentials"]
+        return {
+            "access_key": credentials["AccessKeyId"],
+            "secret_key": credentials["SecretAccessKey"],
+            "token": credentials["SessionToken"],
+            "expiry_time": credentials["Expiration"].isoformat()
+        }
+
+
+def role_account(role_arn):
+    """
+    Return the account id of a role ARN, None for the deployment's own account.
+    """
+    if role_arn is None:
+        return None
+    return role_arn.split(":")[4]
+
+
+def resource(service_name, region_name=None, config=None):
+    """
+    Return a resource for the service, region and config that is reused by the calling thread.
+    """
+    if not hasattr(RESOURCES, "cache"):
+        RESOURCES.cache = {}
+    key = (service_name, region_name, config)
+    service_resource = RESOURCES.cache.get(key)
+    if service_resource is None:
+        with CLIENTS_LOCK:
+            service_resource = boto3.resource(service_name, region_name=region_name, config=pool_config(config))
+        RESOURCES.cache[key] = service_resource
+    return service_resource
+
@@ -10,12 +10,13 @@ import os
 import time
 from urllib.parse import unquote
 
-import boto3
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 from botocore.config import Config
 from jsonpath_ng import parse
 
+from chalicelib import clients
+
 # table names generated by CloudFormation
 ALARMS_TABLE_NAME = os.environ["ALARMS_TABLE_NAME"]
 EVENTS_TABLE_NAME = os.environ["EVENTS_TABLE_NAME"]
@@ -32,7 +33,7 @@ def update_alarm_records(region_name, alarm, subscriber_arns):
     """
     try:
         ddb_table_name = ALARMS_TABLE_NAME
-        ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         ddb_table = ddb_resource.Table(ddb_table_name)
         region_alarm_name = "{}:{}".format(region_name, alarm["AlarmName"])
         if 'Namespace' in alarm:
@@ -60,7 +61,7 @@ def update_alarm_subscriber(region_name, alarm_name, subscriber_arn):
     """
     try:
         print(f"update subscriber {subscriber_arn} alarm {alarm_name} in region {region_name}")
-        cloudwatch = boto3.client('cloudwatch', region_name=region_name, config=MSAM_BOTO3_CONFIG)
+        cloudwatch = clients.client('cloudwatch', region_name=region_name, config=MSAM_BOTO3_CONFIG)
         response = cloudwatch.describe_alarms(AlarmNames=[alarm_name])
         alarms = response['CompositeAlarms'] + response['MetricAlarms']
         for alarm in alarms:
@@ -75,7 +76,7 @@ def update_alarms(region_name, alarm_names):
     """
     try:
         print(f"update alarms {alarm_names} in region {region_name}")
-        cloudwatch = boto3.client('cloudwatch', region_name=region_name, config=MSAM_BOTO3_CONFIG)
+        cloudwatch = clients.client('cloudwatch', region_name=region_name, config=MSAM_BOTO3_CONFIG)
         response = cloudwatch.describe_alarms(AlarmNames=alarm_names)
         alarms = response['CompositeAlarms'] + response['MetricAlarms']
         for alarm in alarms:
@@ -104,7 +105,7 @@ def alarms_for_subscriber(resource_arn):
     try:
         resource_arn = unquote(resource_arn)
         ddb_table_name = ALARMS_TABLE_NAME
-        ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         ddb_table = ddb_resource.Table(ddb_table_name)
         ddb_index_name = 'ResourceArnIndex'
         response = ddb_table.query(IndexName=ddb_index_name, KeyConditionExpression=Key('ResourceArn').eq(resource_arn))
@@ -137,7 +138,7 @@ def all_subscribed_alarms():
     try:
         scanned_items = []
         ddb_table_name = ALARMS_TABLE_NAME
-        ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         ddb_table = ddb_resource.Table(ddb_table_name)
         response = ddb_table.scan(ProjectionExpression="RegionAlarmName")
         if "Items" in response:
@@ -179,7 +180,7 @@ def get_cloudwatch_alarms_region(region):
     alarms = []
     try:
         region = unquote(region)
-        client = boto3.client('cloudwatch', region_name=region, config=MSAM_BOTO3_CONFIG)
+        client = clients.client('cloudwatch', region_name=region, config=MSAM_BOTO3_CONFIG)
         response = client.describe_alarms()
         # return the response or an empty object
         for alarm in response.get("MetricAlarms",[]):
@@ -202,7 +203,7 @@ def get_cloudwatch_events_state(state):
     API entry point to retrieve all pipeline events in a given state (set, clear).
     """
     events = []
-    dynamodb = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+    dynamodb = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
     table = dynamodb.Table(EVENTS_TABLE_NAME)
     response = table.query(IndexName='AlarmStateIndex', KeyConditionExpression=Key('alarm_state').eq(state))
     if "Items" in response:
@@ -214,7 +215,7 @@ def get_cloudwatch_events_state_source(state, source):
     API entry point to retrieve all pipeline events in a given state (set, clear) from a specific source.
     """
     events = []
-    dynamodb = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+    dynamodb = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
     table = dynamodb.Table(EVENTS_TABLE_NAME)
     response = table.query(IndexName='AlarmStateSourceIndex', KeyConditionExpression=Key('alarm_state').eq(state) & Key('source').eq(source))
     if "Items" in response:
@@ -273,7 +274,7 @@ def get_cloudwatch_events_resource(resource_arn, start_time=0, end_time=0):
     cw_events = []
     try:
         resource_arn = unquote(resource_arn)
-        dynamodb = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        dynamodb = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         table = dynamodb.Table(CLOUDWATCH_EVENTS_TABLE_NAME)
         key = None
         if (start_time > 0 and end_time > 0):
@@ -302,7 +303,7 @@ def incoming_cloudwatch_alarm(event, _):
     try:
         updated_timestamp = int(time.time())
         ddb_table_name = ALARMS_TABLE_NAME
-        ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         ddb_table = ddb_resource.Table(ddb_table_name)
         for record in event["Records"]:
             region = (record["Sns"]["TopicArn"]).split(":")[3]
@@ -340,7 +341,7 @@ def subscribe_resource_to_alarm(request, alarm_name, region):
         region = unquote(region)
         region_alarm_name = "{}:{}".format(region, alarm_name)
         ddb_table_name = ALARMS_TABLE_NAME
-        ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         ddb_table = ddb_resource.Table(ddb_table_name)
         resources = request.json_body
         for resource_arn in resources:
@@ -363,7 +364,7 @@ def subscribed_with_state(alarm_state):
     try:
         alarm_state = unquote(alarm_state)
         ddb_table_name = ALARMS_TABLE_NAME
-        ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         ddb_table = ddb_resource.Table(ddb_table_name)
         response = ddb_table.query(IndexName='StateValueIndex', KeyConditionExpression=Key('StateValue').eq(alarm_state))
         for item in response["Items"]:
@@ -399,7 +400,7 @@ def subscribers_to_alarm(alarm_name, region):
         region = unquote(region)
         region_alarm_name = "{}:{}".format(region, alarm_name)
         ddb_table_name = ALARMS_TABLE_NAME
-        ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         ddb_table = ddb_resource.Table(ddb_table_name)
         ddb_index_name = 'RegionAlarmNameIndex'
         response = ddb_table.query(IndexName=ddb_index_name, KeyConditionExpression=Key('RegionAlarmName').eq(region_alarm_name))
@@ -423,7 +424,7 @@ def unsubscribe_resource_from_alarm(request, alarm_name, region):
         region = unquote(region)
         region_alarm_name = "{}:{}".format(region, alarm_name)
         ddb_table_name = ALARMS_TABLE_NAME
-        ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         ddb_table = ddb_resource.Table(ddb_table_name)
         resources = request.json_body
         for resource_arn in resources:
@@ -0,0 +1,79 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+This file contains helper functions for encoding the data attribute of content items.
+"""
+
+import os
+import zlib
+
+from boto3.dynamodb.types import Binary
+
+# encoding for new content items: json (plain string) or zlib (compressed binary)
+CONTENT_DATA_CODEC = os.environ.get("CONTENT_DATA_CODEC", "json")
+
+# smaller documents are stored as plain JSON even when compression is enabled
+COMPRESS_MIN_BYTES = 1024
+
+# name of the attribute marking an encoded data attribute, absent for plain JSON
+CODEC_ATTRIBUTE = "codec"
+
+ZLIB_CODEC = "zlib"
+
+
+def encode_data(data, codec=None):
+    """
+    Encode a JSON string for storage.
+    Returns the value for the data attribute and the codec name, None for plain JSON.
+    """
+    if codec is None:
+        codec = CONTENT_DATA_CODEC
+    if codec == ZLIB_CODEC and len(data) >= COMPRESS_MIN_BYTES:
+        return Binary(zlib.compress(data.encode('utf-8'))), ZLIB_CODEC
+    return data, None
+
+
+def encode_item(item, codec=None):
+    """
+    Encode the data attribute of a cache item in place and mark the codec used.
+    """
+    item["data"], used_codec = encode_data(decode_data(item), codec)
+    if used_codec:
+        item[CODEC_ATTRIBUTE] = used_codec
+    else:
+        item.pop(CODEC_ATTRIBUTE, None)
+    return item
+
+
+def decode_data(item):
+    """
+    Return the data attribute of a cache item as a JSON string regardless of its codec.
+    """
+    data = item["data"]
+    if item.get(CODEC_ATTRIBUTE) == ZLIB_CODEC:
+        if isinstance(data, Binary):
+            data = data.value
+        return zlib.decompress(data).decode('utf-8')
+    return data
+
+
+def decode_item(item):
+    """
+    Return a cache item with its data attribute as a JSON string and without a codec marker.
+    Plain items are returned unchanged.
+    """
+    if CODEC_ATTRIBUTE not in item:
+        return item
+    decoded = dict(item)
+    decoded["data"] = decode_data(item)
+    del decoded[CODEC_ATTRIBUTE]
+    return decoded
+
+
+def stored_size(data):
+    """
+    Return the number of bytes a data attribute value occupies in the table.
+    """
+    if isinstance(data, Binary):
+        return len(data.value)
+    return len(data.encode('utf-8'))
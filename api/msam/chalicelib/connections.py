@@ -15,11 +15,23 @@ from fuzzywuzzy import fuzz
 from jsonpath_ng import parse
 
 from chalicelib import cache
+from chalicelib import codec
 from chalicelib import content
+from chalicelib import content_items
 
 # TTL provided via CloudFormation
 CACHE_ITEM_TTL = int(os.environ["CACHE_ITEM_TTL"])
 
+# services of the discovered connections, user-defined connections are left to the user
+CONNECTION_SERVICES = [
+    "mediastore-container-medialive-input", "medialive-channel-mediapackage-channel", "medialive-channel-mediastore-container",
+    "medialive-channel-multiplex", "medialive-input-medialive-channel", "mediapackage-channel-mediapackage-origin-endpoint",
+    "multiplex-mediaconnect-flow", "s3-bucket-cloudfront-distribution", "s3-bucket-medialive-input", "cloudfront-distribution-medialive-input",
+    "mediapackage-origin-endpoint-cloudfront-distribution", "mediapackage-origin-endpoint-speke-keyserver", "mediaconnect-flow-medialive-input",
+    "mediaconnect-flow-mediaconnect-flow", "mediapackage-origin-endpoint-mediatailor-configuration", "s3-bucket-mediatailor-configuration",
+    "mediastore-container-mediatailor-configuration"
+]
+
 
 def connection_item(arn, from_arn, to_arn, service, config):
     """
@@ -34,9 +46,10 @@ def connection_item(arn, from_arn, to_arn, service, config):
         "service": service,
         "updated": now,
         "expires": now + CACHE_ITEM_TTL,
-        "data": json.dumps(config, default=str)
+        "data": json.dumps(config, default=str),
+        "digest": content_items.data_digest(config)
     }
-    return item
+    return codec.encode_item(item)
 
 
 def connection_to_ddb_item(from_arn, to_arn, service, config):
@@ -58,6 +71,104 @@ def connection_to_ddb_item_pl(from_arn, to_arn, service, config):
     return connection_item(arn, from_arn, to_arn, service, config)
 
 
+def connections_of(arns):
+    """
+    Return the arn and service of the stored discovered connections from or to any of the given ARNs.
+    """
+    arns = set(arns)
+    found = []
+    for service in CONNECTION_SERVICES:
+        for connection in content.stored_service_region(service, "global", ["arn", "from", "to"]):
+            if connection.get("from") in arns or connection.get("to") in arns:
+                found.append({"arn": connection["arn"], "service": service})
+    return found
+
+
+def new_snapshot():
+    """
+    Return an empty inventory snapshot for one connection build. Each service is read from
+    the cache and decoded once, on first use, and shared by the builders of the run.
+    """
+    return {"decoded": {}, "indexes": {}, "stats": {"queries": 0, "queries_saved": 0, "decodes": 0, "decodes_saved": 0, "indexes_saved": 0}}
+
+
+def snapshot_decoded(snapshot, service):
+    """
+    Return the (item, data) pairs of a service's cached items with their data decoded.
+    """
+    stats = snapshot["stats"]
+    decoded = snapshot["decoded"].get(service)
+    if decoded is not None:
+        stats["queries_saved"] += 1
+        stats["decodes_saved"] += len(decoded)
+        return decoded
+    items = cache.cached_by_service(service)
+    stats["queries"] += 1
+    if not isinstance(items, list):
+        # the query failed and returned its error message
+        print(items)
+        items = []
+    decoded = [(item, json.loads(item["data"])) for item in items]
+    stats["decodes"] += len(decoded)
+    snapshot["decoded"][service] = decoded
+    return decoded
+
+
+def snapshot_index(snapshot, service, name, keys_of):
+    """
+    Return the named join index of a service's decoded items, building it on first use.
+    Builders that share a name must share the keys_of function.
+    """
+    index = snapshot["indexes"].get((service, name))
+    if index is not None:
+        snapshot["stats"]["indexes_saved"] += 1
+        return index
+    index = hash_index(snapshot_decoded(snapshot, service), keys_of)
+    snapshot["indexes"][(service, name)] = index
+    return index
+
+
+def hash_index(decoded, keys_of):
+    """
+    Index (item, data) pairs by the join keys keys_of returns for their data, None keys are left out.
+    An item is indexed once per key it returns, under a position that keeps the order of the items
+    and of their keys, so a join visits matches in the same order a nested loop over the items would.
+    """
+    index = {}
+    position = 0
+    for item, data in decoded:
+        for key in keys_of(data):
+            if key is not None:
+                index.setdefault(key, []).append((position, item, data, key))
+            position += 1
+    return index
+
+
+def probe(index, keys, with_keys=False):
+    """
+    Return the (item, data) pairs indexed under any of the keys in nested loop order,
+    or (item, data, key) triples with the key that matched.
+    """
+    entries = []
+    for key in dict.fromkeys(keys):
+        if key is not None:
+            entries.extend(index.get(key, []))
+    entries.sort(key=lambda entry: entry[0])
+    if with_keys:
+        return [(item, data, key) for _, item, data, key in entries]
+    return [(item, data) for _, item, data, _ in entries]
+
+
+def container_netlocs(container_data):
+    """
+    Return the host of a MediaStore container endpoint as its join key.
+    Containers still being created have no endpoint yet.
+    """
+    if "Endpoint" not in container_data:
+        return []
+    return [urlparse(container_data["Endpoint"]).netloc]
+
+
 def fetch_running_pipelines_count(data):
     pipelines_count = 0
     # this will take care of medialive
@@ -76,61 +187,62 @@ def fetch_running_pipelines_count(data):
 def update_connection_ddb_items():
     """
     Update all connections in the cache.
+    The builders share one snapshot of the cached services. Returns the snapshot's statistics.
     """
+    snapshot = new_snapshot()
     try:
-        content.put_ddb_items(medialive_channel_mediapackage_channel_ddb_items())
-        content.put_ddb_items(medialive_channel_mediastore_container_ddb_items())
-        content.put_ddb_items(mediastore_container_medialive_input_ddb_items())
-        content.put_ddb_items(medialive_input_medialive_channel_ddb_items())
-        content.put_ddb_items(mediapackage_channel_mediapackage_endpoint_ddb_items())
-        content.put_ddb_items(s3_bucket_cloudfront_distribution_ddb_items())
-        content.put_ddb_items(s3_bucket_medialive_input_ddb_items())
-        content.put_ddb_items(cloudfront_distribution_medialive_input_ddb_items())
-        content.put_ddb_items(mediapackage_endpoint_cloudfront_distribution_by_tag_ddb_items())
-        content.put_ddb_items(mediapackage_endpoint_cloudfront_distribution_by_origin_url_ddb_items())
-        content.put_ddb_items(mediapackage_endpoint_speke_keyserver_ddb_items())
-        content.put_ddb_items(mediaconnect_flow_medialive_input_ddb_items())
-        content.put_ddb_items(mediaconnect_flow_mediaconnect_flow_ddb_items())
-        content.put_ddb_items(mediapackage_endpoint_mediatailor_configuration_ddb_items())
-        content.put_ddb_items(s3_bucket_mediatailor_configuration_ddb_items())
-        content.put_ddb_items(mediastore_container_mediatailor_configuration_ddb_items())
-        content.put_ddb_items(medialive_channel_multiplex_ddb_items())
-        content.put_ddb_items(multiplex_mediaconnect_flow_ddb_items())
+        content.put_ddb_items(medialive_channel_mediapackage_channel_ddb_items(snapshot))
+        content.put_ddb_items(medialive_channel_mediastore_container_ddb_items(snapshot))
+        content.put_ddb_items(mediastore_container_medialive_input_ddb_items(snapshot))
+        content.put_ddb_items(medialive_input_medialive_channel_ddb_items(snapshot))
+        content.put_ddb_items(mediapackage_channel_mediapackage_endpoint_ddb_items(snapshot))
+        content.put_ddb_items(s3_bucket_cloudfront_distribution_ddb_items(snapshot))
+        content.put_ddb_items(s3_bucket_medialive_input_ddb_items(snapshot))
+        content.put_ddb_items(cloudfront_distribution_medialive_input_ddb_items(snapshot))
+        content.put_ddb_items(mediapackage_endpoint_cloudfront_distribution_by_tag_ddb_items(snapshot))
+        content.put_ddb_items(mediapackage_endpoint_cloudfront_distribution_by_origin_url_ddb_items(snapshot))
+        content.put_ddb_items(mediapackage_endpoint_speke_keyserver_ddb_items(snapshot))
+        content.put_ddb_items(mediaconnect_flow_medialive_input_ddb_items(snapshot))
+        content.put_ddb_items(mediaconnect_flow_mediaconnect_flow_ddb_items(snapshot))
+        content.put_ddb_items(mediapackage_endpoint_mediatailor_configuration_ddb_items(snapshot))
+        content.put_ddb_items(s3_bucket_mediatailor_configuration_ddb_items(snapshot))
+        content.put_ddb_items(mediastore_container_mediatailor_configuration_ddb_items(snapshot))
+        content.put_ddb_items(medialive_channel_multiplex_ddb_items(snapshot))
+        content.put_ddb_items(multiplex_mediaconnect_flow_ddb_items(snapshot))
     except ClientError as error:
         print(error)
+    print("connection snapshot: {queries} queries, {queries_saved} saved, {decodes} items decoded, "
+          "{decodes_saved} decodes saved, {indexes_saved} indexes reused".format(**snapshot["stats"]))
+    return snapshot["stats"]
 
 
-def mediastore_container_medialive_input_ddb_items():
+def mediastore_container_medialive_input_ddb_items(snapshot):
     """
     Identify and format MediaStore container to MediaLive input connections for cache storage.
     """
     items = []
     try:
         # get medialive inputs
-        medialive_in_cached = cache.cached_by_service("medialive-input")
-        # get mediastore containers
-        mediastore_con_cached = cache.cached_by_service("mediastore-container")
+        medialive_in_decoded = snapshot_decoded(snapshot, "medialive-input")
+        # get mediastore containers by endpoint host
+        containers_by_netloc = snapshot_index(snapshot, "mediastore-container", "netloc", container_netlocs)
         # check the inputs that pull from mediastore containers
-        for ml_input in medialive_in_cached:
-            ml_input_data = json.loads(ml_input["data"])
+        for ml_input, ml_input_data in medialive_in_decoded:
             for source in ml_input_data["Sources"]:
                 ml_url = source["Url"]
                 parsed_source = urlparse(ml_url)
                 if "mediastore" in parsed_source.netloc:
-                    for ms_container in mediastore_con_cached:
-                        container_data = json.loads(ms_container["data"])
-                        parsed_endpoint = urlparse(container_data["Endpoint"])
-                        if parsed_source.netloc == parsed_endpoint.netloc:
-                            # create a 'connection' out of matches
-                            config = {"from": container_data["ARN"], "to": ml_input_data["Arn"], "scheme": parsed_source.scheme}
-                            print(config)
-                            items.append(connection_to_ddb_item(container_data["ARN"], ml_input_data["Arn"], "mediastore-container-medialive-input", config))
+                    for ms_container, container_data in probe(containers_by_netloc, [parsed_source.netloc]):
+                        # create a 'connection' out of matches
+                        config = {"from": container_data["ARN"], "to": ml_input_data["Arn"], "scheme": parsed_source.scheme}
+                        print(config)
+                        items.append(connection_to_ddb_item(container_data["ARN"], ml_input_data["Arn"], "mediastore-container-medialive-input", config))
     except ClientError as error:
         print(error)
     return items
 
 
-def medialive_channel_mediapackage_channel_ddb_items():
+def medialive_channel_mediapackage_channel_ddb_items(snapshot):
     """
     Identify and format MediaLive to MediaPackage channel connections for cache storage.
     """
@@ -138,25 +250,23 @@ def medialive_channel_mediapackage_channel_ddb_items():
     ml_service_name = "medialive-channel-mediapackage-channel"
     try:
         # get medialive channels
-        medialive_ch_cached = cache.cached_by_service("medialive-channel")
-        # get mediapackage channels
-        mediapackage_ch_cached = cache.cached_by_service("mediapackage-channel")
+        medialive_ch_decoded = snapshot_decoded(snapshot, "medialive-channel")
+        # get mediapackage channels by id and by ingest url
+        mp_channels_by_id = snapshot_index(snapshot, "mediapackage-channel", "id", lambda data: [data["Id"]])
+        mp_channels_by_ingest_url = snapshot_index(snapshot, "mediapackage-channel", "ingest-url", lambda data: [ingest_endpoint["Url"] for ingest_endpoint in data["HlsIngest"]["IngestEndpoints"]])
         # compare each medialive output url to a mediapackage ingest url
-        for ml_channel in medialive_ch_cached:
-            ml_channel_data = json.loads(ml_channel["data"])
+        for ml_channel, ml_channel_data in medialive_ch_decoded:
             for destination in ml_channel_data["Destinations"]:
                 # if setting is empty, we have to connect medialive with mediapackage via channel ID
                 if destination["MediaPackageSettings"]:
                     for mp_setting in destination["MediaPackageSettings"]:
-                        for mp_channel in mediapackage_ch_cached:
-                            mp_channel_data = json.loads(mp_channel["data"])
-                            if mp_channel_data['Id'] == mp_setting['ChannelId']:
-                                pipelines_count = fetch_running_pipelines_count(ml_channel_data)
-                                for pl in range(pipelines_count):
-                                    # create a 'connection' out of matches
-                                    config = {"from": ml_channel_data["Arn"], "to": mp_channel_data["Arn"], "pipeline": pl}
-                                    print(config)
-                                    items.append(connection_to_ddb_item_pl(ml_channel_data["Arn"], mp_channel_data["Arn"], ml_service_name, config))
+                        for mp_channel, mp_channel_data in probe(mp_channels_by_id, [mp_setting['ChannelId']]):
+                            pipelines_count = fetch_running_pipelines_count(ml_channel_data)
+                            for pl in range(pipelines_count):
+                                # create a 'connection' out of matches
+                                config = {"from": ml_channel_data["Arn"], "to": mp_channel_data["Arn"], "pipeline": pl}
+                                print(config)
+                                items.append(connection_to_ddb_item_pl(ml_channel_data["Arn"], mp_channel_data["Arn"], ml_service_name, config))
                 # otherwise we check via URL endpoints
                 else:
                     for setting in destination["Settings"]:
@@ -169,52 +279,45 @@ def medialive_channel_mediapackage_channel_ddb_items():
                             pieces = parsed.path.split("/")
                             if len(pieces) == 5:
                                 ml_url_v2 = "{scheme}://{netloc}/in/v2/{uid}/{uid}/channel".format(scheme=parsed.scheme, netloc=parsed.netloc, uid=pieces[3])
-                        for mp_channel in mediapackage_ch_cached:
-                            mp_channel_data = json.loads(mp_channel["data"])
-                            for ingest_endpoint in mp_channel_data["HlsIngest"]["IngestEndpoints"]:
-                                if ml_url == ingest_endpoint["Url"] or ml_url_v2 == ingest_endpoint["Url"]:
-                                    # create a 'connection' out of matches
-                                    config = {"from": ml_channel_data["Arn"], "to": mp_channel_data["Arn"], "pipeline": destination["Settings"].index(setting)}
-                                    print(config)
-                                    items.append(connection_to_ddb_item_pl(ml_channel_data["Arn"], mp_channel_data["Arn"], ml_service_name, config))
+                        for mp_channel, mp_channel_data in probe(mp_channels_by_ingest_url, [ml_url, ml_url_v2]):
+                            # create a 'connection' out of matches
+                            config = {"from": ml_channel_data["Arn"], "to": mp_channel_data["Arn"], "pipeline": destination["Settings"].index(setting)}
+                            print(config)
+                            items.append(connection_to_ddb_item_pl(ml_channel_data["Arn"], mp_channel_data["Arn"], ml_service_name, config))
     except ClientError as error:
         print(error)
     return items
 
 
-def medialive_channel_mediastore_container_ddb_items():
+def medialive_channel_mediastore_container_ddb_items(snapshot):
     """
     Identify and format MediaLive channel to MediaStore container connections for cache storage.
     """
     items = []
     try:
         # get medialive channels
-        medialive_ch_cached = cache.cached_by_service("medialive-channel")
-        # get mediastore containers
-        mediastore_con_cached = cache.cached_by_service("mediastore-container")
+        medialive_ch_decoded = snapshot_decoded(snapshot, "medialive-channel")
+        # get mediastore containers by endpoint host
+        containers_by_netloc = snapshot_index(snapshot, "mediastore-container", "netloc", container_netlocs)
         # compare each medialive output url to a mediastore container endpoint
         # url
-        for ml_channel in medialive_ch_cached:
-            ml_channel_data = json.loads(ml_channel["data"])
+        for ml_channel, ml_channel_data in medialive_ch_decoded:
             for destination in ml_channel_data["Destinations"]:
                 for setting in destination["Settings"]:
                     ml_url = setting["Url"]
                     parsed_destination = urlparse(ml_url)
                     if "mediastore" in parsed_destination.netloc:
-                        for ms_container in mediastore_con_cached:
-                            container_data = json.loads(ms_container["data"])
-                            parsed_endpoint = urlparse(container_data["Endpoint"])
-                            if parsed_destination.netloc == parsed_endpoint.netloc:
-                                # create a 'connection' out of matches
-                                config = {"from": ml_channel_data["Arn"], "to": container_data["ARN"], "scheme": parsed_destination.scheme}
-                                print(config)
-                                items.append(connection_to_ddb_item(ml_channel_data["Arn"], container_data["ARN"], "medialive-channel-mediastore-container", config))
+                        for ms_container, container_data in probe(containers_by_netloc, [parsed_destination.netloc]):
+                            # create a 'connection' out of matches
+                            config = {"from": ml_channel_data["Arn"], "to": container_data["ARN"], "scheme": parsed_destination.scheme}
+                            print(config)
+                            items.append(connection_to_ddb_item(ml_channel_data["Arn"], container_data["ARN"], "medialive-channel-mediastore-container", config))
     except ClientError as error:
         print(error)
     return items
 
 
-def medialive_channel_multiplex_ddb_items():
+def medialive_channel_multiplex_ddb_items(snapshot):
     """
     Identify and format MediaLive channel to EML Multiplex connections for cache storage.
     """
@@ -222,30 +325,27 @@ def medialive_channel_multiplex_ddb_items():
     ml_service_name = "medialive-channel-multiplex"
     try:
         # get medialive channels
-        medialive_ch_cached = cache.cached_by_service("medialive-channel")
-        # get multiplexes
-        medialive_mp_cached = cache.cached_by_service("medialive-multiplex")
-        for ml_channel in medialive_ch_cached:
-            ml_channel_data = json.loads(ml_channel["data"])
+        medialive_ch_decoded = snapshot_decoded(snapshot, "medialive-channel")
+        # get multiplexes by id
+        multiplexes_by_id = snapshot_index(snapshot, "medialive-multiplex", "id", lambda data: [data["Id"]])
+        for ml_channel, ml_channel_data in medialive_ch_decoded:
             for destination in ml_channel_data["Destinations"]:
                 if "MultiplexSettings" in destination:
                     multiplex_id = destination["MultiplexSettings"]["MultiplexId"]
                     program_name = destination["MultiplexSettings"]["ProgramName"]
-                    for ml_multiplex in medialive_mp_cached:
-                        ml_multiplex_data = json.loads(ml_multiplex["data"])
-                        if multiplex_id == ml_multiplex_data["Id"]:
-                            pipelines_count = fetch_running_pipelines_count(ml_channel_data)
-                            for pl in range(pipelines_count):
-                                # create a 'connection' out of matches
-                                config = {"from": ml_channel_data["Arn"], "to": ml_multiplex_data["Arn"], "program": program_name, "pipeline": pl}
-                                print(config)
-                                items.append(connection_to_ddb_item_pl(ml_channel_data["Arn"], ml_multiplex_data["Arn"], ml_service_name, config))
+                    for ml_multiplex, ml_multiplex_data in probe(multiplexes_by_id, [multiplex_id]):
+                        pipelines_count = fetch_running_pipelines_count(ml_channel_data)
+                        for pl in range(pipelines_count):
+                            # create a 'connection' out of matches
+                            config = {"from": ml_channel_data["Arn"], "to": ml_multiplex_data["Arn"], "program": program_name, "pipeline": pl}
+                            print(config)
+                            items.append(connection_to_ddb_item_pl(ml_channel_data["Arn"], ml_multiplex_data["Arn"], ml_service_name, config))
     except ClientError as error:
         print(error)
     return items
 
 
-def medialive_input_medialive_channel_ddb_items():
+def medialive_input_medialive_channel_ddb_items(snapshot):
     """
     Identify and format MediaLive input to MediaLive channel connections for cache storage.
     """
@@ -253,28 +353,24 @@ def medialive_input_medialive_channel_ddb_items():
     ml_service_name = "medialive-input-medialive-channel"
     try:
         # get medialive channels
-        medialive_ch_cached = cache.cached_by_service("medialive-channel")
-        # get medialive inputs
-        medialive_in_cached = cache.cached_by_service("medialive-input")
+        medialive_ch_decoded = snapshot_decoded(snapshot, "medialive-channel")
+        # get medialive inputs by the channels they are attached to
+        inputs_by_channel_id = snapshot_index(snapshot, "medialive-input", "attached-channel", lambda data: data["AttachedChannels"])
         # find matching ids in the attached inputs to attached channels
-        for ml_channel in medialive_ch_cached:
-            ml_channel_data = json.loads(ml_channel["data"])
+        for ml_channel, ml_channel_data in medialive_ch_decoded:
             ml_channel_id = ml_channel_data["Id"]
-            for ml_input in medialive_in_cached:
-                ml_input_data = json.loads(ml_input["data"])
-                for attached_id in ml_input_data["AttachedChannels"]:
-                    if ml_channel_id == attached_id:
-                        pipelines_count = fetch_running_pipelines_count(ml_channel_data)
-                        for pl in range(pipelines_count):
-                            config = {"from": ml_input_data["Arn"], "to": ml_channel_data["Arn"], "type": ml_input_data["Type"], "pipeline": pl}
-                            print(config)
-                            items.append(connection_to_ddb_item_pl(ml_input_data["Arn"], ml_channel_data["Arn"], ml_service_name, config))
+            for ml_input, ml_input_data in probe(inputs_by_channel_id, [ml_channel_id]):
+                pipelines_count = fetch_running_pipelines_count(ml_channel_data)
+                for pl in range(pipelines_count):
+                    config = {"from": ml_input_data["Arn"], "to": ml_channel_data["Arn"], "type": ml_input_data["Type"], "pipeline": pl}
+                    print(config)
+                    items.append(connection_to_ddb_item_pl(ml_input_data["Arn"], ml_channel_data["Arn"], ml_service_name, config))
     except ClientError as error:
         print(error)
     return items
 
 
-def mediapackage_channel_mediapackage_endpoint_ddb_items():
+def mediapackage_channel_mediapackage_endpoint_ddb_items(snapshot):
     """
     Identify and format MediaPackage channel to MediaPackage endpoint connections for cache storage.
     """
@@ -282,31 +378,27 @@ def mediapackage_channel_mediapackage_endpoint_ddb_items():
     package_key = re.compile("^(.+)Package$")
     try:
         # get mediapackage channels
-        mediapackage_ch_cached = cache.cached_by_service("mediapackage-channel")
-        # get mediapackage endpoints
-        mediapackage_ep_cached = cache.cached_by_service("mediapackage-origin-endpoint")
+        mediapackage_ch_decoded = snapshot_decoded(snapshot, "mediapackage-channel")
+        # get mediapackage endpoints by channel id
+        endpoints_by_channel_id = snapshot_index(snapshot, "mediapackage-origin-endpoint", "channel-id", lambda data: [data["ChannelId"]])
         # find matching ids in the attached inputs to attached channels
-        for mp_channel in mediapackage_ch_cached:
-            mp_channel_data = json.loads(mp_channel["data"])
+        for mp_channel, mp_channel_data in mediapackage_ch_decoded:
             mp_channel_id = mp_channel_data["Id"]
-            for mp_endpoint in mediapackage_ep_cached:
-                mp_endpoint_data = json.loads(mp_endpoint["data"])
-                mp_endpoint_channel_id = mp_endpoint_data["ChannelId"]
-                if mp_channel_id == mp_endpoint_channel_id:
-                    package_type = ""
-                    for key in mp_endpoint_data.keys():
-                        matcher = package_key.match(key)
-                        if matcher:
-                            package_type = matcher.group(1).upper()
-                    config = {"from": mp_channel_data["Arn"], "to": mp_endpoint_data["Arn"], "package": package_type}
-                    print(config)
-                    items.append(connection_to_ddb_item(mp_channel_data["Arn"], mp_endpoint_data["Arn"], "mediapackage-channel-mediapackage-origin-endpoint", config))
+            for mp_endpoint, mp_endpoint_data in probe(endpoints_by_channel_id, [mp_channel_id]):
+                package_type = ""
+                for key in mp_endpoint_data.keys():
+                    matcher = package_key.match(key)
+                    if matcher:
+                        package_type = matcher.group(1).upper()
+                config = {"from": mp_channel_data["Arn"], "to": mp_endpoint_data["Arn"], "package": package_type}
+                print(config)
+                items.append(connection_to_ddb_item(mp_channel_data["Arn"], mp_endpoint_data["Arn"], "mediapackage-channel-mediapackage-origin-endpoint", config))
     except ClientError as error:
         print(error)
     return items
 
 
-def multiplex_mediaconnect_flow_ddb_items():
+def multiplex_mediaconnect_flow_ddb_items(snapshot):
     """
     Identify and format Multiplex to MediaConnect flow connections for cache storage.
     """
@@ -315,59 +407,50 @@ def multiplex_mediaconnect_flow_ddb_items():
     items = []
     try:
         # get multiplexes
-        multiplex_cached = cache.cached_by_service("medialive-multiplex")
-        # get mediaconnect flows
-        mediaconnect_flows_cached = cache.cached_by_service("mediaconnect-flow")
-        for multiplex in multiplex_cached:
-            multiplex_data = json.loads(multiplex["data"])
+        multiplex_decoded = snapshot_decoded(snapshot, "medialive-multiplex")
+        # get mediaconnect flows by source entitlement
+        flows_by_entitlement = snapshot_index(snapshot, "mediaconnect-flow", "source-entitlement", lambda data: [match.value for match in source_arn_expr.find(data)])
+        for multiplex, multiplex_data in multiplex_decoded:
             # retrieve the multiplex's exported entitlements
             entitlement_arns = [match.value for match in destination_arn_expr.find(multiplex_data)]
-            # print(entitlement_arns)
-            # search each flow for the same entitlement arns as sources
-            for flow in mediaconnect_flows_cached:
-                flow_data = json.loads(flow["data"])
-                source_arns = [match.value for match in source_arn_expr.find(flow_data)]
-                # print(source_arns)
-                for arn in source_arns:
-                    if arn in entitlement_arns:
-                        # create a 'connection' out of matches
-                        config = {"from": multiplex_data["Arn"], "to": flow_data["FlowArn"], "entitlement": arn}
-                        print(config)
-                        items.append(connection_to_ddb_item(multiplex_data["Arn"], flow_data["FlowArn"], "multiplex-mediaconnect-flow", config))
+            # find the flows with the same entitlement arns as sources
+            for flow, flow_data, arn in probe(flows_by_entitlement, entitlement_arns, with_keys=True):
+                # create a 'connection' out of matches
+                config = {"from": multiplex_data["Arn"], "to": flow_data["FlowArn"], "entitlement": arn}
+                print(config)
+                items.append(connection_to_ddb_item(multiplex_data["Arn"], flow_data["FlowArn"], "multiplex-mediaconnect-flow", config))
     except ClientError as error:
         print(error)
     return items
 
 
-def s3_bucket_cloudfront_distribution_ddb_items():
+def s3_bucket_cloudfront_distribution_ddb_items(snapshot):
     """
     Identify and format S3 Bucket to CloudFront Distribution connections for cache storage.
     """
     items = []
     s3_origin = re.compile(r"(\S+)\.s3([^\.])*\.amazonaws\.com")
+
+    def origin_buckets(distro_data):
+        matches = [s3_origin.match(origin_item["DomainName"]) for origin_item in distro_data["Origins"]["Items"]]
+        return [matcher.group(1) for matcher in matches if matcher]
+
     try:
         # get S3 buckets
-        s3_buckets_cached = cache.cached_by_service("s3")
-        # get CloudFront distributions
-        cloudfront_dist_cached = cache.cached_by_service("cloudfront-distribution")
-        for s3_bucket in s3_buckets_cached:
-            s3_bucket_data = json.loads(s3_bucket["data"])
-            for cloudfront_distro in cloudfront_dist_cached:
-                cloudfront_distro_data = json.loads(cloudfront_distro["data"])
-                for origin_item in cloudfront_distro_data["Origins"]["Items"]:
-                    matcher = s3_origin.match(origin_item["DomainName"])
-                    if matcher:
-                        bucket_name = matcher.group(1)
-                        if bucket_name == s3_bucket_data["Name"]:
-                            config = {"from": s3_bucket["arn"], "to": cloudfront_distro["arn"], "label": "S3"}
-                            print(config)
-                            items.append(connection_to_ddb_item(s3_bucket["arn"], cloudfront_distro["arn"], "s3-bucket-cloudfront-distribution", config))
+        s3_buckets_decoded = snapshot_decoded(snapshot, "s3")
+        # get CloudFront distributions by origin bucket
+        distros_by_bucket = snapshot_index(snapshot, "cloudfront-distribution", "origin-bucket", origin_buckets)
+        for s3_bucket, s3_bucket_data in s3_buckets_decoded:
+            for cloudfront_distro, cloudfront_distro_data in probe(distros_by_bucket, [s3_bucket_data["Name"]]):
+                config = {"from": s3_bucket["arn"], "to": cloudfront_distro["arn"], "label": "S3"}
+                print(config)
+                items.append(connection_to_ddb_item(s3_bucket["arn"], cloudfront_distro["arn"], "s3-bucket-cloudfront-distribution", config))
     except ClientError as error:
         print(error)
     return items
 
 
-def s3_bucket_medialive_input_ddb_items():
+def s3_bucket_medialive_input_ddb_items(snapshot):
     """
     Identify and format S3 Bucket to MediaLive Input connections for cache storage.
     """
@@ -380,13 +463,12 @@ def s3_bucket_medialive_input_ddb_items():
         re.compile(r"s3\:\/\/([^\/]+)")
     ]
     try:
-        # get S3 buckets
-        s3_buckets_cached = cache.cached_by_service("s3")
+        # get S3 buckets by name
+        buckets_by_name = snapshot_index(snapshot, "s3", "name", lambda data: [data["Name"]])
         # get MediaLive inputs
-        medialive_in_cached = cache.cached_by_service("medialive-input")
+        medialive_in_decoded = snapshot_decoded(snapshot, "medialive-input")
         # iterate over all inputs
-        for ml_input in medialive_in_cached:
-            ml_input_data = json.loads(ml_input["data"])
+        for ml_input, ml_input_data in medialive_in_decoded:
             for source in ml_input_data["Sources"]:
                 bucket_name = None
                 scheme = None
@@ -400,31 +482,28 @@ def s3_bucket_medialive_input_ddb_items():
                         break
                 if bucket_name:
                     # find the bucket
-                    for s3_bucket in s3_buckets_cached:
-                        s3_bucket_data = json.loads(s3_bucket["data"])
-                        if bucket_name == s3_bucket_data["Name"]:
-                            config = {"from": s3_bucket["arn"], "to": ml_input["arn"], "scheme": scheme}
-                            print(config)
-                            items.append(connection_to_ddb_item(s3_bucket["arn"], ml_input["arn"], "s3-bucket-medialive-input", config))
+                    for s3_bucket, s3_bucket_data in probe(buckets_by_name, [bucket_name]):
+                        config = {"from": s3_bucket["arn"], "to": ml_input["arn"], "scheme": scheme}
+                        print(config)
+                        items.append(connection_to_ddb_item(s3_bucket["arn"], ml_input["arn"], "s3-bucket-medialive-input", config))
     except ClientError as error:
         print(error)
     return items
 
 
-def cloudfront_distribution_medialive_input_ddb_items():
+def cloudfront_distribution_medialive_input_ddb_items(snapshot):
     """
     Identify and format CloudFront Distribution to MediaLive Input connections for cache storage.
     """
     items = []
     cloudfront_url = re.compile(r"http.?\:\/\/(\S+\.cloudfront\.net)\/.*")
     try:
-        # get CloudFront distros
-        cloudfront_distros_cached = cache.cached_by_service("cloudfront-distribution")
+        # get CloudFront distros by domain name
+        distros_by_domain = snapshot_index(snapshot, "cloudfront-distribution", "domain-name", lambda data: [data["DomainName"]])
         # get MediaLive inputs
-        medialive_in_cached = cache.cached_by_service("medialive-input")
+        medialive_in_decoded = snapshot_decoded(snapshot, "medialive-input")
         # iterate over all inputs
-        for ml_input in medialive_in_cached:
-            ml_input_data = json.loads(ml_input["data"])
+        for ml_input, ml_input_data in medialive_in_decoded:
             for source in ml_input_data["Sources"]:
                 domain_name = None
                 scheme = None
@@ -435,56 +514,46 @@ def cloudfront_distribution_medialive_input_ddb_items():
                     domain_name = match.group(1)
                     scheme = urlparse(source["Url"]).scheme
                     # find the distribution
-                    for distro in cloudfront_distros_cached:
-                        distro_data = json.loads(distro["data"])
-                        if domain_name == distro_data["DomainName"]:
-                            config = {"from": distro["arn"], "to": ml_input["arn"], "scheme": scheme}
-                            print(config)
-                            items.append(connection_to_ddb_item(distro["arn"], ml_input["arn"], "cloudfront-distribution-medialive-input", config))
+                    for distro, distro_data in probe(distros_by_domain, [domain_name]):
+                        config = {"from": distro["arn"], "to": ml_input["arn"], "scheme": scheme}
+                        print(config)
+                        items.append(connection_to_ddb_item(distro["arn"], ml_input["arn"], "cloudfront-distribution-medialive-input", config))
     except ClientError as error:
         print(error)
     return items
 
 
-def mediapackage_endpoint_cloudfront_distribution_by_tag_ddb_items():
+def mediapackage_endpoint_cloudfront_distribution_by_tag_ddb_items(snapshot):
     """
     Identify and format MediaPackage origin endpoints to CloudFront Distributions by tags for cache storage.
     """
     items = []
     try:
         # get CloudFront distros
-        cloudfront_distros_cached = cache.cached_by_service("cloudfront-distribution")
-        # get MediaPackage channels
-        mediapackage_ch_cached = cache.cached_by_service("mediapackage-channel")
-        # get MediaPackage origin endpoints
-        mediapackage_ep_cached = cache.cached_by_service("mediapackage-origin-endpoint")
+        cloudfront_distros_decoded = snapshot_decoded(snapshot, "cloudfront-distribution")
+        # get MediaPackage channel ids by channel arn, the first channel with an arn wins
+        channel_ids = {}
+        for channel, channel_data in snapshot_decoded(snapshot, "mediapackage-channel"):
+            channel_ids.setdefault(channel["arn"], channel_data["Id"])
+        # get MediaPackage origin endpoints by channel id
+        endpoints_by_channel_id = snapshot_index(snapshot, "mediapackage-origin-endpoint", "channel-id", lambda data: [data["ChannelId"]])
         # iterate over all distributions
-        for distro in cloudfront_distros_cached:
-            distro_data = json.loads(distro["data"])
+        for distro, distro_data in cloudfront_distros_decoded:
             for key, value in distro_data["Tags"].items():
                 if (key in ["MP-Endpoint-ARN", "mediapackage:cloudfront_assoc"]) and ":channels/" in value:
-                    channel_arn = value
-                    channel_id = None
-                    # find the channel
-                    for channel in mediapackage_ch_cached:
-                        if channel_arn == channel["arn"]:
-                            channel_data = json.loads(channel["data"])
-                            channel_id = channel_data["Id"]
-                            break
+                    channel_id = channel_ids.get(value)
                     if channel_id:
                         # add a connection to each endpoint
-                        for endpoint in mediapackage_ep_cached:
-                            endpoint_data = json.loads(endpoint["data"])
-                            if endpoint_data["ChannelId"] == channel_id:
-                                config = {"from": endpoint["arn"], "to": distro["arn"], "scheme": urlparse(endpoint_data["Url"]).scheme, "connected_by": "tag", "tag": key}
-                                print(config)
-                                items.append(connection_to_ddb_item(endpoint["arn"], distro["arn"], "mediapackage-origin-endpoint-cloudfront-distribution", config))
+                        for endpoint, endpoint_data in probe(endpoints_by_channel_id, [channel_id]):
+                            config = {"from": endpoint["arn"], "to": distro["arn"], "scheme": urlparse(endpoint_data["Url"]).scheme, "connected_by": "tag", "tag": key}
+                            print(config)
+                            items.append(connection_to_ddb_item(endpoint["arn"], distro["arn"], "mediapackage-origin-endpoint-cloudfront-distribution", config))
     except ClientError as error:
         print(error)
     return items
 
 
-def mediapackage_endpoint_cloudfront_distribution_by_origin_url_ddb_items():
+def mediapackage_endpoint_cloudfront_distribution_by_origin_url_ddb_items(snapshot):
     """
     Identify and format MediaPackage origin endpoints to CloudFront Distributions by URL for cache storage.
     """
@@ -492,16 +561,14 @@ def mediapackage_endpoint_cloudfront_distribution_by_origin_url_ddb_items():
     items = []
     try:
         # get CloudFront distros
-        cloudfront_distros_cached = cache.cached_by_service("cloudfront-distribution")
-        # get MediaPackage origin endpoints
-        mediapackage_ep_cached = cache.cached_by_service("mediapackage-origin-endpoint")
-        # iterate over all distributions
-        for distro in cloudfront_distros_cached:
-            distro_data = json.loads(distro["data"])
+        cloudfront_distros_decoded = snapshot_decoded(snapshot, "cloudfront-distribution")
+        # get MediaPackage origin endpoints, decoded once for all distributions
+        mediapackage_ep_decoded = snapshot_decoded(snapshot, "mediapackage-origin-endpoint")
+        # iterate over all distributions, a fuzzy match needs every pair
+        for distro, distro_data in cloudfront_distros_decoded:
             for item in distro_data["Origins"]["Items"]:
                 origin_partial_url = "{}/{}".format(item["DomainName"], item["OriginPath"])
-                for mp_endpoint in mediapackage_ep_cached:
-                    mp_endpoint_data = json.loads(mp_endpoint["data"])
+                for mp_endpoint, mp_endpoint_data in mediapackage_ep_decoded:
                     ratio = fuzz.ratio(origin_partial_url, mp_endpoint_data["Url"])
                     # print("{} {} :: {}".format(ratio, origin_partial_url, mp_endpoint_data["Url"]))
                     if ratio >= min_ratio:
@@ -513,7 +580,7 @@ def mediapackage_endpoint_cloudfront_distribution_by_origin_url_ddb_items():
     return items
 
 
-def mediapackage_endpoint_speke_keyserver_ddb_items():
+def mediapackage_endpoint_speke_keyserver_ddb_items(snapshot):
     """
     Identify and format MediaPackage origin endpoints to SPEKE keyservers for cache storage.
     """
@@ -522,40 +589,36 @@ def mediapackage_endpoint_speke_keyserver_ddb_items():
     jsonpath_expr = parse('$..SpekeKeyProvider.Url')
     try:
         # get SPEKE keyservers
-        speke_keyservers_cached = cache.cached_by_service("speke-keyserver")
-        # get MediaPackage origin endpoints
-        mediapackage_ep_cached = cache.cached_by_service("mediapackage-origin-endpoint")
+        speke_keyservers_decoded = snapshot_decoded(snapshot, "speke-keyserver")
+        # get MediaPackage origin endpoints by key server url
+        endpoints_by_server_url = snapshot_index(snapshot, "mediapackage-origin-endpoint", "speke-url", lambda data: [match.value for match in jsonpath_expr.find(data)])
         # iterate over all distributions
-        for keyserver in speke_keyservers_cached:
-            keyserver_data = json.loads(keyserver["data"])
+        for keyserver, keyserver_data in speke_keyservers_decoded:
             keyserver_endpoint = keyserver_data["endpoint"]
-            for mp_endpoint in mediapackage_ep_cached:
-                mp_endpoint_data = json.loads(mp_endpoint["data"])
-                for server_url in [match.value for match in jsonpath_expr.find(mp_endpoint_data)]:
-                    if server_url == keyserver_endpoint:
-                        config = {"from": mp_endpoint["arn"], "to": keyserver["arn"], "scheme": keyserver_data["scheme"]}
-                        print(config)
-                        items.append(connection_to_ddb_item(mp_endpoint["arn"], keyserver["arn"], "mediapackage-origin-endpoint-speke-keyserver", config))
+            for mp_endpoint, mp_endpoint_data in probe(endpoints_by_server_url, [keyserver_endpoint]):
+                config = {"from": mp_endpoint["arn"], "to": keyserver["arn"], "scheme": keyserver_data["scheme"]}
+                print(config)
+                items.append(connection_to_ddb_item(mp_endpoint["arn"], keyserver["arn"], "mediapackage-origin-endpoint-speke-keyserver", config))
     except ClientError as error:
         print(error)
     return items
 
 
-def mediaconnect_flow_medialive_input_ddb_items():
+def mediaconnect_flow_medialive_input_ddb_items(snapshot):
     """
     Identify and format MediaConnect Flow to MediaLive Input connections for cache storage.
     """
     items = []
     connection_type = "mediaconnect-flow-medialive-input"
+    # MediaLive inputs by destination ip, built when the first output without an input ARN needs it
+    inputs_by_ip = None
     try:
         # get MediaConnect flows
-        mediaconnect_flows_cached = cache.cached_by_service("mediaconnect-flow")
+        mediaconnect_flows_decoded = snapshot_decoded(snapshot, "mediaconnect-flow")
         # process each flow
-        for flow in mediaconnect_flows_cached:
-            flow_data = json.loads(flow["data"])
+        for flow, flow_data in mediaconnect_flows_decoded:
             # for each flow, process each outputs
             for flow_output in flow_data["Outputs"]:
-                match_found = False
                 # check for MediaLiveInputArn first
                 try:
                     if flow_output["MediaLiveInputArn"]:
@@ -564,26 +627,13 @@ def mediaconnect_flow_medialive_input_ddb_items():
                         items.append(connection_to_ddb_item(flow_data["FlowArn"], flow_output["MediaLiveInputArn"], connection_type, config))
                 # if that didn't work, then check for IPs (Destination)
                 except KeyError as error:
-                    # for each output, look for the matching MediaLive input
-                    medialive_in_cached = cache.cached_by_service("medialive-input")
-                    # iterate over all medialive inputs
-                    for ml_input in medialive_in_cached:
-                        if not match_found:
-                            ml_input_data = json.loads(ml_input["data"])
-                            # there are 2 ip addresses in ml_input
-                            for destination in ml_input_data["Destinations"]:
-                                # match the flow output ip address to a mediaLive input ip address
-                                try:
-                                    if destination["Ip"] == flow_output["Destination"]:
-                                        config = {"from": flow["arn"], "to": ml_input["arn"], "scheme": ml_input_data["Type"]}
-                                        print(config)
-                                        items.append(connection_to_ddb_item(flow["arn"], ml_input["arn"], connection_type, config))
-                                        match_found = True
-                                        break
-                                except Exception as error:
-                                    print(error)
-                        else:
-                            break
+                    if inputs_by_ip is None:
+                        inputs_by_ip = snapshot_index(snapshot, "medialive-input", "destination-ip", lambda data: [destination.get("Ip") for destination in data["Destinations"]])
+                    # the first input with the output's destination ip is the match
+                    for ml_input, ml_input_data in probe(inputs_by_ip, [flow_output.get("Destination")])[:1]:
+                        config = {"from": flow["arn"], "to": ml_input["arn"], "scheme": ml_input_data["Type"]}
+                        print(config)
+                        items.append(connection_to_ddb_item(flow["arn"], ml_input["arn"], connection_type, config))
                 except Exception as error:
                     print(error)
     except ClientError as error:
@@ -591,17 +641,17 @@ def mediaconnect_flow_medialive_input_ddb_items():
     return items
 
 
-def mediaconnect_flow_mediaconnect_flow_ddb_items():
+def mediaconnect_flow_mediaconnect_flow_ddb_items(snapshot):
     """
     Identify and format MediaConnect Flow to another MediaConnect Flow for cache storage.
     """
     items = []
     connection_type = "mediaconnect-flow-mediaconnect-flow"
     try:
-        # get MediaConnect flows
-        mediaconnect_flows_cached = cache.cached_by_service("mediaconnect-flow")
-        for outer_flow in mediaconnect_flows_cached:
-            outer_flow_data = json.loads(outer_flow["data"])
+        # get MediaConnect flows, decoded once and indexed by output destination ip
+        mediaconnect_flows_decoded = snapshot_decoded(snapshot, "mediaconnect-flow")
+        flows_by_destination = snapshot_index(snapshot, "mediaconnect-flow", "output-destination", lambda data: set(flow_output.get("Destination") for flow_output in data["Outputs"]))
+        for outer_flow, outer_flow_data in mediaconnect_flows_decoded:
             # process each flow for entitlement
             try:
                 if outer_flow_data["Source"]["EntitlementArn"]:
@@ -613,9 +663,8 @@ def mediaconnect_flow_mediaconnect_flow_ddb_items():
             # also, process each flow against each of the same set of flows for regular IP push (standard)
             outer_flow_egress_ip = outer_flow_data["EgressIp"]
 
-            # check this egress ip against all the output IPs of each of the flows
-            for inner_flow in mediaconnect_flows_cached:
-                inner_flow_data = json.loads(inner_flow["data"])
+            # check this egress ip against the output IPs of the flows sending to it
+            for inner_flow, inner_flow_data in probe(flows_by_destination, [outer_flow_egress_ip]):
                 for flow_output in inner_flow_data["Outputs"]:
                     try:
                         if flow_output["Destination"] == outer_flow_egress_ip:
@@ -629,21 +678,20 @@ def mediaconnect_flow_mediaconnect_flow_ddb_items():
     return items
 
 
-def mediapackage_endpoint_mediatailor_configuration_ddb_items():
+def mediapackage_endpoint_mediatailor_configuration_ddb_items(snapshot):
     """
     Identify and format MediaPackage endpoints to a MediaTailor configuration for cache storage.
     """
     items = []
     connection_type = "mediapackage-origin-endpoint-mediatailor-configuration"
     try:
-        mediapackage_ep_cached = cache.cached_by_service("mediapackage-origin-endpoint")
-        mediatailor_configs_cached = cache.cached_by_service("mediatailor-configuration")
+        mediapackage_ep_decoded = snapshot_decoded(snapshot, "mediapackage-origin-endpoint")
+        # a source url can be any part of an endpoint url, so every pair is compared, decoded once
+        mediatailor_configs_decoded = snapshot_decoded(snapshot, "mediatailor-configuration")
         # get the URL from data and compare to the VideoContentSourceUrl of MediaTailor
-        for mp_endpoint in mediapackage_ep_cached:
-            mp_endpoint_data = json.loads(mp_endpoint["data"])
+        for mp_endpoint, mp_endpoint_data in mediapackage_ep_decoded:
             mp_endpoint_channel_id = mp_endpoint_data["Url"]
-            for mt_config in mediatailor_configs_cached:
-                mt_config_data = json.loads(mt_config["data"])
+            for mt_config, mt_config_data in mediatailor_configs_decoded:
                 mt_config_video_source = mt_config_data["VideoContentSourceUrl"]
                 if mt_config_video_source in mp_endpoint_channel_id:
                     config = {"from": mp_endpoint_data["Arn"], "to": mt_config_data["PlaybackConfigurationArn"], "scheme": urlparse(mt_config_video_source).scheme}
@@ -654,36 +702,32 @@ def mediapackage_endpoint_mediatailor_configuration_ddb_items():
     return items
 
 
-def mediastore_container_mediatailor_configuration_ddb_items():
+def mediastore_container_mediatailor_configuration_ddb_items(snapshot):
     """
     Identify and format MediaStore containers to a MediaTailor configuration for cache storage.
     """
     items = []
     try:
         # get mediatailor configs
-        mediatailor_configs_cached = cache.cached_by_service("mediatailor-configuration")
-        # get mediastore containers
-        mediastore_con_cached = cache.cached_by_service("mediastore-container")
+        mediatailor_configs_decoded = snapshot_decoded(snapshot, "mediatailor-configuration")
+        # get mediastore containers by endpoint host
+        containers_by_netloc = snapshot_index(snapshot, "mediastore-container", "netloc", container_netlocs)
         # iterate over mediatailor configs
-        for mt_config in mediatailor_configs_cached:
-            mt_config_data = json.loads(mt_config["data"])
+        for mt_config, mt_config_data in mediatailor_configs_decoded:
             mt_config_video_source = mt_config_data["VideoContentSourceUrl"]
             parsed_source = urlparse(mt_config_video_source)
             if "mediastore" in parsed_source.netloc:
-                for ms_container in mediastore_con_cached:
-                    container_data = json.loads(ms_container["data"])
-                    parsed_endpoint = urlparse(container_data["Endpoint"])
-                    if parsed_source.netloc == parsed_endpoint.netloc:
-                        # create a 'connection' out of matches
-                        config = {"from": container_data["ARN"], "to": mt_config_data["PlaybackConfigurationArn"], "scheme": parsed_source.scheme}
-                        print(config)
-                        items.append(connection_to_ddb_item(container_data["ARN"], mt_config_data["PlaybackConfigurationArn"], "mediastore-container-mediatailor-configuration", config))
+                for ms_container, container_data in probe(containers_by_netloc, [parsed_source.netloc]):
+                    # create a 'connection' out of matches
+                    config = {"from": container_data["ARN"], "to": mt_config_data["PlaybackConfigurationArn"], "scheme": parsed_source.scheme}
+                    print(config)
+                    items.append(connection_to_ddb_item(container_data["ARN"], mt_config_data["PlaybackConfigurationArn"], "mediastore-container-mediatailor-configuration", config))
     except ClientError as error:
         print(error)
     return items
 
 
-def s3_bucket_mediatailor_configuration_ddb_items():
+def s3_bucket_mediatailor_configuration_ddb_items(snapshot):
     """
     Identify and format S3 buckets to a MediaTailor configuration for cache storage.
     """
@@ -695,15 +739,14 @@ def s3_bucket_mediatailor_configuration_ddb_items():
         re.compile(r"http.?\:\/\/(\S+)\.s3\-(\S+)\.amazonaws\.com")
     ]
     try:
-        # get S3 buckets
-        s3_buckets_cached = cache.cached_by_service("s3")
+        # get S3 buckets by name
+        buckets_by_name = snapshot_index(snapshot, "s3", "name", lambda data: [data["Name"]])
         # get MediaTailor configurations
-        mediatailor_configs_cached = cache.cached_by_service("mediatailor-configuration")
+        mediatailor_configs_decoded = snapshot_decoded(snapshot, "mediatailor-configuration")
         # iterate over configs
-        for mt_config in mediatailor_configs_cached:
+        for mt_config, mt_config_data in mediatailor_configs_decoded:
             bucket_name = None
             scheme = None
-            mt_config_data = json.loads(mt_config["data"])
             mt_config_video_source = mt_config_data["VideoContentSourceUrl"]
             # is this a bucket url?
             for expr in s3_url_expressions:
@@ -715,12 +758,10 @@ def s3_bucket_mediatailor_configuration_ddb_items():
                     break
             if bucket_name:
                 # find the bucket
-                for s3_bucket in s3_buckets_cached:
-                    s3_bucket_data = json.loads(s3_bucket["data"])
-                    if bucket_name == s3_bucket_data["Name"]:
-                        config = {"from": s3_bucket["arn"], "to": mt_config_data["PlaybackConfigurationArn"], "scheme": scheme}
-                        print(config)
-                        items.append(connection_to_ddb_item(s3_bucket["arn"], mt_config_data["PlaybackConfigurationArn"], "s3-bucket-mediatailor-configuration", config))
+                for s3_bucket, s3_bucket_data in probe(buckets_by_name, [bucket_name]):
+                    config = {"from": s3_bucket["arn"], "to": mt_config_data["PlaybackConfigurationArn"], "scheme": scheme}
+                    print(config)
+                    items.append(connection_to_ddb_item(s3_bucket["arn"], mt_config_data["PlaybackConfigurationArn"], "s3-bucket-mediatailor-configuration", config))
     except ClientError as error:
         print(error)
     return items
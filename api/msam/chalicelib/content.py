@@ -5,9 +5,19 @@ This file contains helper functions related to the content DynamoDB table.
 """
 
 import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import boto3
+from boto3.dynamodb.types import TypeSerializer
 from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from chalicelib import cache
+from chalicelib import clients
+from chalicelib import codec
+from chalicelib import content_items
+from chalicelib import metrics
 
 # TTL provided via CloudFormation
 CACHE_ITEM_TTL = int(os.environ["CACHE_ITEM_TTL"])
@@ -19,14 +29,203 @@ CONTENT_TABLE_NAME = os.environ["CONTENT_TABLE_NAME"]
 STAMP = os.environ["BUILD_STAMP"]
 MSAM_BOTO3_CONFIG = Config(user_agent="aws-media-services-applications-mapper/{stamp}/content.py".format(stamp=STAMP))
 
-def put_ddb_items(items):
+# items compared and written together, one BatchGetItem of stored digests per chunk
+WRITE_CHUNK_ITEMS = 100
+
+# maximum number of put requests in a single BatchWriteItem call
+BATCH_WRITE_MAX_ITEMS = 25
+
+# number of batches written concurrently
+BATCH_WRITE_WORKERS = 4
+
+# number of times unprocessed items are sent again before giving up
+BATCH_WRITE_MAX_RETRIES = 8
+
+# base delay for exponential backoff between retries of unprocessed items
+BATCH_WRITE_BACKOFF_SECONDS = 0.05
+
+# unchanged items are only given a new expiration once less than this much lifetime remains
+EXPIRES_REFRESH_SECONDS = CACHE_ITEM_TTL // 2
+
+SERIALIZER = TypeSerializer()
+
+
+def put_ddb_items(items, seen=None):
     """
-    Add a list of cache items to the content (cache) DynamoDB table.
+    Add cache items to the content (cache) DynamoDB table.
+    Items can be any iterable, such as a generator yielding them as API pages arrive.
+    The ARNs of all items, written or not, are added to the seen set if one is given.
+    They are consumed in chunks of WRITE_CHUNK_ITEMS, so memory is bounded by a chunk
+    and the first writes start before the last items are fetched.
+    Items are written in groups of 25 with BatchWriteItem, several groups at a time.
+    Items with a digest matching the stored item are not rewritten, only their
+    expiration is refreshed when it is getting close.
+    Returns the number of items written, skipped and refreshed, retries, bytes saved
+    and elapsed time for the call.
     """
-    ddb_table_name = CONTENT_TABLE_NAME
-    # shared resource and table
-    ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
-    ddb_table = ddb_resource.Table(ddb_table_name)
+    start = time.time()
+    stats = {"items": 0, "batches": 0, "retries": 0, "unprocessed": 0, "skipped": 0, "refreshed": 0, "bytes_saved": 0, "bytes_written": 0}
+    # clients are thread-safe and can be shared by the workers
+    ddb_client = clients.client('dynamodb', config=MSAM_BOTO3_CONFIG)
+    with ThreadPoolExecutor(max_workers=BATCH_WRITE_WORKERS) as executor:
+        for chunk in chunked(items, WRITE_CHUNK_ITEMS):
+            put_chunk(ddb_client, executor, chunk, stats)
+            if seen is not None:
+                seen.update(item["arn"] for item in chunk)
+    stats["elapsed_ms"] = int((time.time() - start) * 1000)
+    print("content items written {items} in {batches} batches, skipped {skipped}, refreshed {refreshed}, "
+          "bytes written {bytes_written}, bytes saved {bytes_saved}, retries {retries}, unprocessed {unprocessed}, elapsed {elapsed_ms}ms".format(**stats))
+    return stats
+
+
+def chunked(items, size):
+    """
+    Yield lists of up to size items from an iterable.
+    """
+    chunk = []
     for item in items:
-        ddb_table.put_item(Item=item)
-    return True
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def put_chunk(ddb_client, executor, chunk, stats):
+    """
+    Write the items of a chunk that differ from the stored items and add the outcome to stats.
+    """
+    # BatchWriteItem rejects requests with duplicate keys, last item for an ARN wins
+    unique_items = {}
+    for item in chunk:
+        unique_items[item["arn"]] = item
+    stored = stored_digests(ddb_client, [arn for arn, item in unique_items.items() if "digest" in item])
+    now = int(time.time())
+    changed = []
+    refresh = []
+    for arn, item in unique_items.items():
+        previous = stored.get(arn)
+        # items stored before the display name existed are rewritten once to gain it
+        if previous and previous.get("digest") == item.get("digest") and previous.get("name") == item.get("name"):
+            stats["bytes_saved"] += codec.stored_size(item["data"])
+            if int(previous.get("expires", 0)) - now > EXPIRES_REFRESH_SECONDS:
+                stats["skipped"] += 1
+            else:
+                refresh.append(item)
+        else:
+            changed.append(item)
+    for item in changed:
+        # stamp the write time so the change feed sees the item after its watermark
+        item["updated"] = now
+        item[content_items.CHANGE_BUCKET_ATTRIBUTE] = content_items.change_bucket(now)
+        stats["bytes_written"] += codec.stored_size(item["data"])
+    requests = [{"PutRequest": {"Item": serialize_item(item)}} for item in changed]
+    batches = [requests[index:index + BATCH_WRITE_MAX_ITEMS] for index in range(0, len(requests), BATCH_WRITE_MAX_ITEMS)]
+    stats["batches"] += len(batches)
+    try:
+        for result in executor.map(metrics.bound(lambda batch: write_batch(ddb_client, batch)), batches):
+            stats["items"] += result["items"]
+            stats["retries"] += result["retries"]
+            stats["unprocessed"] += result["unprocessed"]
+        for refreshed in executor.map(metrics.bound(lambda item: refresh_expires(ddb_client, item)), refresh):
+            stats["refreshed"] += int(refreshed)
+    finally:
+        # warm containers must not keep serving the previous query results
+        cache.invalidate_services({item["service"] for item in changed})
+        cache.invalidate_arns([item["arn"] for item in changed])
+
+
+def write_batch(ddb_client, requests):
+    """
+    Write a single group of put requests, retrying unprocessed items with exponential backoff.
+    """
+    result = {"items": 0, "retries": 0, "unprocessed": 0}
+    pending = requests
+    while pending:
+        response = ddb_client.batch_write_item(RequestItems={CONTENT_TABLE_NAME: pending})
+        unprocessed = response.get("UnprocessedItems", {}).get(CONTENT_TABLE_NAME, [])
+        result["items"] += len(pending) - len(unprocessed)
+        pending = unprocessed
+        if pending:
+            if result["retries"] >= BATCH_WRITE_MAX_RETRIES:
+                print("giving up on {} unprocessed items".format(len(pending)))
+                result["unprocessed"] = len(pending)
+                break
+            # full jitter keeps concurrent batches from retrying in lockstep
+            time.sleep(random.uniform(0, BATCH_WRITE_BACKOFF_SECONDS * (2 ** result["retries"])))
+            result["retries"] += 1
+    return result
+
+
+def put_tombstones(items):
+    """
+    Replace cache items with tombstones in groups of 25 with BatchWriteItem.
+    Items need their arn and service. Returns the number of tombstones written.
+    """
+    ddb_client = clients.client('dynamodb', config=MSAM_BOTO3_CONFIG)
+    requests = [{"PutRequest": {"Item": serialize_item(content_items.tombstone_item(item["arn"], item["service"]))}} for item in items]
+    written = 0
+    try:
+        for index in range(0, len(requests), BATCH_WRITE_MAX_ITEMS):
+            written += write_batch(ddb_client, requests[index:index + BATCH_WRITE_MAX_ITEMS])["items"]
+    finally:
+        cache.invalidate_services({item["service"] for item in items})
+        cache.invalidate_arns([item["arn"] for item in items])
+    return written
+
+
+def stored_service_region(service, region, attributes):
+    """
+    Return the listed attributes of the stored items of a service in a region,
+    read from the table rather than the read cache.
+    """
+    ddb_client = clients.client('dynamodb', config=MSAM_BOTO3_CONFIG)
+    query_args = cache.projection_arguments(attributes)
+    query_args["ExpressionAttributeNames"].update({"#service": "service", "#region": "region"})
+    query_args.update(
+        TableName=CONTENT_TABLE_NAME,
+        IndexName="ServiceRegionIndex",
+        KeyConditionExpression="#service = :service AND #region = :region",
+        ExpressionAttributeValues={":service": {"S": service}, ":region": {"S": region}})
+    items = []
+    for page in ddb_client.get_paginator("query").paginate(**query_args):
+        items.extend(cache.deserialize_item(item) for item in page["Items"])
+    return items
+
+
+def refresh_expires(ddb_client, item):
+    """
+    Move the expiration of an unchanged item forward without sending its data again.
+    """
+    try:
+        ddb_client.update_item(
+            TableName=CONTENT_TABLE_NAME,
+            Key={"arn": {"S": item["arn"]}},
+            UpdateExpression="SET #expires = :expires",
+            ConditionExpression="#digest = :digest",
+            ExpressionAttributeNames={"#expires": "expires", "#digest": "digest"},
+            ExpressionAttributeValues={":expires": {"N": str(item["expires"])}, ":digest": {"S": item["digest"]}})
+        return True
+    except ClientError as error:
+        # the item changed or vanished since it was read, the next sweep will rewrite it
+        print(error)
+        return False
+
+
+def stored_digests(ddb_client, arns):
+    """
+    Return a dictionary of ARN to the stored digest, expiration and name for the given ARNs.
+    """
+    stored = {}
+    for item in cache.batch_get_items(ddb_client, arns, attributes=["arn", "digest", "expires", "name"]):
+        stored[item["arn"]] = item
+    return stored
+
+
+def serialize_item(item):
+    """
+    Convert a cache item into the DynamoDB attribute value format used by the client API.
+    """
+    return {key: SERIALIZER.serialize(value) for key, value in item.items()}
+
@@ -0,0 +1,87 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+This file contains helper functions for structuring content table items.
+It has no dependencies on the rest of chalicelib so the event collector
+can package the same file, the events build copies it next to the collector.
+"""
+
+import hashlib
+import json
+import re
+import time
+
+# index of content items by the hour they were last written, used by the change feed
+CHANGE_BUCKET_ATTRIBUTE = "change_bucket"
+CHANGE_BUCKET_SECONDS = 3600
+
+# deleted items are kept as tombstones this long so the change feed can report them
+TOMBSTONE_TTL_SECONDS = 86400
+
+# configuration keys holding the display name of a node, in order of preference
+DISPLAY_NAME_KEYS = ["Name", "Id", "InstanceId"]
+
+
+def node_item(arn, service, region, config, ttl):
+    """
+    Restructure an item from a List or Describe API call into a cache item.
+    """
+    now = int(time.time())
+    return {
+        "arn": arn,
+        "region": region,
+        "service": service,
+        "updated": now,
+        "expires": now + ttl,
+        "name": display_name(arn, config),
+        "data": json.dumps(config, default=str),
+        "digest": data_digest(config)
+    }
+
+
+def data_digest(config):
+    """
+    Return a digest of the canonical JSON form of an item's data.
+    """
+    canonical = json.dumps(config, default=str, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def display_name(arn, config):
+    """
+    Return the name shown for a node, falling back to the last part of the ARN.
+    """
+    for key in DISPLAY_NAME_KEYS:
+        if isinstance(config, dict) and config.get(key):
+            return str(config[key])
+    return re.split("[:/]", arn)[-1]
+
+
+def change_bucket(timestamp):
+    """
+    Return the change feed index partition for an updated timestamp.
+    """
+    return int(timestamp) // CHANGE_BUCKET_SECONDS
+
+
+def tombstone_item(arn, service):
+    """
+    Structure the cache item that replaces a deleted item until the change feed no longer needs it.
+    Tombstones have no service attribute and stay out of the service index.
+    """
+    now = int(time.time())
+    return {
+        "arn": arn,
+        "tombstone": True,
+        "deleted_service": service,
+        "updated": now,
+        CHANGE_BUCKET_ATTRIBUTE: change_bucket(now),
+        "expires": now + TOMBSTONE_TTL_SECONDS
+    }
+
+
+def is_tombstone(item):
+    """
+    Return True if the cache item marks a deleted item.
+    """
+    return bool(item.get("tombstone"))
@@ -0,0 +1,42 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+This file contains helper functions for running per-item API calls concurrently.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from chalicelib import metrics
+
+# concurrent per-item calls for services not listed in FANOUT_CONCURRENCY
+FANOUT_DEFAULT_CONCURRENCY = int(os.environ.get("FANOUT_DEFAULT_CONCURRENCY", "8"))
+
+# per-service overrides, for example "mediaconnect=16,mediatailor=4", 1 runs the calls one after another
+FANOUT_CONCURRENCY = {
+    name.strip(): int(value)
+    for name, value in (pair.split("=") for pair in os.environ.get("FANOUT_CONCURRENCY", "").split(",") if "=" in pair)
+}
+
+
+def concurrency(service_name):
+    """
+    Return the number of concurrent per-item calls allowed for a service.
+    """
+    return max(1, FANOUT_CONCURRENCY.get(service_name, FANOUT_DEFAULT_CONCURRENCY))
+
+
+def fan_out(service_name, function, items):
+    """
+    Call function once per item, several at a time, and return the results in the order of the items.
+    Retries are left to the client configuration of each call. The first exception
+    in item order is raised, as it would be by a plain loop.
+    """
+    items = list(items)
+    # the workers record their calls into the caller's discovery step
+    function = metrics.bound(function)
+    workers = min(concurrency(service_name), len(items))
+    if workers <= 1:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, items))
@@ -0,0 +1,135 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+This file contains helper functions for pacing AWS API calls with a token bucket
+per account, service and region that slows down when the service throttles and
+speeds up again after sustained success.
+"""
+
+import os
+import threading
+import time
+
+from chalicelib import metrics
+
+# conservative shares of the account-level limits that consoles and automation also draw from,
+# 0 does not pace the service, DynamoDB capacity is managed by the tables
+DEFAULT_GOVERNOR_RATES = {
+    "medialive": 5,
+    "mediapackage": 5,
+    "mediastore": 5,
+    "mediaconnect": 5,
+    "mediatailor": 5,
+    "cloudfront": 2,
+    "dynamodb": 0,
+    "sts": 0
+}
+
+# requests per second per (account, service, region) for services without a rate, 0 does not pace them
+GOVERNOR_DEFAULT_RATE = float(os.environ.get("GOVERNOR_DEFAULT_RATE", "10"))
+
+# per-service overrides in requests per second, for example "medialive=2,cloudfront=1"
+GOVERNOR_RATES = dict(DEFAULT_GOVERNOR_RATES, **{
+    name.strip(): float(value)
+    for name, value in (pair.split("=") for pair in os.environ.get("GOVERNOR_RATES", "").split(",") if "=" in pair)
+})
+
+# the rate is multiplied by this when an attempt is throttled
+GOVERNOR_DECREASE_FACTOR = 0.5
+
+# the lowest rate a throttled bucket falls to
+GOVERNOR_MIN_RATE = 0.5
+
+# successful attempts in a row before the rate is raised by a tenth of the configured rate
+GOVERNOR_SUCCESS_STREAK = 20
+
+# (account, service, region) -> bucket, the account is None for the deployment's own account
+BUCKETS = {}
+BUCKETS_LOCK = threading.Lock()
+
+
+def configured_rate(service_name):
+    """
+    Return the requests per second configured for a service, 0 if it is not paced.
+    """
+    return GOVERNOR_RATES.get(service_name, GOVERNOR_DEFAULT_RATE)
+
+
+def bucket(service_name, region_name, account=None):
+    """
+    Return the shared bucket of a service and region in an account, creating it full on first use.
+    Service limits apply per account, so every discovered account has its own buckets.
+    """
+    key = (account, service_name, region_name)
+    with BUCKETS_LOCK:
+        if key not in BUCKETS:
+            limit = configured_rate(service_name)
+            BUCKETS[key] = {"key": key, "limit": limit, "rate": limit, "tokens": max(limit, 1), "stamp": time.monotonic(), "streak": 0, "lock": threading.Lock()}
+        return BUCKETS[key]
+
+
+def acquire(token_bucket):
+    """
+    Take a token for one attempt, waiting until the bucket has refilled enough.
+    """
+    with token_bucket["lock"]:
+        now = time.monotonic()
+        # the bucket holds at most one second of calls
+        capacity = max(token_bucket["rate"], 1)
+        token_bucket["tokens"] = min(capacity, token_bucket["tokens"] + (now - token_bucket["stamp"]) * token_bucket["rate"])
+        token_bucket["stamp"] = now
+        # the token is reserved now, so callers waiting at the same time queue up behind each other
+        token_bucket["tokens"] -= 1
+        delay = -token_bucket["tokens"] / token_bucket["rate"] if token_bucket["tokens"] < 0 else 0
+    if delay:
+        metrics.add("GovernorWait", int(delay * 1000))
+        time.sleep(delay)
+
+
+def throttled(token_bucket):
+    """
+    Lower the rate of a bucket after a throttled attempt.
+    """
+    with token_bucket["lock"]:
+        token_bucket["rate"] = max(GOVERNOR_MIN_RATE, token_bucket["rate"] * GOVERNOR_DECREASE_FACTOR)
+        token_bucket["streak"] = 0
+        rate = token_bucket["rate"]
+    account, service_name, region_name = token_bucket["key"]
+    print("throttled by {} in {} of account {}, rate lowered to {}/s".format(service_name, region_name, account or "own", rate))
+
+
+def succeeded(token_bucket):
+    """
+    Raise the rate of a bucket towards its configured rate after a streak of successful attempts.
+    """
+    with token_bucket["lock"]:
+        token_bucket["streak"] += 1
+        if token_bucket["streak"] >= GOVERNOR_SUCCESS_STREAK and token_bucket["rate"] < token_bucket["limit"]:
+            token_bucket["rate"] = min(token_bucket["limit"], token_bucket["rate"] + token_bucket["limit"] / 10)
+            token_bucket["streak"] = 0
+
+
+def govern(service_client, account=None):
+    """
+    Pace every attempt of a client, retries included, with the bucket of its service and region
+    in the account the client acts in, None for the deployment's own account.
+    """
+    service_name = service_client.meta.service_model.service_name
+    if configured_rate(service_name) <= 0:
+        return
+    token_bucket = bucket(service_name, service_client.meta.region_name, account)
+
+    def before_send(**_):
+        acquire(token_bucket)
+
+    def needs_retry(response=None, **_):
+        if response is None:
+            return
+        if response[1].get("Error", {}).get("Code") in metrics.THROTTLE_CODES:
+            throttled(token_bucket)
+        elif response[0].status_code < 300:
+            succeeded(token_bucket)
+
+    # both handlers return None, leaving the request and the retry decision to the client
+    service_client.meta.events.register("before-send", before_send)
+    service_client.meta.events.register("needs-retry", needs_retry)
@@ -8,10 +8,11 @@ import os
 from urllib.parse import unquote
 from botocore.config import Config
 
-import boto3
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 
+from chalicelib import clients
+
 # table names generated by CloudFormation
 LAYOUT_TABLE_NAME = os.environ["LAYOUT_TABLE_NAME"]
 
@@ -20,7 +21,7 @@ STAMP = os.environ["BUILD_STAMP"]
 MSAM_BOTO3_CONFIG = Config(user_agent="aws-media-services-applications-mapper/{stamp}/layout.py".format(stamp=STAMP))
 
 # DynamoDB
-DYNAMO_RESOURCE = boto3.resource("dynamodb", config=MSAM_BOTO3_CONFIG)
+DYNAMO_RESOURCE = clients.resource("dynamodb", config=MSAM_BOTO3_CONFIG)
 
 
 def get_view_layout(request, view):
@@ -0,0 +1,168 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+This file contains helper functions for recording node discovery metrics
+as CloudWatch Embedded Metric Format (EMF) log records.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# emf prints a record per discovery step to the Lambda log, off records nothing
+DISCOVERY_METRICS = os.environ.get("DISCOVERY_METRICS", "emf")
+
+# CloudWatch namespace of the discovery metrics
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "MSAM/Discovery")
+
+# metric name -> unit, recorded for each (region, service) discovery step
+STEP_METRICS = {
+    "ApiCalls": "Count",
+    "Pages": "Count",
+    "Throttles": "Count",
+    "Retries": "Count",
+    "Errors": "Count",
+    "ItemsDiscovered": "Count",
+    "ItemsWritten": "Count",
+    "BytesWritten": "Bytes",
+    "ItemsTombstoned": "Count",
+    "WallTime": "Milliseconds",
+    "GovernorWait": "Milliseconds"
+}
+
+# error codes of throttled API calls
+THROTTLE_CODES = [
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "ProvisionedThroughputExceededException",
+    "SlowDown"
+]
+
+# the step the calling thread records into
+CURRENT = threading.local()
+
+# steps are shared by the worker threads of a discovery step
+VALUES_LOCK = threading.Lock()
+
+# record lists of the active capture() blocks, the innermost receives the records
+CAPTURES = []
+
+
+def new_step(region, service):
+    """
+    Return an empty set of metrics for a discovery step.
+    """
+    return {"Region": region, "Service": service, "values": {name: 0 for name in STEP_METRICS}}
+
+
+def current():
+    """
+    Return the step the calling thread records into, or None.
+    """
+    return getattr(CURRENT, "step", None)
+
+
+@contextmanager
+def recording(step):
+    """
+    Record the metrics of the calling thread into step within the block.
+    """
+    previous = current()
+    CURRENT.step = step
+    try:
+        yield step
+    finally:
+        CURRENT.step = previous
+
+
+def bound(function):
+    """
+    Return function wrapped to record into the caller's step from any thread,
+    for work handed to a thread pool.
+    """
+    step = current()
+    if step is None:
+        return function
+
+    def call(*args, **kwargs):
+        with recording(step):
+            return function(*args, **kwargs)
+    return call
+
+
+def add(name, value=1):
+    """
+    Add value to a metric of the calling thread's step, if it has one.
+    """
+    step = current()
+    if step is not None and value:
+        with VALUES_LOCK:
+            step["values"][name] += value
+
+
+def instrument(service_client):
+    """
+    Count the API calls, retries and throttles of a client into the calling thread's step.
+    """
+    service_client.meta.events.register("after-call", after_call)
+    service_client.meta.events.register("needs-retry", needs_retry)
+
+
+def after_call(parsed=None, **_):
+    """
+    Count a completed API call and the retries it took.
+    """
+    add("ApiCalls")
+    if isinstance(parsed, dict):
+        add("Retries", parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0))
+
+
+def needs_retry(response=None, **_):
+    """
+    Count an attempt rejected by throttling. Returns None to leave the retry decision to the client.
+    """
+    if response is not None and response[1].get("Error", {}).get("Code") in THROTTLE_CODES:
+        add("Throttles")
+
+
+def emit(step, **values):
+    """
+    Write the metrics of a step as an EMF record, adding the given values.
+    """
+    if DISCOVERY_METRICS != "emf":
+        return
+    with VALUES_LOCK:
+        step["values"].update(values)
+        record = dict(step["values"])
+    record["Region"] = step["Region"]
+    record["Service"] = step["Service"]
+    record["_aws"] = {
+        "Timestamp": int(time.time() * 1000),
+        "CloudWatchMetrics": [{
+            "Namespace": METRICS_NAMESPACE,
+            "Dimensions": [["Region", "Service"]],
+            "Metrics": [{"Name": name, "Unit": unit} for name, unit in STEP_METRICS.items()]
+        }]
+    }
+    if CAPTURES:
+        CAPTURES[-1].append(record)
+    else:
+        print(json.dumps(record))
+
+
+@contextmanager
+def capture():
+    """
+    Collect the records emitted within the block in a list instead of printing them.
+    """
+    records = []
+    CAPTURES.append(records)
+    try:
+        yield records
+    finally:
+        CAPTURES.remove(records)
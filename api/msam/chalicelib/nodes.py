@@ -8,16 +8,25 @@ import hashlib
 import json
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from urllib.parse import urlparse
 
-import boto3
 from botocore.config import Config
 from botocore.exceptions import ClientError
 from botocore.exceptions import EndpointConnectionError
 from jsonpath_ng import parse
 
+from chalicelib import catalog
+from chalicelib import codec
+from chalicelib import clients
+from chalicelib import connections
 from chalicelib import content
+from chalicelib import content_items
+from chalicelib import fanout
+from chalicelib import metrics
+from chalicelib import settings as msam_settings
 from chalicelib import cache
+from chalicelib import tagging
 
 # TTL provided via CloudFormation
 CACHE_ITEM_TTL = int(os.environ["CACHE_ITEM_TTL"])
@@ -26,190 +35,226 @@ STAMP = os.environ["BUILD_STAMP"]
 # used to handle throttling, be very patient and back off a lot if needed
 MSAM_BOTO3_CONFIG = Config(retries={'max_attempts': 15}, user_agent="aws-media-services-applications-mapper/{stamp}/nodes.py".format(stamp=STAMP))
 
+# services of a region discovered at the same time, 1 runs the steps one after another
+DISCOVERY_WORKERS = int(os.environ.get("DISCOVERY_WORKERS", "4"))
+
+# instances per DescribeInstances page, without a limit every instance of a region arrives in one response
+EC2_PAGE_MAX_RESULTS = 200
+
+# setting with the tag keys an EC2 instance needs at least one of to be discovered, an empty list discovers all
+EC2_TAG_KEYS_SETTING = "ec2-tag-keys"
+
+# tag keys used when the setting is missing
+DEFAULT_EC2_TAG_KEYS = ["MSAM-NodeType", "MSAM-Diagram", "MSAM-Tile"]
+
+# the deployment's own account id, looked up once
+OWN_ACCOUNT = {}
+
+
 def update_regional_ddb_items(region_name):
     """
     Update all services in the cache for a region.
-    """
-    try:
-        print("medialive-input")
-        content.put_ddb_items(medialive_input_ddb_items(region_name))
-    except (ClientError, EndpointConnectionError) as error:
-        print(error)
-    try:
-        print("medialive-channel")
-        content.put_ddb_items(medialive_channel_ddb_items(region_name))
-    except (ClientError, EndpointConnectionError) as error:
-        print(error)
-    try:
-        print("medialive-multiplex")
-        content.put_ddb_items(medialive_multiplex_ddb_items(region_name))
-    except (ClientError, EndpointConnectionError) as error:
-        print(error)
-    try:
-        print("mediapackage-channel")
-        content.put_ddb_items(mediapackage_channel_ddb_items(region_name))
-    except (ClientError, EndpointConnectionError) as error:
-        print(error)
+    Returns the elapsed milliseconds and item counts per service.
+    """
+    return run_discovery_steps(REGIONAL_DISCOVERY_STEPS, region_name)
+
+
+def run_discovery_steps(steps, *args, role_arn=None):
+    """
+    Discover and store the services of a step table, several services at a time.
+    A step starts once the steps it depends on have finished.
+    With a role ARN the services of the role's account are discovered.
+    Returns the elapsed milliseconds, discovered items and changed items per service.
+    """
+    start = time.time()
+    results = {}
+    futures = {}
+    # steps are queued in table order, so a step only waits on steps already running or done
+    with ThreadPoolExecutor(max_workers=DISCOVERY_WORKERS) as executor:
+        for service, step, depends_on in steps:
+            # a prerequisite left out of the table was discovered by an earlier run
+            prerequisites = [futures[name] for name in depends_on if name in futures]
+            futures[service] = executor.submit(run_discovery_step, service, step, args, role_arn, prerequisites, results)
+    for service, future in futures.items():
+        if future.exception():
+            print("{} discovery failed: {}".format(service, future.exception()))
+    elapsed_ms = int((time.time() - start) * 1000)
+    timings = {service: result["elapsed_ms"] for service, result in results.items()}
+    print("discovery took {}ms for {}ms of service time: {}".format(elapsed_ms, sum(timings.values()), timings))
+    return results
+
+
+def run_discovery_step(service, step, args, role_arn, prerequisites, results):
+    """
+    Discover and store a single service, keeping its failures away from the other services.
+    """
+    wait(prerequisites)
+    start = time.time()
+    result = {"items": 0, "changed": 0}
+    scope = args[0] if args else "global"
+    if role_arn is not None:
+        scope = "{}:{}".format(clients.role_account(role_arn), scope)
+    step_metrics = metrics.new_step(scope, service)
     try:
-        print("mediapackage-origin-endpoint")
-        content.put_ddb_items(mediapackage_origin_endpoint_ddb_items(region_name))
+        print(service)
+        seen = set()
+        with metrics.recording(step_metrics):
+            stats = content.put_ddb_items(step(*args, role_arn=role_arn), seen)
+            metrics.add("ItemsWritten", stats["items"])
+            metrics.add("BytesWritten", stats["bytes_written"])
+            # a step that dropped resources it could not describe has an incomplete view
+            if reconciled(service) and not step_metrics["values"]["Errors"]:
+                region = args[0] if args else "global"
+                metrics.add("ItemsTombstoned", reconcile(RECONCILED_STEP_SERVICES[service], region, role_arn, seen, int(start)))
+        result["items"] = stats["items"] + stats["unprocessed"] + stats["skipped"] + stats["refreshed"]
+        result["changed"] = stats["items"] + stats["unprocessed"]
     except (ClientError, EndpointConnectionError) as error:
         print(error)
-    try:
-        print("mediastore-container")
-        content.put_ddb_items(mediastore_container_ddb_items(region_name))
-    except (ClientError, EndpointConnectionError) as error:
-        print(error)
-    try:
-        print("speke-server")
-        content.put_ddb_items(speke_server_ddb_items(region_name))
-    except (ClientError, EndpointConnectionError) as error:
-        print(error)
-    try:
-        print("mediaconnect-flow")
-        content.put_ddb_items(mediaconnect_flow_ddb_items(region_name))
-    except ClientError as error:
-        print(error)
-    try:
-        print("mediatailor-configuration")
-        content.put_ddb_items(mediatailor_configuration_ddb_items(region_name))
-    except ClientError as error:
-        print(error)
-    try:
-        print("ec2-instances")
-        content.put_ddb_items(ec2_instance_ddb_items(region_name))
-    except ClientError as error:
-        print(error)
+    finally:
+        result["elapsed_ms"] = int((time.time() - start) * 1000)
+        results[service] = result
+        metrics.emit(step_metrics, ItemsDiscovered=result["items"], WallTime=result["elapsed_ms"])
+
+
+def reconciled(service):
+    """
+    Return whether the stored items of a discovery step that it no longer finds are tombstoned.
+    EC2 instances are not reconciled while the tag filter is active, the filter hides
+    untagged instances that still exist, including those cached before it was introduced.
+    """
+    if service not in RECONCILED_STEP_SERVICES:
+        return False
+    return service != "ec2-instances" or not ec2_tag_keys()
+
+
+def reconcile(service, region, role_arn, seen, started):
+    """
+    Replace the stored items of a completed discovery step that it no longer found with tombstones,
+    along with the connections from or to them. Only items of the step's account stored before
+    the step started are considered, so items written meanwhile by the event collectors stay.
+    Returns the number of tombstones written.
+    """
+    accounts = [clients.role_account(role_arn)] if role_arn is not None else [own_account(), ""]
+    vanished = []
+    for item in content.stored_service_region(service, region, ["arn", "updated"]):
+        arn_parts = item["arn"].split(":")
+        if item["arn"] not in seen and int(item["updated"]) < started and len(arn_parts) > 4 and arn_parts[4] in accounts:
+            vanished.append({"arn": item["arn"], "service": service})
+    if not vanished:
+        return 0
+    print("{} {} items in {} no longer exist: {}".format(len(vanished), service, region, [item["arn"] for item in vanished]))
+    stale_connections = connections.connections_of(item["arn"] for item in vanished)
+    return content.put_tombstones(vanished + stale_connections)
+
+
+def own_account():
+    """
+    Return the account id of the deployment.
+    """
+    if "id" not in OWN_ACCOUNT:
+        OWN_ACCOUNT["id"] = clients.client('sts', config=MSAM_BOTO3_CONFIG).get_caller_identity()["Account"]
+    return OWN_ACCOUNT["id"]
 
 
 def update_regional_ssm_ddb_items(region_name):
     """
     Update ssm nodes in the cache for a region.
     """
-    try:
-        print("ssm-managed-instances")
-        content.put_ddb_items(ssm_managed_instance_ddb_items(region_name))
-    except ClientError as error:
-        print(error)
+    return run_discovery_steps([("ssm-managed-instance", ssm_managed_instance_ddb_items, [])], region_name)
 
 
 def update_global_ddb_items():
     """
     Update all global services in the cache.
+    Returns the elapsed milliseconds and item counts per service.
     """
-    try:
-        print("s3-bucket")
-        content.put_ddb_items(s3_bucket_ddb_items())
-    except (ClientError, EndpointConnectionError) as error:
-        print(error)
-    try:
-        print("cloudfront-distribution")
-        content.put_ddb_items(cloudfront_distribution_ddb_items())
-    except (ClientError, EndpointConnectionError) as error:
-        print(error)
+    return run_discovery_steps(GLOBAL_DISCOVERY_STEPS)
 
 
-def s3_bucket_ddb_items():
+def s3_bucket_ddb_items(role_arn=None):
     """
     Retrieve and format S3 buckets for cache storage.
     """
-    items = []
-    for bucket in s3_buckets():
+    for bucket in s3_buckets(role_arn):
         arn = "arn:aws:s3:::{}".format(bucket["Name"])
         service = "s3"
-        items.append(node_to_ddb_item(arn, service, "global", bucket))
-    return items
+        yield node_to_ddb_item(arn, service, "global", bucket)
 
 
-def cloudfront_distribution_ddb_items():
+def cloudfront_distribution_ddb_items(role_arn=None):
     """
     Retrieve and format CloudFront distributions for cache storage.
     """
-    items = []
-    for item in cloudfront_distributions():
+    for item in cloudfront_distributions(role_arn):
         arn = item["ARN"]
         service = "cloudfront-distribution"
-        items.append(node_to_ddb_item(arn, service, "global", item))
-    return items
+        yield node_to_ddb_item(arn, service, "global", item)
 
 
-def medialive_channel_ddb_items(region):
+def medialive_channel_ddb_items(region, role_arn=None):
     """
     Retrieve and format MediaLive channels for cache storage.
     """
-    items = []
-    for channel in medialive_channels(region):
+    for channel in medialive_channels(region, role_arn):
         arn = channel["Arn"]
         service = "medialive-channel"
-        items.append(node_to_ddb_item(arn, service, region, channel))
-    return items
+        yield node_to_ddb_item(arn, service, region, channel)
 
 
-def medialive_input_ddb_items(region):
+def medialive_input_ddb_items(region, role_arn=None):
     """
     Retrieve and format MediaLive inputs for cache storage.
     """
-    items = []
-    for ml_input in medialive_inputs(region):
+    for ml_input in medialive_inputs(region, role_arn):
         arn = ml_input["Arn"]
         service = "medialive-input"
-        items.append(node_to_ddb_item(arn, service, region, ml_input))
-    return items
+        yield node_to_ddb_item(arn, service, region, ml_input)
 
 
-def medialive_multiplex_ddb_items(region):
+def medialive_multiplex_ddb_items(region, role_arn=None):
     """
     Retrieve and format MediaLive inputs for cache storage.
     """
-    items = []
-    for multiplex in medialive_multiplexes(region):
+    for multiplex in medialive_multiplexes(region, role_arn):
         arn = multiplex["Arn"]
         service = "medialive-multiplex"
-        items.append(node_to_ddb_item(arn, service, region, multiplex))
-    return items
+        yield node_to_ddb_item(arn, service, region, multiplex)
 
 
-def mediapackage_channel_ddb_items(region):
+def mediapackage_channel_ddb_items(region, role_arn=None):
     """
     Retrieve and format MediaPackage channels for cache storage.
     """
-    items = []
-    for channel in mediapackage_channels(region):
+    for channel in mediapackage_channels(region, role_arn):
         arn = channel["Arn"]
         service = "mediapackage-channel"
-        items.append(node_to_ddb_item(arn, service, region, channel))
-    return items
+        yield node_to_ddb_item(arn, service, region, channel)
 
 
-def mediapackage_origin_endpoint_ddb_items(region):
+def mediapackage_origin_endpoint_ddb_items(region, role_arn=None):
     """
     Retrieve and format MediaPackage endpoints for cache storage.
     """
-    items = []
-    for endpoint in mediapackage_origin_endpoints(region):
+    for endpoint in mediapackage_origin_endpoints(region, role_arn):
         arn = endpoint["Arn"]
         service = "mediapackage-origin-endpoint"
-        items.append(node_to_ddb_item(arn, service, region, endpoint))
-    return items
+        yield node_to_ddb_item(arn, service, region, endpoint)
 
 
-def mediastore_container_ddb_items(region):
+def mediastore_container_ddb_items(region, role_arn=None):
     """
     Retrieve and format MediaPackage endpoints for cache storage.
     """
-    items = []
-    for container in mediastore_containers(region):
+    for container in mediastore_containers(region, role_arn):
         arn = container["ARN"]
         service = "mediastore-container"
-        items.append(node_to_ddb_item(arn, service, region, container))
-    return items
+        yield node_to_ddb_item(arn, service, region, container)
 
 
-def speke_server_ddb_items(region):
+def speke_server_ddb_items(region, role_arn=None):
     """
     Find the SPEKE key servers based on MediaPackage endpoint configurations
     """
-    items = []
     # create an expression to find speke server urls
     jsonpath_expr = parse('$..SpekeKeyProvider.Url')
     # get MediaPackage origin endpoints
@@ -226,297 +271,339 @@ def speke_server_ddb_items(region):
             config = {"arn": arn, "endpoint": server_url, "scheme": parsed.scheme}
             service = "speke-keyserver"
             # print(config)
-            items.append(node_to_ddb_item(arn, service, "global", config))
-    return items
+            yield node_to_ddb_item(arn, service, "global", config)
 
 
-def mediaconnect_flow_ddb_items(region):
+def mediaconnect_flow_ddb_items(region, role_arn=None):
     """
     Retrieve and format MediaConnect flows for cache storage.
     """
-    items = []
-    for mc_flow in mediaconnect_flows(region):
+    for mc_flow in mediaconnect_flows(region, role_arn):
         arn = mc_flow["FlowArn"]
         service = "mediaconnect-flow"
-        items.append(node_to_ddb_item(arn, service, region, mc_flow))
-    return items
+        yield node_to_ddb_item(arn, service, region, mc_flow)
 
 
-def mediatailor_configuration_ddb_items(region):
+def mediatailor_configuration_ddb_items(region, role_arn=None):
     """
     Retrieve and format MediaTailor configuration for cache storage.
     """
-    items = []
-    for config in mediatailor_configurations(region):
+    for config in mediatailor_configurations(region, role_arn):
         arn = config["PlaybackConfigurationArn"]
         service = "mediatailor-configuration"
-        items.append(node_to_ddb_item(arn, service, region, config))
-    return items
+        yield node_to_ddb_item(arn, service, region, config)
 
 
-def ssm_managed_instance_ddb_items(region):
+def ssm_managed_instance_ddb_items(region, role_arn=None):
     """
     Retrieve and format SSM managed instances for cache storage.
     """
-    items = []
-    for managed_instance in ssm_managed_instances(region):
-        account_id = boto3.client('sts').get_caller_identity().get('Account')
+    account_id = clients.client('sts', config=MSAM_BOTO3_CONFIG, role_arn=role_arn, governed=True).get_caller_identity().get('Account')
+    for managed_instance in ssm_managed_instances(region, role_arn):
         arn = "arn:aws:ssm-managed-instance:" + region + ":" + account_id + ":instance/" + managed_instance['Id']
         service = "ssm-managed-instance"
-        items.append(node_to_ddb_item(arn, service, region, managed_instance))
-    return items
+        yield node_to_ddb_item(arn, service, region, managed_instance)
 
 
-def ec2_instance_ddb_items(region):
+def ec2_instance_ddb_items(region, role_arn=None):
     """
     Retrieve and format EC2 instances for cache storage.
     """
-    items = []
-    for ec2_instance in ec2_instances(region):
-        arn = "arn:aws:ec2-instance:" + region + "::" + ec2_instance['InstanceId']
+    for ec2_instance in ec2_instances(region, role_arn):
+        # the deployment's own instances keep ARNs without an account
+        arn = "arn:aws:ec2-instance:" + region + ":" + (clients.role_account(role_arn) or "") + ":" + ec2_instance['InstanceId']
         service = "ec2-instance"
-        items.append(node_to_ddb_item(arn, service, region, ec2_instance))
-    return items
+        yield node_to_ddb_item(arn, service, region, ec2_instance)
+
+
+# (service, items function, services it depends on) in the order they ran serially
+REGIONAL_DISCOVERY_STEPS = [
+    ("medialive-input", medialive_input_ddb_items, []),
+    ("medialive-channel", medialive_channel_ddb_items, []),
+    ("medialive-multiplex", medialive_multiplex_ddb_items, []),
+    ("mediapackage-channel", mediapackage_channel_ddb_items, []),
+    ("mediapackage-origin-endpoint", mediapackage_origin_endpoint_ddb_items, []),
+    ("mediastore-container", mediastore_container_ddb_items, []),
+    # key servers are found in the cached origin endpoint configurations
+    ("speke-server", speke_server_ddb_items, ["mediapackage-origin-endpoint"]),
+    ("mediaconnect-flow", mediaconnect_flow_ddb_items, []),
+    ("mediatailor-configuration", mediatailor_configuration_ddb_items, []),
+    ("ec2-instances", ec2_instance_ddb_items, [])
+]
+
+GLOBAL_DISCOVERY_STEPS = [
+    ("s3-bucket", s3_bucket_ddb_items, []),
+    ("cloudfront-distribution", cloudfront_distribution_ddb_items, [])
+]
+
+# step -> service of the items it stores, for the steps whose stored items that were not found again are
+# tombstoned; S3 bucket ARNs carry no account and key servers are derived from cached endpoints, so those stay
+RECONCILED_STEP_SERVICES = {
+    "medialive-input": "medialive-input",
+    "medialive-channel": "medialive-channel",
+    "medialive-multiplex": "medialive-multiplex",
+    "mediapackage-channel": "mediapackage-channel",
+    "mediapackage-origin-endpoint": "mediapackage-origin-endpoint",
+    "mediastore-container": "mediastore-container",
+    "mediaconnect-flow": "mediaconnect-flow",
+    "mediatailor-configuration": "mediatailor-configuration",
+    "ec2-instances": "ec2-instance",
+    "ssm-managed-instance": "ssm-managed-instance",
+    "cloudfront-distribution": "cloudfront-distribution"
+}
+
+# regional step -> AWS service it lists, steps of a service missing from a region are skipped
+DISCOVERY_STEP_SERVICES = {
+    "medialive-input": "medialive",
+    "medialive-channel": "medialive",
+    "medialive-multiplex": "medialive",
+    "mediapackage-channel": "mediapackage",
+    "mediapackage-origin-endpoint": "mediapackage",
+    "mediastore-container": "mediastore",
+    "mediaconnect-flow": "mediaconnect",
+    "mediatailor-configuration": "mediatailor",
+    "ec2-instances": "ec2"
+}
 
 
 def node_to_ddb_item(arn, service, region, config):
     """
     Restructure an item from a List or Describe API call into a cache item.
     """
-    now = int(time.time())
-    item = {"arn": arn, "region": region, "service": service, "updated": now, "expires": now + CACHE_ITEM_TTL, "data": json.dumps(config, default=str)}
-    return item
+    return codec.encode_item(content_items.node_item(arn, service, region, config, CACHE_ITEM_TTL))
 
 
-def cloudfront_distributions():
+def cloudfront_distributions(role_arn=None):
     """
-    Retrieve all CloudFront distributions (global).
-    Tags retrieved.
+    Retrieve all CloudFront distributions (global), one page at a time.
+    Tags retrieved, in bulk when possible.
     """
-    service = boto3.client("cloudfront", config=MSAM_BOTO3_CONFIG)
+    service = clients.client("cloudfront", config=MSAM_BOTO3_CONFIG, role_arn=role_arn, governed=True)
+    tags = tagging.bulk_tags(tagging.CLOUDFRONT_TAGS_REGION, ["cloudfront:distribution"], role_arn)
     response = service.list_distributions()
-    items = response["DistributionList"]["Items"]
-    while "NextMarker" in response["DistributionList"]:
+    while True:
+        metrics.add("Pages")
+        for item in response["DistributionList"].get("Items", []):
+            item['LastModifiedTime'] = str(item['LastModifiedTime'])
+            if tags is not None:
+                item["Tags"] = tags.get(item["ARN"], {})
+                yield item
+                continue
+            try:
+                tags_response = service.list_tags_for_resource(Resource=item["ARN"])
+                item["Tags"] = {}
+                if "Items" in tags_response["Tags"]:
+                    for tag in tags_response["Tags"]["Items"]:
+                        item["Tags"][tag["Key"]] = tag["Value"]
+            except ClientError as error:
+                print(error)
+            yield item
+        if "NextMarker" not in response["DistributionList"]:
+            break
         response = service.list_distributions(Marker=response["DistributionList"]["NextMarker"])
-        items = items + response["DistributionList"]["Items"]
-    for item in items:
-        item['LastModifiedTime'] = str(item['LastModifiedTime'])
-        try:
-            response = service.list_tags_for_resource(Resource=item["ARN"])
-            item["Tags"] = {}
-            if "Items" in response["Tags"]:
-                for tag in response["Tags"]["Items"]:
-                    item["Tags"][tag["Key"]] = tag["Value"]
-        except ClientError as error:
-            print(error)
-    return items
-
-
-def s3_buckets():
+
+
+def s3_buckets(role_arn=None):
     """
     Retrieve all S3 buckets (global).
+    Tags retrieved, in bulk when possible.
     """
-    service = boto3.client("s3", config=MSAM_BOTO3_CONFIG)
+    service = clients.client("s3", config=MSAM_BOTO3_CONFIG, role_arn=role_arn, governed=True)
     buckets = service.list_buckets()
+    metrics.add("Pages")
+    # buckets are listed globally but tagged in their own region
+    tags, complete = tagging.bulk_tags_all_regions(["s3"], role_arn)
     for item in buckets["Buckets"]:
         item["CreationDate"] = str(item["CreationDate"])
-        try:
-            response = service.get_bucket_tagging(Bucket=item["Name"])
-            item["Tags"] = {}
-            if "TagSet" in response:
-                for tag in response["TagSet"]:
-                    item["Tags"][tag["Key"]] = tag["Value"]
-        except ClientError:
-            pass
-    return buckets["Buckets"]
+        bucket_arn = "arn:aws:s3:::{}".format(item["Name"])
+        if bucket_arn in tags:
+            item["Tags"] = tags[bucket_arn]
+        elif not complete:
+            # a bucket missing from a complete bulk result is untagged
+            try:
+                response = service.get_bucket_tagging(Bucket=item["Name"])
+                item["Tags"] = {}
+                if "TagSet" in response:
+                    for tag in response["TagSet"]:
+                        item["Tags"][tag["Key"]] = tag["Value"]
+            except ClientError:
+                pass
+        yield item
 
 
-def mediapackage_channels(region):
+def paged_items(method, key, **kwargs):
     """
-    Return the MediaPackage channels for the given region.
+    Yield the items of a list call one page at a time, following NextToken.
+    """
+    response = method(**kwargs)
+    metrics.add("Pages")
+    yield from response[key]
+    while "NextToken" in response:
+        response = method(NextToken=response["NextToken"], **kwargs)
+        metrics.add("Pages")
+        yield from response[key]
+
+
+def paged_fan_out(service_name, function, method, key):
+    """
+    Call function once per listed item, several at a time, one page of the listing at a time.
+    """
+    response = method()
+    metrics.add("Pages")
+    yield from fanout.fan_out(service_name, function, response[key])
+    while "NextToken" in response:
+        response = method(NextToken=response["NextToken"])
+        metrics.add("Pages")
+        yield from fanout.fan_out(service_name, function, response[key])
+
+
+def mediapackage_channels(region, role_arn=None):
+    """
+    Return the MediaPackage channels for the given region, one page at a time.
     Tags included.
     """
-    items = []
     service_name = 'mediapackage'
-    if region in boto3.Session().get_available_regions(service_name):
-        service = boto3.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG)
+    if catalog.available(service_name, region):
+        service = clients.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG, role_arn=role_arn, governed=True)
         jsonpath_expr = parse('$..Password')
-        response = service.list_channels()
-        items = items + response['Channels']
-        while "NextToken" in response:
-            response = service.list_channels(NextToken=response["NextToken"])
-            items = items + response['Channels']
-        jsonpath_expr.update(items, "XXXXXXXXXXXX")
+        for channel in paged_items(service.list_channels, 'Channels'):
+            jsonpath_expr.update(channel, "XXXXXXXXXXXX")
+            yield channel
     else:
         print("not available in this region")
-    return items
 
 
-def mediapackage_origin_endpoints(region):
+def mediapackage_origin_endpoints(region, role_arn=None):
     """
-    Return the MediaPackage origin endpoints for the given region.
+    Return the MediaPackage origin endpoints for the given region, one page at a time.
     Tags included.
     """
-    items = []
     service_name = 'mediapackage'
-    if region in boto3.Session().get_available_regions(service_name):
-        service = boto3.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG)
-        response = service.list_origin_endpoints()
-        items = items + response['OriginEndpoints']
-        while "NextToken" in response:
-            response = service.list_origin_endpoints(NextToken=response["NextToken"])
-            items = items + response['OriginEndpoints']
+    if catalog.available(service_name, region):
+        service = clients.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG, role_arn=role_arn, governed=True)
+        yield from paged_items(service.list_origin_endpoints, 'OriginEndpoints')
     else:
         print("not available in this region")
-    return items
 
 
-def medialive_channels(region):
+def medialive_channels(region, role_arn=None):
     """
-    Return the MediaLive channels for the given region.
+    Return the MediaLive channels for the given region, one page at a time.
     Tags included.
     """
-    items = []
     service_name = "medialive"
-    if region in boto3.Session().get_available_regions(service_name):
-        service = boto3.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG)
-        response = service.list_channels()
-        items = items + response['Channels']
-        while "NextToken" in response:
-            response = service.list_channels(NextToken=response["NextToken"])
-            items = items + response['Channels']
+    if catalog.available(service_name, region):
+        service = clients.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG, role_arn=role_arn, governed=True)
+        yield from paged_items(service.list_channels, 'Channels')
     else:
         print("not available in this region")
-    return items
 
 
-def medialive_inputs(region):
+def medialive_inputs(region, role_arn=None):
     """
-    Return the MediaLive inputs for the given region.
+    Return the MediaLive inputs for the given region, one page at a time.
     Tags included.
     """
-    items = []
     service_name = "medialive"
-    if region in boto3.Session().get_available_regions(service_name):
-        service = boto3.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG)
-        response = service.list_inputs()
-        items = items + response['Inputs']
-        while "NextToken" in response:
-            response = service.list_inputs(NextToken=response["NextToken"])
-            items = items + response['Inputs']
+    if catalog.available(service_name, region):
+        service = clients.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG, role_arn=role_arn, governed=True)
+        yield from paged_items(service.list_inputs, 'Inputs')
     else:
         print("not available in this region")
-    return items
 
 
-def medialive_multiplexes(region):
+def medialive_multiplexes(region, role_arn=None):
     """
-    Return the MediaLive Multiplexes for the given region.
+    Return the MediaLive Multiplexes for the given region, one page at a time.
     Tags included.
     """
-    items = []
     service_name = "medialive"
-    if region in boto3.Session().get_available_regions(service_name):
-        service = boto3.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG)
-        lm_response = service.list_multiplexes()
-        for multiplex in lm_response["Multiplexes"]:
-            multiplex_id = multiplex["Id"]
-            plex_response = service.describe_multiplex(MultiplexId=multiplex_id)
+    if catalog.available(service_name, region):
+        service = clients.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG, role_arn=role_arn, governed=True)
+
+        def describe_multiplex(multiplex):
+            plex_response = service.describe_multiplex(MultiplexId=multiplex["Id"])
             del plex_response['ResponseMetadata']
-            items.append(plex_response)
-        while "NextToken" in lm_response:
-            lm_response = service.list_multiplexes(NextToken=lm_response["NextToken"])
-            for multiplex in lm_response["Multiplexes"]:
-                multiplex_id = multiplex["Id"]
-                plex_response = service.describe_multiplex(MultiplexId=multiplex_id)
-                del plex_response['ResponseMetadata']
-                items.append(plex_response)
+            return plex_response
+
+        yield from paged_fan_out(service_name, describe_multiplex, service.list_multiplexes, "Multiplexes")
     else:
         print("not available in this region")
-    return items
 
 
-def mediastore_containers(region):
+def mediastore_containers(region, role_arn=None):
     """
-    Return the MediaLive inputs for the given region.
+    Return the MediaStore containers for the given region, one page at a time.
     NO TAGS
     """
-    items = []
     service_name = "mediastore"
-    if region in boto3.Session().get_available_regions(service_name):
-        service = boto3.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG)
-        response = service.list_containers()
-        items = items + response['Containers']
-        while "NextToken" in response:
-            response = service.list_containers(NextToken=response["NextToken"])
-            items = items + response['Containers']
-        for item in items:
+    if catalog.available(service_name, region):
+        service = clients.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG, role_arn=role_arn, governed=True)
+        for item in paged_items(service.list_containers, 'Containers'):
             item['CreationTime'] = str(item['CreationTime'])
+            yield item
     else:
         print("not available in this region")
-    return items
 
 
-def mediaconnect_flows(region):
+def mediaconnect_flows(region, role_arn=None):
     """
-    Return the MediaConnect flows for the given region.
-    NO TAGS
+    Return the MediaConnect flows for the given region, one page at a time.
+    Tags included, in bulk when possible.
     """
-    items = []
     service_name = 'mediaconnect'
-    if region in boto3.Session().get_available_regions(service_name):
-        service = boto3.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG)
-        response = service.list_flows()
-        flows = response['Flows']
-        while "NextToken" in response:
-            response = service.list_flows(NextToken=response["NextToken"])
-            flows = flows + response['Flows']
-        for flow in flows:
+    if catalog.available(service_name, region):
+        service = clients.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG, role_arn=role_arn, governed=True)
+        tags = tagging.bulk_tags(region, ["mediaconnect:flow"], role_arn)
+
+        def describe_flow(flow):
             try:
-                flow_details = service.describe_flow(FlowArn=flow['FlowArn'])
-                response = service.list_tags_for_resource(ResourceArn=flow["FlowArn"])
-                flow_details["Tags"] = response["Tags"]
+                flow_details = service.describe_flow(FlowArn=flow['FlowArn'])['Flow']
+                if tags is not None:
+                    flow_details["Tags"] = tags.get(flow["FlowArn"], {})
+                else:
+                    flow_details["Tags"] = service.list_tags_for_resource(ResourceArn=flow["FlowArn"])["Tags"]
+                return flow_details
             except ClientError as error:
                 print(error)
-            items.append(flow_details['Flow'])
+                # the flow is missing from the results, so its stored item must not be reconciled away
+                metrics.add("Errors")
+                return None
+
+        for flow in paged_fan_out(service_name, describe_flow, service.list_flows, 'Flows'):
+            if flow is not None:
+                yield flow
     else:
         print("not available in this region")
-    return items
 
 
-def mediatailor_configurations(region):
+def mediatailor_configurations(region, role_arn=None):
     """
-    Return the MediaTailor configurations for the given region.
+    Return the MediaTailor configurations for the given region, one page at a time.
     Tags included.
     """
-    items = []
     service_name = 'mediatailor'
-    if region in boto3.Session().get_available_regions(service_name):
-        service = boto3.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG)
-        response = service.list_playback_configurations()
-        configs = response['Items']
-        while "NextToken" in response:
-            response = service.list_playback_configurations(NextToken=response["NextToken"])
-            configs = configs + response['Items']
-        for config in configs:
+    if catalog.available(service_name, region):
+        service = clients.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG, role_arn=role_arn, governed=True)
+
+        def get_playback_configuration(config):
             response = service.get_playback_configuration(Name=config['Name'])
             if 'ResponseMetadata' in response:
                 del response['ResponseMetadata']
-            items.append(response)
+            return response
+
+        yield from paged_fan_out(service_name, get_playback_configuration, service.list_playback_configurations, 'Items')
     else:
         print("not available in this region")
-    return items
 
 
-def ssm_managed_instances(region):
+def ssm_managed_instances(region, role_arn=None):
     """
-    Retrieve resources like on-prem encoders stored in SSM with MSAM specific tags.
+    Retrieve resources like on-prem encoders stored in SSM with MSAM specific tags, one page at a time.
     """
-    items = []
-    devices = []
     service_name = 'ssm'
-    if region in boto3.Session().get_available_regions(service_name):
-        service = boto3.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG)
+    if catalog.available(service_name, region):
+        service = clients.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG, role_arn=role_arn, governed=True)
         response = service.get_inventory(Filters=[
                 {
                     'Key': 'AWS:InstanceInformation.InstanceStatus',
@@ -526,41 +613,39 @@ def ssm_managed_instances(region):
                     'Type': 'NotEqual'
                 }
         ])
-        devices = devices + response['Entities']
-        while "NextToken" in response:
+        while True:
+            metrics.add("Pages")
+            for device in response['Entities']:
+                #process hybrid/on prem machines
+                device['Tags'] = {}
+                if device['Id'].startswith('mi-'):
+                    device_tags = service.list_tags_for_resource(ResourceType='ManagedInstance', ResourceId=device['Id'])
+                    #check for MSAM-NodeType is present, then store this as a node
+                    if 'TagList' in device_tags:
+                        for tag in device_tags['TagList']:
+                            #reformat tags before adding to device data
+                            device['Tags'][tag['Key']] = tag['Value']
+                    yield device
+            if "NextToken" not in response:
+                break
             response = service.get_inventory(NextToken=response["NextToken"])
-            devices = devices + response['Entities']
-        for device in devices:
-            #process hybrid/on prem machines
-            device['Tags'] = {}
-            if device['Id'].startswith('mi-'):
-                device_tags = service.list_tags_for_resource(ResourceType='ManagedInstance', ResourceId=device['Id'])
-                #check for MSAM-NodeType is present, then store this as a node
-                if 'TagList' in device_tags:
-                    for tag in device_tags['TagList']:
-                        #reformat tags before adding to device data
-                        device['Tags'][tag['Key']] = tag['Value']
-                items.append(device)
     else:
         print("not available in this region")
-    return items
 
 
-def ec2_instances(region):
+def ec2_instances(region, role_arn=None):
     """
-    Retrieve EC2 instances with MSAM specific tags.
+    Retrieve EC2 instances with MSAM specific tags, one page of reservations at a time.
+    The tag keys are matched by the API so untagged instances are never listed.
     """
-    items = []
-    reservations = []
     service_name = 'ec2'
-    if region in boto3.Session().get_available_regions(service_name):
-        service = boto3.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG)
-        response = service.describe_instances()
-        reservations = reservations + response['Reservations']
-        while "NextToken" in response:
-            response = service.describe_instances(NextToken=response["NextToken"])
-            reservations = reservations + response['Reservations']
-        for reservation in reservations:
+    if catalog.available(service_name, region):
+        service = clients.client(service_name, region_name=region, config=MSAM_BOTO3_CONFIG, role_arn=role_arn, governed=True)
+        filters = []
+        tag_keys = ec2_tag_keys()
+        if tag_keys:
+            filters.append({"Name": "tag-key", "Values": tag_keys})
+        for reservation in paged_items(service.describe_instances, 'Reservations', Filters=filters, MaxResults=EC2_PAGE_MAX_RESULTS):
             for instance in reservation['Instances']:
                 if 'Tags' in instance:
                     final_tags = {}
@@ -568,7 +653,18 @@ def ec2_instances(region):
                         #reformat the tags before appending to data
                         final_tags[tag["Key"]] = tag["Value"]
                         instance['Tags'] = final_tags
-                items.append(instance)
+                yield instance
     else:
         print("not available in this region")
-    return items
+
+
+def ec2_tag_keys():
+    """
+    Return the tag keys that select the EC2 instances to discover, an empty list selects all.
+    """
+    tag_keys = msam_settings.get_setting(EC2_TAG_KEYS_SETTING)
+    if tag_keys is None:
+        return DEFAULT_EC2_TAG_KEYS
+    if isinstance(tag_keys, str):
+        return [tag_keys]
+    return list(tag_keys)
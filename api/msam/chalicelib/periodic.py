@@ -9,15 +9,17 @@ import time
 import xml.etree.ElementTree as ET
 import json
 
-import boto3
 from botocore.exceptions import ClientError
 from botocore.config import Config
 from boto3.dynamodb.conditions import Key
 
 import chalicelib.settings as msam_settings
+import chalicelib.clients as clients
+import chalicelib.codec as codec
 import chalicelib.cloudwatch as cloudwatch_data
 import chalicelib.connections as connection_cache
 import chalicelib.nodes as node_cache
+import chalicelib.sweep as sweep
 from chalicelib.cache import regions
 import chalicelib.tags as tags
 
@@ -67,11 +69,12 @@ def update_connections():
     return True
 
 
-def update_nodes():
-    return update_nodes_generic(
-        update_global_func=node_cache.update_global_ddb_items,
-        update_regional_func=node_cache.update_regional_ddb_items,
-        settings_key="cache-next-region")
+def update_nodes(remaining_ms):
+    """
+    Entry point for the CloudWatch scheduled task to discover and cache services.
+    remaining_ms is a function returning the milliseconds left to the invocation.
+    """
+    return sweep.run_sweep(remaining_ms)
 
 
 def update_ssm_nodes():
@@ -148,8 +151,8 @@ def ssm_run_command():
     """
     try:
         table_name = CONTENT_TABLE_NAME
-        ssm_client = boto3.client('ssm', config=MSAM_BOTO3_CONFIG)
-        db_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ssm_client = clients.client('ssm', config=MSAM_BOTO3_CONFIG)
+        db_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         db_table = db_resource.Table(table_name)
         instance_ids = {}
         items = []
@@ -157,8 +160,8 @@ def ssm_run_command():
         response = db_table.query(
             IndexName="ServiceRegionIndex",
             KeyConditionExpression=Key("service").eq("ssm-managed-instance"),
-            FilterExpression="contains(#data, :tagname)",
-            ExpressionAttributeNames={"#data": "data"},
+            FilterExpression="contains(#data, :tagname) OR attribute_exists(#codec)",
+            ExpressionAttributeNames={"#data": "data", "#codec": codec.CODEC_ATTRIBUTE},
             ExpressionAttributeValues={":tagname": "MSAM-NodeType"}
             )
         if "Items" in response:
@@ -167,8 +170,8 @@ def ssm_run_command():
             response = db_table.query(
             IndexName="ServiceRegionIndex",
             KeyConditionExpression=Key("service").eq("ssm-managed-instance"),
-            FilterExpression="contains(#data, :tagname)",
-            ExpressionAttributeNames={"#data": "data"},
+            FilterExpression="contains(#data, :tagname) OR attribute_exists(#codec)",
+            ExpressionAttributeNames={"#data": "data", "#codec": codec.CODEC_ATTRIBUTE},
             ExpressionAttributeValues={":tagname": "MSAM-NodeType"},
             ExclusiveStartKey=response['LastEvaluatedKey']
             )
@@ -176,7 +179,7 @@ def ssm_run_command():
                 items.append(response["Items"])
 
         for item in items:
-            data = json.loads(item['data'])
+            data = json.loads(codec.decode_data(item))
             if "MSAM-NodeType" in data["Tags"]:
                 instance_ids[data['Id']] = data['Tags']['MSAM-NodeType']
 
@@ -265,8 +268,8 @@ def process_ssm_run_command(event):
     instance_id = event_dict['detail']['instance-id']
     command_name = event_dict['detail']['document-name']
     command_status = event_dict['detail']['status']
-    cw_client = boto3.client('cloudwatch', config=MSAM_BOTO3_CONFIG)
-    log_client = boto3.client('logs', config=MSAM_BOTO3_CONFIG)
+    cw_client = clients.client('cloudwatch', config=MSAM_BOTO3_CONFIG)
+    log_client = clients.client('logs', config=MSAM_BOTO3_CONFIG)
     dimension_name = "Instance ID"
     metric_name = command_name
     status = 0
@@ -7,10 +7,11 @@ This file contains helper functions related to settings.
 import os
 from urllib.parse import unquote
 
-import boto3
 from botocore.exceptions import ClientError
 from botocore.config import Config
 
+from chalicelib import clients
+
 SETTINGS_TABLE_NAME = os.environ["SETTINGS_TABLE_NAME"]
 
 # user-agent config
@@ -18,7 +19,7 @@ STAMP = os.environ["BUILD_STAMP"]
 MSAM_BOTO3_CONFIG = Config(user_agent="aws-media-services-applications-mapper/{stamp}/settings.py".format(stamp=STAMP))
 
 # DynamoDB
-DYNAMO_RESOURCE = boto3.resource("dynamodb", config=MSAM_BOTO3_CONFIG)
+DYNAMO_RESOURCE = clients.resource("dynamodb", config=MSAM_BOTO3_CONFIG)
 
 def put_setting(key, value):
     """
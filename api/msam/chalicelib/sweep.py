@@ -0,0 +1,361 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+This file contains helper functions for planning the node discovery sweep
+across regions and services within the time left to a Lambda invocation.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from botocore.exceptions import ClientError
+
+import chalicelib.catalog as catalog
+import chalicelib.clients as clients
+import chalicelib.nodes as node_cache
+import chalicelib.settings as msam_settings
+
+# setting holding the current pass, the measured cost of each unit and the state of each region
+SWEEP_CHECKPOINT_KEY = "sweep-checkpoint"
+
+# regions listed in this setting are never discovered
+NEVER_REGIONS_KEY = "never-cache-regions"
+
+# setting listing other accounts to discover through a role, for example
+# [{"role_arn": "arn:aws:iam::111122223333:role/MSAMDiscovery", "regions": ["us-west-2"]}]
+DISCOVERY_ACCOUNTS_KEY = "discovery-accounts"
+
+# accounts discovered at the same time
+ACCOUNT_WORKERS = int(os.environ.get("ACCOUNT_WORKERS", "4"))
+
+# setting written by the event collectors with the time of the latest media event per region
+REGION_ACTIVITY_KEY = "region-activity"
+
+# time kept free at the end of an invocation for writing the checkpoint
+SWEEP_RESERVE_MS = 15000
+
+# assumed cost of a unit that has not been measured yet
+SWEEP_DEFAULT_UNIT_MS = 5000
+
+# estimates are padded by this factor when packing units into the remaining time
+SWEEP_ESTIMATE_MARGIN = 1.25
+
+# weight of the latest measurement in a unit's cost estimate
+SWEEP_COST_WEIGHT = 0.5
+
+# a region with resources is due for discovery this long after its last refresh
+REGION_REFRESH_SECONDS = 300
+
+# an empty region waits twice as long after each empty refresh, up to this long
+REGION_MAX_BACKOFF_SECONDS = 6 * 3600
+
+# priority added to a region where media events arrived since its last refresh
+REGION_EVENT_BOOST = 2
+
+# resource count at which a region earns half of the priority given for its size
+REGION_COUNT_SCALE = 100
+
+
+def sweep_regions(accounts):
+    """
+    Return the regions to discover in name order followed by global, then the same
+    for each of the given entries of the discovery-accounts setting as account:region.
+    """
+    never_regions = msam_settings.get_setting(NEVER_REGIONS_KEY)
+    if never_regions is None:
+        never_regions = []
+    region_names = []
+    for region_name in sorted(region["RegionName"] for region in catalog.regions()):
+        if region_name in never_regions:
+            print("{} in {} setting".format(region_name, NEVER_REGIONS_KEY))
+        else:
+            region_names.append(region_name)
+    scopes = region_names + ["global"]
+    for account in accounts:
+        account_id = clients.role_account(account["role_arn"])
+        account_regions = [region_name for region_name in sorted(account.get("regions") or region_names) if region_name not in never_regions]
+        scopes.extend("{}:{}".format(account_id, region_name) for region_name in account_regions + ["global"])
+    return scopes
+
+
+def discovery_accounts():
+    """
+    Return the valid entries of the discovery-accounts setting.
+    """
+    accounts = msam_settings.get_setting(DISCOVERY_ACCOUNTS_KEY)
+    if not isinstance(accounts, list):
+        return []
+    valid = []
+    for account in accounts:
+        if isinstance(account, dict) and str(account.get("role_arn", "")).startswith("arn:aws:iam::"):
+            valid.append(account)
+        else:
+            print("ignoring {} entry {}".format(DISCOVERY_ACCOUNTS_KEY, account))
+    return valid
+
+
+def split_scope(scope):
+    """
+    Return the account and region of a sweep region, the account is None for the deployment's own.
+    """
+    if ":" in scope:
+        account_id, region_name = scope.split(":", 1)
+        return account_id, region_name
+    return None, scope
+
+
+def region_units(region_name):
+    """
+    Return the (region, service) units of a region in the order they are discovered,
+    leaving out services the region catalog lists as unavailable there.
+    """
+    scope_region = split_scope(region_name)[1]
+    if scope_region == "global":
+        return [(region_name, service) for service, _, _ in node_cache.GLOBAL_DISCOVERY_STEPS]
+    units = []
+    for service, _, _ in node_cache.REGIONAL_DISCOVERY_STEPS:
+        service_name = node_cache.DISCOVERY_STEP_SERVICES.get(service)
+        if service_name is None or catalog.available(service_name, scope_region):
+            units.append((region_name, service))
+    return units
+
+
+def pass_units(checkpoint):
+    """
+    Return the units of the current pass.
+    """
+    units = []
+    for region_name in checkpoint.get("order", []):
+        units.extend(region_units(region_name))
+    return units
+
+
+def region_priority(state, last_activity, now):
+    """
+    Rank a region by how stale, how busy and how changeable it was at its last refresh,
+    and whether media events arrived since then.
+    """
+    last = int(state.get("last", 0))
+    count = int(state.get("count", 0))
+    changed = int(state.get("changed", 0))
+    empty_runs = int(state.get("empty_runs", 0))
+    interval = REGION_REFRESH_SECONDS
+    if count == 0 and last:
+        interval = min(REGION_REFRESH_SECONDS * 2 ** empty_runs, REGION_MAX_BACKOFF_SECONDS)
+    staleness = (now - last) / interval
+    active = last_activity is not None and int(last_activity) > last
+    priority = min(staleness, 10) + changed / max(count, 1) + count / (count + REGION_COUNT_SCALE)
+    if active:
+        priority = priority + REGION_EVENT_BOOST
+    return {
+        "priority": Decimal(str(round(priority, 3))),
+        "due": staleness >= 1 or active,
+        "interval": interval,
+        "count": count,
+        "active": active
+    }
+
+
+def plan_pass(checkpoint, region_names, now):
+    """
+    Start a new pass over the due regions, most important first, and record the decisions.
+    """
+    activity = msam_settings.get_setting(REGION_ACTIVITY_KEY)
+    if not isinstance(activity, dict):
+        activity = {}
+    decisions = []
+    for region_name in region_names:
+        decision = region_priority(checkpoint["regions"].get(region_name, {}), activity.get(region_name), now)
+        decision["region"] = region_name
+        decisions.append(decision)
+    decisions.sort(key=lambda decision: decision["priority"], reverse=True)
+    checkpoint["plan"] = decisions
+    checkpoint["order"] = [decision["region"] for decision in decisions if decision["due"]]
+    checkpoint["pending"] = {}
+    checkpoint["started"] = now
+    units = pass_units(checkpoint)
+    checkpoint["next"] = list(units[0]) if units else []
+    print("planned pass over {}".format(", ".join("{region} ({priority})".format(**decision) for decision in decisions if decision["due"])))
+
+
+def load_checkpoint(region_names):
+    """
+    Return the units of the current pass, the position of the next unit and the checkpoint setting.
+    Regions no longer swept, such as those of accounts removed from the discovery-accounts
+    setting, are dropped from the pass. A new pass is planned when the previous one is complete.
+    """
+    checkpoint = msam_settings.get_setting(SWEEP_CHECKPOINT_KEY)
+    if not isinstance(checkpoint, dict):
+        checkpoint = {}
+    checkpoint.setdefault("costs", {})
+    checkpoint.setdefault("regions", {})
+    drop_regions(checkpoint, region_names)
+    units = pass_units(checkpoint)
+    next_unit = tuple(checkpoint.get("next", []))
+    if next_unit not in units:
+        plan_pass(checkpoint, region_names, int(time.time()))
+        units = pass_units(checkpoint)
+        next_unit = tuple(checkpoint["next"])
+    position = units.index(next_unit) if units else 0
+    return units, position, checkpoint
+
+
+def drop_regions(checkpoint, region_names):
+    """
+    Remove the regions that are no longer swept from the checkpoint and the pass. If the next unit belonged
+    to one of them, the pass resumes at the next unit of a region that is still swept.
+    """
+    for region_name in [region_name for region_name in checkpoint["regions"] if region_name not in region_names]:
+        del checkpoint["regions"][region_name]
+    for key in [key for key in checkpoint["costs"] if key.rsplit("/", 1)[0] not in region_names]:
+        del checkpoint["costs"][key]
+    dropped = [region_name for region_name in checkpoint.get("order", []) if region_name not in region_names]
+    if not dropped:
+        return
+    print("dropping {} from the pass, no longer swept".format(", ".join(dropped)))
+    units = pass_units(checkpoint)
+    next_unit = tuple(checkpoint.get("next", []))
+    remaining = units[units.index(next_unit):] if next_unit in units else []
+    remaining = [unit for unit in remaining if unit[0] in region_names]
+    checkpoint["order"] = [region_name for region_name in checkpoint["order"] if region_name in region_names]
+    checkpoint["next"] = list(remaining[0]) if remaining else []
+    for region_name in dropped:
+        checkpoint.get("pending", {}).pop(region_name, None)
+
+
+def unit_key(unit):
+    """
+    Return the key of a unit in the cost estimates.
+    """
+    return "{}/{}".format(*unit)
+
+
+def estimate_ms(checkpoint, unit):
+    """
+    Return the expected milliseconds to discover a unit based on previous runs.
+    """
+    return int(checkpoint["costs"].get(unit_key(unit), SWEEP_DEFAULT_UNIT_MS))
+
+
+def plan_batch(units, position, checkpoint, budget_ms, first):
+    """
+    Return the units from position on whose estimated costs fit into the budget.
+    The first batch of an invocation holds at least one unit so an expensive unit cannot stall the sweep.
+    """
+    batch = []
+    planned_ms = 0
+    while position + len(batch) < len(units):
+        unit = units[position + len(batch)]
+        cost_ms = estimate_ms(checkpoint, unit) * SWEEP_ESTIMATE_MARGIN
+        if planned_ms + cost_ms > budget_ms and not (first and not batch):
+            break
+        batch.append(unit)
+        planned_ms = planned_ms + cost_ms
+    return batch
+
+
+def run_batch(batch, roles):
+    """
+    Discover the units of a batch and return the results per unit.
+    The regions of an account run one at a time, accounts run at the same time.
+    roles maps the account ids of the discovery-accounts setting to their role ARNs,
+    it is read together with the sweep regions so every account of the batch has a role.
+    """
+    account_regions = {}
+    for region_name, _ in batch:
+        scopes = account_regions.setdefault(split_scope(region_name)[0], [])
+        if region_name not in scopes:
+            scopes.append(region_name)
+    results = {}
+    with ThreadPoolExecutor(max_workers=ACCOUNT_WORKERS) as executor:
+        for scope_results in executor.map(lambda scopes: run_regions(batch, scopes, roles), account_regions.values()):
+            results.update(scope_results)
+    return results
+
+
+def run_regions(batch, scopes, roles):
+    """
+    Discover the units of a batch in the given regions of one account, one region at a time.
+    """
+    results = {}
+    for scope in scopes:
+        account_id, region_name = split_scope(scope)
+        role_arn = None if account_id is None else roles[account_id]
+        services = [service for unit_region, service in batch if unit_region == scope]
+        print("updating nodes for region {}: {}".format(scope, ", ".join(services)))
+        if region_name == "global":
+            steps = [step for step in node_cache.GLOBAL_DISCOVERY_STEPS if step[0] in services]
+            region_results = node_cache.run_discovery_steps(steps, role_arn=role_arn)
+        else:
+            steps = [step for step in node_cache.REGIONAL_DISCOVERY_STEPS if step[0] in services]
+            region_results = node_cache.run_discovery_steps(steps, region_name, role_arn=role_arn)
+        for service, result in region_results.items():
+            results[(scope, service)] = result
+    return results
+
+
+def record_results(checkpoint, results):
+    """
+    Blend measured unit timings into the cost estimates and update the state of regions
+    whose last unit of the pass has run.
+    """
+    for unit, result in results.items():
+        key = unit_key(unit)
+        elapsed_ms = result["elapsed_ms"]
+        if key in checkpoint["costs"]:
+            elapsed_ms = int(checkpoint["costs"][key]) * (1 - SWEEP_COST_WEIGHT) + elapsed_ms * SWEEP_COST_WEIGHT
+        checkpoint["costs"][key] = int(elapsed_ms)
+        region_name = unit[0]
+        pending = checkpoint["pending"].setdefault(region_name, {"count": 0, "changed": 0})
+        pending["count"] = int(pending["count"]) + result["items"]
+        pending["changed"] = int(pending["changed"]) + result["changed"]
+        if unit == region_units(region_name)[-1]:
+            state = checkpoint["regions"].get(region_name, {})
+            empty_runs = 0 if pending["count"] else int(state.get("empty_runs", 0)) + 1
+            checkpoint["regions"][region_name] = {"last": int(time.time()), "count": pending["count"], "changed": pending["changed"], "empty_runs": empty_runs}
+            del checkpoint["pending"][region_name]
+
+
+def run_sweep(remaining_ms):
+    """
+    Discover as many units as fit into the invocation, resuming where the previous invocation stopped.
+    Each pass covers the regions that are due, most important first. An invocation ends when it completes a pass.
+    remaining_ms is a function returning the milliseconds left to the invocation.
+    Returns the number of units discovered.
+    """
+    discovered = 0
+    try:
+        accounts = discovery_accounts()
+        roles = {clients.role_account(account["role_arn"]): account["role_arn"] for account in accounts}
+        units, position, checkpoint = load_checkpoint(sweep_regions(accounts))
+        first = True
+        while units:
+            budget_ms = remaining_ms() - SWEEP_RESERVE_MS
+            if budget_ms <= 0:
+                break
+            batch = plan_batch(units, position, checkpoint, budget_ms, first)
+            if not batch:
+                break
+            first = False
+            record_results(checkpoint, run_batch(batch, roles))
+            discovered = discovered + len(batch)
+            position = position + len(batch)
+            completed = position >= len(units)
+            if completed:
+                print("pass over {} units completed in {}s".format(len(units), int(time.time()) - int(checkpoint["started"])))
+                checkpoint["next"] = []
+            else:
+                checkpoint["next"] = list(units[position])
+            msam_settings.put_setting(SWEEP_CHECKPOINT_KEY, checkpoint)
+            # the next pass is planned by the next schedule rather than rediscovering right away
+            if completed:
+                break
+        if not units:
+            msam_settings.put_setting(SWEEP_CHECKPOINT_KEY, checkpoint)
+            print("no region is due for discovery")
+        print("discovered {} units, remaining time {}ms".format(discovered, remaining_ms()))
+    except ClientError as error:
+        print(error)
+    return discovered
@@ -0,0 +1,64 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+This file contains helper functions for retrieving resource tags in bulk
+with the Resource Groups Tagging API.
+"""
+
+import os
+
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from botocore.exceptions import EndpointConnectionError
+
+from chalicelib import cache
+from chalicelib import clients
+
+# bulk resolves tags with a few GetResources calls, per-resource asks each resource
+TAG_RESOLUTION = os.environ.get("TAG_RESOLUTION", "bulk")
+
+# GetResources serves the tags of global CloudFront distributions from this region
+CLOUDFRONT_TAGS_REGION = "us-east-1"
+
+# user-agent config
+STAMP = os.environ["BUILD_STAMP"]
+MSAM_BOTO3_CONFIG = Config(retries={'max_attempts': 15}, user_agent="aws-media-services-applications-mapper/{stamp}/tagging.py".format(stamp=STAMP))
+
+
+def bulk_tags(region, resource_types, role_arn=None):
+    """
+    Return a dictionary of ARN to tags for the resources of the given types in a region,
+    in the role's account when a role ARN is given.
+    Resources without tags are absent. Returns None if the tags cannot be resolved in bulk,
+    in which case the caller asks each resource for its tags.
+    """
+    if TAG_RESOLUTION != "bulk":
+        return None
+    try:
+        service = clients.client("resourcegroupstaggingapi", region_name=region, config=MSAM_BOTO3_CONFIG, role_arn=role_arn, governed=True)
+        tags = {}
+        for page in service.get_paginator("get_resources").paginate(ResourceTypeFilters=resource_types):
+            for mapping in page["ResourceTagMappingList"]:
+                tags[mapping["ResourceARN"]] = {tag["Key"]: tag["Value"] for tag in mapping["Tags"]}
+        return tags
+    except (ClientError, EndpointConnectionError) as error:
+        print(error)
+        return None
+
+
+def bulk_tags_all_regions(resource_types, role_arn=None):
+    """
+    Return a dictionary of ARN to tags for the resources of the given types in every enabled region,
+    and whether every region was resolved. Resources of a failed region need their own tag call.
+    """
+    if TAG_RESOLUTION != "bulk":
+        return {}, False
+    tags = {}
+    complete = True
+    for region in cache.regions():
+        region_tags = bulk_tags(region["RegionName"], resource_types, role_arn)
+        if region_tags is None:
+            complete = False
+        else:
+            tags.update(region_tags)
+    return tags, complete
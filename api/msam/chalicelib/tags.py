@@ -7,12 +7,13 @@ This file contains helper functions for building the node cache.
 import json
 import os
 
-import boto3
 from botocore.config import Config
 from botocore.exceptions import ClientError
 import stringcase
 
 import chalicelib.channels as channels
+import chalicelib.clients as clients
+import chalicelib.codec as codec
 import chalicelib.settings as settings
 import chalicelib.layout as layout
 
@@ -30,23 +31,23 @@ def update_diagrams():
     """
     try:
         ddb_table_name = CONTENT_TABLE_NAME
-        ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         ddb_table = ddb_resource.Table(ddb_table_name)
         # expensive textual scan
-        response = ddb_table.scan(FilterExpression="contains(#data, :tagname)", ExpressionAttributeNames={"#data": "data"}, ExpressionAttributeValues={":tagname": "MSAM-Diagram"})
+        response = ddb_table.scan(FilterExpression="contains(#data, :tagname) OR attribute_exists(#codec)", ExpressionAttributeNames={"#data": "data", "#codec": codec.CODEC_ATTRIBUTE}, ExpressionAttributeValues={":tagname": "MSAM-Diagram"})
         items = response["Items"]
         # check for paging
         while "LastEvaluatedKey" in response:
             # scan again with start key
             response = ddb_table.scan(
-                FilterExpression="contains(#data, :tagname)",
-                ExpressionAttributeNames={"#data": "data"},
+                FilterExpression="contains(#data, :tagname) OR attribute_exists(#codec)",
+                ExpressionAttributeNames={"#data": "data", "#codec": codec.CODEC_ATTRIBUTE},
                 ExpressionAttributeValues={":tagname": "MSAM-Diagram"},
                 ExclusiveStartKey=response['LastEvaluatedKey'])
             items = items + response["Items"]
-        # filter down the results
+        # filter down the results, compressed items are matched after decoding
         for record in items:
-            cloud_resource = json.loads(record["data"])
+            cloud_resource = json.loads(codec.decode_data(record))
             if "Tags" in cloud_resource:
                 if "MSAM-Diagram" in cloud_resource["Tags"]:
                     arn = record["arn"]
@@ -86,23 +87,23 @@ def update_tiles():
     """
     try:
         ddb_table_name = CONTENT_TABLE_NAME
-        ddb_resource = boto3.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
+        ddb_resource = clients.resource('dynamodb', config=MSAM_BOTO3_CONFIG)
         ddb_table = ddb_resource.Table(ddb_table_name)
         # very broad textual scan
-        response = ddb_table.scan(FilterExpression="contains(#data, :tagname)", ExpressionAttributeNames={"#data": "data"}, ExpressionAttributeValues={":tagname": "MSAM-Tile"})
+        response = ddb_table.scan(FilterExpression="contains(#data, :tagname) OR attribute_exists(#codec)", ExpressionAttributeNames={"#data": "data", "#codec": codec.CODEC_ATTRIBUTE}, ExpressionAttributeValues={":tagname": "MSAM-Tile"})
         items = response["Items"]
         # check for paging
         while "LastEvaluatedKey" in response:
             # scan again with start key
             response = ddb_table.scan(
-                FilterExpression="contains(#data, :tagname)",
-                ExpressionAttributeNames={"#data": "data"},
+                FilterExpression="contains(#data, :tagname) OR attribute_exists(#codec)",
+                ExpressionAttributeNames={"#data": "data", "#codec": codec.CODEC_ATTRIBUTE},
                 ExpressionAttributeValues={":tagname": "MSAM-Tile"},
                 ExclusiveStartKey=response['LastEvaluatedKey'])
             items = items + response["Items"]
-        # filter down the results
+        # filter down the results, compressed items are matched after decoding
         for record in items:
-            cloud_resource = json.loads(record["data"])
+            cloud_resource = json.loads(codec.decode_data(record))
             if "Tags" in cloud_resource:
                 if "MSAM-Tile" in cloud_resource["Tags"]:
                     arn = record["arn"]
@@ -5,12 +5,19 @@ define(["jquery", "vis", "app/plugins", "app/server", "app/connections"], functi
     var nodes = new vis.DataSet();
     var edges = new vis.DataSet();
 
+    // epoch seconds of the last change applied to the model, the next change feed request starts here
+    var watermark;
+    // seconds the first change feed request reaches back before a full load, covers browser clock drift
+    var load_overlap = 300;
+
     var reset = function() {
         nodes.clear();
         edges.clear();
     };
 
     var map = function(callback) {
+        // changes written while the services load are applied again by the change feed
+        watermark = Math.floor(Date.now() / 1000) - load_overlap;
         new Promise(function(resolve, reject) {
             var promises = [];
             require(plugins.nodes, function() {
@@ -42,26 +49,86 @@ define(["jquery", "vis", "app/plugins", "app/server", "app/connections"], functi
 
     // update the JSON data portion of the node or connection
     var update = function(arn) {
+        return update_many([arn]).then(function(updated) {
+            if (!updated.length) throw `arn ${arn} not found`;
+            return updated[0];
+        });
+    };
+
+    // store the cached data of a node or connection in the model, returns the updated copy or undefined
+    var apply_cache_entry = function(cache_entry) {
+        var data = JSON.parse(cache_entry.data);
+        // node or connection?
+        var dataset = data.to && data.from ? edges : nodes;
+        var node = dataset.get(cache_entry.arn);
+        if (node) {
+            node.data = data;
+            node.cache_update = cache_entry.updated;
+            dataset.update(node);
+        }
+        return node;
+    };
+
+    // update the JSON data portion of many nodes or connections with one request per 500 arns
+    var update_many = function(arns) {
         var current = connections.get_current();
         var url = current[0];
         var api_key = current[1];
-        return new Promise(function(resolve, reject) {
-            server.get(url + "/cached/arn/" + arn, api_key).then(function(cached) {
-                // we should get 0 or 1 results only
-                if (!cached || !cached.length) return reject(`arn ${arn} not found`);
-
-                var cache_entry = cached[0];
-                var data = JSON.parse(cache_entry.data);
-                // node or connection?
-                var node = data.to && data.from ? edges.get(arn) : nodes.get(arn);
-                if (!node) return reject(`arn ${arn} not found`);
+        var chunk_size = 500;
+        var promises = [];
+        for (let index = 0; index < arns.length; index += chunk_size) {
+            promises.push(server.post(`${url}/cached/arns`, api_key, arns.slice(index, index + chunk_size)));
+        }
+        return Promise.all(promises).then(function(responses) {
+            var updated = [];
+            for (let response of responses) {
+                for (let arn of Object.keys(response.items)) {
+                    var node = apply_cache_entry(response.items[arn]);
+                    if (node) {
+                        updated.push(node);
+                    }
+                }
+            }
+            return updated;
+        }).catch(function(error) {
+            console.log(error);
+            throw error;
+        });
+    };
 
-                node.data = data;
-                resolve(node);
-            }).catch(function(error) {
-                console.log(error);
-                reject(error);
+    // apply the nodes and connections changed since the watermark, resolves to the next watermark
+    // a reset result means the model is too far behind and must be loaded again with map
+    var update_changes = function(since) {
+        var current = connections.get_current();
+        var url = current[0];
+        var api_key = current[1];
+        if (typeof since === 'undefined') {
+            since = watermark;
+        }
+        return server.get(`${url}/cached/changes?since=${since}`, api_key).then(function(response) {
+            var updated = [];
+            for (let cache_entry of response.upserted) {
+                var node = apply_cache_entry(cache_entry);
+                if (node) {
+                    updated.push(node);
+                }
+            }
+            for (let deleted of response.deleted) {
+                nodes.remove(deleted.arn);
+                edges.remove(deleted.arn);
+            }
+            // changed items the server could not read this time are fetched by arn
+            var unprocessed = response.unprocessed || [];
+            var fetched = unprocessed.length ? update_many(unprocessed) : Promise.resolve([]);
+            return fetched.then(function(refetched) {
+                if (!response.reset) {
+                    watermark = response.watermark;
+                }
+                return { updated: updated.concat(refetched), deleted: response.deleted, watermark: response.watermark, reset: response.reset };
             });
+        }).catch(function(error) {
+            console.log(error);
+            throw error;
         });
     };
 
@@ -103,5 +170,5 @@ define(["jquery", "vis", "app/plugins", "app/server", "app/connections"], functi
     // clear the model at module definition
     reset();
 
-    return { nodes, edges, reset, map, update, put_records, delete_record }
+    return { nodes, edges, reset, map, update, update_many, update_changes, put_records, delete_record }
 });
\ No newline at end of file
@@ -219,6 +219,7 @@ define(["app/connections", "app/regions", "app/model", "app/ui/settings_menu", "
                             "app/ui/dragdrop",
                             "app/ui/event_alert_indicators",
                             "app/ui/informational_overlays",
+                            "app/ui/model_changes",
                             "app/ui/monitor_view",
                             "app/ui/nodes_menu",
                             "app/ui/search_view",
@@ -0,0 +1,69 @@
+/*! Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+       SPDX-License-Identifier: Apache-2.0 */
+
+define(["jquery", "lodash", "app/model", "app/ui/diagrams"],
+    function($, _, model, diagrams) {
+
+        var intervalID;
+        // interval in millis to poll the change feed
+        var update_interval = 60000;
+        // true while a change feed request or reload is running
+        var busy = false;
+
+        var sync_diagrams = function(updated, deleted) {
+            for (let diagram of Object.values(diagrams.get_all())) {
+                for (let item of updated) {
+                    if (diagram.nodes.get(item.id)) {
+                        diagram.nodes.update(item);
+                    } else
+                    if (diagram.edges.get(item.id)) {
+                        diagram.edges.update(item);
+                    }
+                }
+                // removing a node also removes its edges from the diagram
+                var arns = _.map(deleted, "arn");
+                diagram.nodes.remove(arns);
+                diagram.edges.remove(arns);
+            }
+        };
+
+        var reload = function() {
+            return new Promise(function(resolve, reject) {
+                model.map(function() {
+                    // give the diagrams the reloaded copies of their nodes
+                    for (let diagram of Object.values(diagrams.get_all())) {
+                        diagram.nodes.update(_.compact(model.nodes.get(diagram.nodes.getIds())));
+                    }
+                    resolve();
+                });
+            });
+        };
+
+        var update_changes = function() {
+            if (busy) {
+                return;
+            }
+            busy = true;
+            model.update_changes().then(function(result) {
+                if (result.reset) {
+                    console.log("change feed: model is behind, reloading");
+                    return reload();
+                }
+                sync_diagrams(result.updated, result.deleted);
+            }).catch(function(error) {
+                console.log(error);
+            }).then(function() {
+                busy = false;
+            });
+        };
+
+        var schedule_interval = function() {
+            if (intervalID) {
+                clearInterval(intervalID);
+            }
+            intervalID = setInterval(update_changes, update_interval);
+            console.log("change feed: interval scheduled " + update_interval + "ms, intervalID = " + intervalID);
+        };
+
+        schedule_interval();
+    });
@@ -60,7 +60,7 @@ define(["jquery", "app/model", "app/channels", "app/ui/tile_view", "app/ui/util"
                 if (node.cache_update != 0) {
                     var updated = new Date();
                     updated.setTime(Number.parseInt(node.cache_update) * 1000);
-                    cache_html = `<p class="card-text small text-muted mt-0 pt-0"><b>Updated:</b> ${updated.toString()}</p>`;
+                    cache_html = `<p class="card-text small text-muted mt-0 pt-0"><b>Last changed:</b> ${updated.toString()}</p>`;
                 }
                 var data = node.data;
                 // console.log(data);
@@ -29,9 +29,9 @@ def delete_disconnected():
     nodes = []
     connections = []
     for node_type in NODE_TYPES:
-        nodes = nodes + cached_by_service(node_type)
+        nodes = nodes + cached_by_service(node_type, fields="summary")
     for conn_type in CONNECTION_TYPES:
-        connections = connections + cached_by_service(conn_type)
+        connections = connections + cached_by_service(conn_type, fields="summary")
     remove_nodes = []
     # scan for connections with 'to' or 'from' set with
     for node in nodes:
@@ -0,0 +1,125 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+"""
+This is a tool to re-encode the data attribute of existing content table items
+and to measure the read and write capacity a codec saves on the current inventory.
+"""
+
+import argparse
+import math
+import os
+import sys
+
+import boto3
+
+# the codec is shared with the core API, found relative to this file wherever the tool is run from
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api", "msam"))
+from chalicelib import codec  # pylint: disable=wrong-import-position
+
+#
+# python migrate_content_codec.py --table <content table name> --codec zlib --benchmark
+# python migrate_content_codec.py --table <content table name> --codec zlib
+#
+
+# DynamoDB bills writes per 1 KB and eventually consistent reads per 4 KB (half a unit)
+WRITE_UNIT_BYTES = 1024
+READ_UNIT_BYTES = 4096
+
+
+def item_size(item):
+    """
+    Approximate the stored size of an item: attribute names plus values.
+    """
+    size = 0
+    for name, value in item.items():
+        size = size + len(name.encode('utf-8'))
+        if isinstance(value, str):
+            size = size + len(value.encode('utf-8'))
+        elif hasattr(value, "value"):
+            size = size + len(value.value)
+        else:
+            size = size + len(str(value))
+    return size
+
+
+def scan_items(table):
+    """
+    Yield every item of the table, one scan page at a time.
+    """
+    response = table.scan()
+    yield from response["Items"]
+    while "LastEvaluatedKey" in response:
+        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+        yield from response["Items"]
+
+
+def benchmark(table, codec_name):
+    """
+    Report per service how many capacity units a full rewrite and a full service query cost with and without the codec.
+    """
+    totals = {}
+    for item in scan_items(table):
+        if "data" not in item or "service" not in item:
+            continue
+        encoded = codec.encode_item(dict(item), codec_name)
+        plain = codec.encode_item(dict(item), "json")
+        entry = totals.setdefault(item["service"], {"items": 0, "plain_bytes": 0, "encoded_bytes": 0, "plain_wcu": 0, "encoded_wcu": 0})
+        entry["items"] = entry["items"] + 1
+        entry["plain_bytes"] = entry["plain_bytes"] + item_size(plain)
+        entry["encoded_bytes"] = entry["encoded_bytes"] + item_size(encoded)
+        entry["plain_wcu"] = entry["plain_wcu"] + math.ceil(item_size(plain) / WRITE_UNIT_BYTES)
+        entry["encoded_wcu"] = entry["encoded_wcu"] + math.ceil(item_size(encoded) / WRITE_UNIT_BYTES)
+    print("{:<55} {:>7} {:>12} {:>12} {:>9} {:>9} {:>9} {:>9}".format("service", "items", "plain B", codec_name + " B", "plain WCU", "enc WCU", "plain RCU", "enc RCU"))
+    overall = {"plain_wcu": 0, "encoded_wcu": 0, "plain_rcu": 0, "encoded_rcu": 0}
+    for service, entry in sorted(totals.items()):
+        # a query rounds the summed item sizes up to the next 4 KB, eventually consistent reads cost half
+        plain_rcu = math.ceil(entry["plain_bytes"] / READ_UNIT_BYTES) / 2
+        encoded_rcu = math.ceil(entry["encoded_bytes"] / READ_UNIT_BYTES) / 2
+        overall["plain_wcu"] = overall["plain_wcu"] + entry["plain_wcu"]
+        overall["encoded_wcu"] = overall["encoded_wcu"] + entry["encoded_wcu"]
+        overall["plain_rcu"] = overall["plain_rcu"] + plain_rcu
+        overall["encoded_rcu"] = overall["encoded_rcu"] + encoded_rcu
+        print("{:<55} {:>7} {:>12} {:>12} {:>9} {:>9} {:>9} {:>9}".format(
+            service, entry["items"], entry["plain_bytes"], entry["encoded_bytes"], entry["plain_wcu"], entry["encoded_wcu"], plain_rcu, encoded_rcu))
+    print("full rewrite: {plain_wcu} WCU plain, {encoded_wcu} WCU encoded".format(**overall))
+    print("query of every service: {plain_rcu} RCU plain, {encoded_rcu} RCU encoded".format(**overall))
+
+
+def migrate(table, codec_name):
+    """
+    Rewrite every item whose data attribute is not stored with the requested codec.
+    """
+    rewritten = 0
+    with table.batch_writer(overwrite_by_pkeys=["arn"]) as batch:
+        for item in scan_items(table):
+            if "data" not in item:
+                continue
+            before = item.get(codec.CODEC_ATTRIBUTE)
+            codec.encode_item(item, codec_name)
+            if item.get(codec.CODEC_ATTRIBUTE) != before:
+                batch.put_item(Item=item)
+                rewritten = rewritten + 1
+    print("{} items rewritten".format(rewritten))
+
+
+def main():
+    """
+    Parse the command line and run the benchmark or the migration.
+    """
+    parser = argparse.ArgumentParser(description='Re-encode or benchmark the data attribute of MSAM content table items.')
+    parser.add_argument('--table', required=True, help='content table name')
+    parser.add_argument('--codec', default='zlib', choices=['json', 'zlib'], help='codec to migrate to or measure (default is zlib)')
+    parser.add_argument('--benchmark', action='store_true', help='only report capacity units with and without the codec, do not write')
+    parser.add_argument('--region', default='us-west-2', help='the region where the table resides (if not provided, default is us-west-2)')
+    parser.add_argument('--profile', default='default', help='the AWS profile to use (if not provided, default profile is used)')
+    args = parser.parse_args()
+    session = boto3.Session(profile_name=args.profile, region_name=args.region)
+    table = session.resource('dynamodb').Table(args.table)
+    if args.benchmark:
+        benchmark(table, args.codec)
+    else:
+        migrate(table, args.codec)
+
+
+if __name__ == "__main__":
+    main()